@@ -0,0 +1,236 @@
+"""
+chunk_store.py
+Local store of the chunk documents of a Faiss index.
+
+A query only needs the text (and a few fields) of its top_k chunks, but
+fetching them from MongoDB costs a round trip that is often slower than the
+vector search itself. The chunk store is written next to the index at build
+time, with one record per mapping row (same order as `IndexMapping`), so a
+Faiss label is turned into a document with two array lookups and a zlib
+decompression, without any database call.
+
+Each record is the zlib-compressed JSON of the `STORED_FIELDS` of a chunk
+(the chunk id itself is already in the mapping). The file uses the same
+section layout as the index mapping and is memory-mapped on load ::
+
+    MAGIC (8 bytes) | header length (uint32 LE) | header JSON | offsets | blob
+
+Index builds write it with a `ChunkStoreWriter`, which spools the records
+of each batch to a temporary file instead of keeping them in memory.
+"""
+
+from __future__ import annotations
+
+import json
+import tempfile
+import zlib
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterator, Sequence
+
+import numpy as np
+
+from core.index_mapping import read_sections, take_blob_rows, write_sections
+
+MAGIC = b"AERAGCHK"
+FORMAT_VERSION = 1
+STORED_FIELDS = ("metadata_id", "chunk_index", "chunk_src")  # Chunk fields used by RAGEngine / recorders
+_COMPRESSION_LEVEL = 6
+_COPY_BUFFER_SIZE = 1 << 20  # Bytes of records read back from the spool per write
+
+
+def encode_chunk(doc: Dict[str, Any]) -> bytes:
+    """
+    Compressed record of a chunk document (only its `STORED_FIELDS`).
+
+    Args:
+        doc (Dict[str, Any]): Chunk document as stored in MongoDB.
+
+    Returns:
+        bytes: zlib-compressed JSON record.
+    """
+    record = {field: doc.get(field) for field in STORED_FIELDS}
+    return zlib.compress(json.dumps(record, ensure_ascii=False).encode("utf-8"), _COMPRESSION_LEVEL)
+
+
+class ChunkStore:
+    """Chunk records of an index, aligned with the rows of its IndexMapping."""
+
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray):
+        """
+        Args:
+            offsets (np.ndarray): int64 array of size n+1, record i is blob[offsets[i]:offsets[i+1]].
+            blob (np.ndarray): uint8 array holding all compressed records.
+        """
+        self.offsets = offsets
+        self.blob = blob
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def from_records(cls, ids: np.ndarray, records: Sequence[bytes]) -> "ChunkStore":
+        """
+        Build a store from the encoded records of each vector, sorted the way
+        `IndexMapping.from_records` sorts its rows (by Faiss id).
+
+        Args:
+            ids (np.ndarray): Faiss id of each record.
+            records (Sequence[bytes]): Records produced by `encode_chunk`.
+        """
+        if len(ids) != len(records):
+            raise ValueError("ids and records must have the same length.")
+        order = np.argsort(np.asarray(ids, dtype=np.int64), kind="stable")
+        return cls._concat([records[i] for i in order])
+
+    @classmethod
+    def _concat(cls, records: Sequence[bytes]) -> "ChunkStore":
+        offsets = np.zeros(len(records) + 1, dtype=np.int64)
+        if records:
+            np.cumsum([len(r) for r in records], out=offsets[1:])
+        return cls(offsets, np.frombuffer(b"".join(records), dtype=np.uint8))
+
+    @classmethod
+    def load(cls, path: str | Path) -> "ChunkStore":
+        """
+        Memory-map a chunk store written by `save()`.
+
+        Args:
+            path (str | Path): Path of the chunk store.
+        """
+        header, sections = read_sections(path, MAGIC, FORMAT_VERSION)
+        return cls(sections["offsets"], sections["blob"])
+
+    def save(self, path: str | Path) -> None:
+        """
+        Write the store to `path` (through a temporary file + atomic rename).
+
+        Args:
+            path (str | Path): Destination file.
+        """
+        write_sections(path, MAGIC, _header(len(self)), {
+            "offsets": np.asarray(self.offsets, dtype=np.int64),
+            "blob": np.asarray(self.blob, dtype=np.uint8),
+        })
+
+    # ------------------------------------------------------------------
+    # Incremental updates
+    # ------------------------------------------------------------------
+
+    def with_changes(
+        self,
+        ids: np.ndarray,
+        removed_ids: np.ndarray,
+        added_ids: np.ndarray,
+        added_records: Sequence[bytes],
+    ) -> "ChunkStore":
+        """
+        Return the store matching `IndexMapping.with_changes` called with the same ids.
+
+        Args:
+            ids (np.ndarray): Faiss ids of the current rows (the mapping ids).
+            removed_ids (np.ndarray): Faiss ids to drop.
+            added_ids (np.ndarray): Faiss ids of the added chunks.
+            added_records (Sequence[bytes]): Records of the added chunks.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        added_ids = np.asarray(added_ids, dtype=np.int64)
+        dropped = np.concatenate([np.asarray(removed_ids, dtype=np.int64), added_ids])
+        kept_rows = np.nonzero(~np.isin(ids, dropped))[0]
+        kept_offsets, kept_blob = take_blob_rows(self.offsets, self.blob, kept_rows)
+
+        added = ChunkStore._concat(list(added_records))
+        merged = ChunkStore(
+            np.concatenate([kept_offsets, added.offsets[1:] + kept_offsets[-1]]),
+            np.concatenate([kept_blob, added.blob]),
+        )
+        order = np.argsort(np.concatenate([ids[kept_rows], added_ids]), kind="stable")
+        return ChunkStore(*take_blob_rows(merged.offsets, merged.blob, order))
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def record(self, row: int) -> Dict[str, Any]:
+        """Return the stored fields of mapping row `row`."""
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(zlib.decompress(bytes(self.blob[start:end])).decode("utf-8"))
+
+
+class ChunkStoreWriter:
+    """
+    Chunk store filled batch by batch during an index build. Records are appended to an
+    anonymous temporary file as they are produced: only their Faiss id and length stay in
+    memory (16 bytes per chunk), whatever the size of the corpus.
+    """
+
+    def __init__(self, spool_dir: str | Path | None = None):
+        """
+        Args:
+            spool_dir (str | Path, optional): Directory of the temporary file, ideally on the
+                filesystem of the index (default: the system temporary directory).
+        """
+        self._spool = tempfile.TemporaryFile(dir=spool_dir)
+        self._ids: list[np.ndarray] = []
+        self._lengths = array("q")
+
+    def add(self, ids: np.ndarray, records: Sequence[bytes]) -> None:
+        """
+        Append the records of a batch.
+
+        Args:
+            ids (np.ndarray): Faiss id of each record.
+            records (Sequence[bytes]): Records produced by `encode_chunk`.
+        """
+        if len(ids) != len(records):
+            raise ValueError("ids and records must have the same length.")
+        for record in records:
+            self._spool.write(record)
+        self._lengths.extend(len(record) for record in records)
+        self._ids.append(np.asarray(ids, dtype=np.int64))
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def save(self, path: str | Path) -> None:
+        """
+        Write the store to `path`, records sorted by Faiss id like `ChunkStore.from_records`,
+        copying them from the temporary file without loading them all.
+
+        Args:
+            path (str | Path): Destination file.
+        """
+        self._spool.flush()
+        ids = np.concatenate(self._ids) if self._ids else np.zeros(0, dtype=np.int64)
+        lengths = np.frombuffer(self._lengths, dtype=np.int64)
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+        order = np.argsort(ids, kind="stable")
+        offsets = np.zeros(len(order) + 1, dtype=np.int64)
+        np.cumsum(lengths[order], out=offsets[1:])
+        write_sections(path, MAGIC, _header(len(order)), {"offsets": offsets},
+                       {"blob": (np.uint8, int(offsets[-1]), self._sorted_records(starts[order], lengths[order]))})
+
+    def close(self) -> None:
+        """Delete the temporary file."""
+        self._spool.close()
+
+    def _sorted_records(self, starts: np.ndarray, lengths: np.ndarray) -> Iterator[bytes]:
+        """Read the records at `starts` back from the spool, grouped into buffers of about 1 MB."""
+        buffer = bytearray()
+        for start, length in zip(starts.tolist(), lengths.tolist()):
+            self._spool.seek(start)
+            buffer += self._spool.read(length)
+            if len(buffer) >= _COPY_BUFFER_SIZE:
+                yield bytes(buffer)
+                buffer.clear()
+        if buffer:
+            yield bytes(buffer)
+
+
+def _header(count: int) -> Dict[str, Any]:
+    """JSON header of a chunk store file of `count` records."""
+    return {"version": FORMAT_VERSION, "count": count, "codec": "zlib", "fields": list(STORED_FIELDS)}
@@ -94,11 +94,27 @@ class DatabaseManager:
             ],
             "issues_comments": [
             ("repo", pymongo.ASCENDING),
-            ("issue_id", pymongo.ASCENDING)
+            ("issue_id", pymongo.ASCENDING),
+                # Comments of a page of issues, see MetadataGenerator.prefetch_comments
+                (("repo", pymongo.ASCENDING), ("issue_id", pymongo.ASCENDING))
             ],
             "pull_requests_comments": [
                 ("repo", pymongo.ASCENDING),
-                ("pr_id", pymongo.ASCENDING)
+                ("pr_id", pymongo.ASCENDING),
+                # Comments of a page of pull requests, see MetadataGenerator.prefetch_comments
+                (("repo", pymongo.ASCENDING), ("pr_id", pymongo.ASCENDING))
+            ],
+            "chunk_changes": [
+                ("repo", pymongo.ASCENDING),
+                ("collection_src", pymongo.ASCENDING)
+            ],
+            "metadata_runs": [
+                ("repo", pymongo.ASCENDING),
+                ("collection_src", pymongo.ASCENDING),
+                ("status", pymongo.ASCENDING),
+                # At most one running run per <repo, collection_src>, see MetadataRun.start
+                (("repo", pymongo.ASCENDING), ("collection_src", pymongo.ASCENDING),
+                 {"unique": True, "partialFilterExpression": {"status": "running"}})
             ]
             # TODO In near futur, add new collection to manage user feedback and logs of the RAG engine
         }
@@ -15,25 +15,140 @@ Usage (quick example) :
     # Build & save index for one repo / collection
     fim.build_index(
         repo="archethic-foundation/archethic-node",
-        collection_src="commits"
+        collections=["commits"]
+    )
+
+    # Approximate index (IVF / HNSW / PQ), trained on a sample of the vectors
+    fim.build_index(
+        repo="archethic-foundation/archethic-node",
+        collections=["commits"],
+        index_factory="IVF4096,Flat",
+        force=True
+    )
+
+    # Cosine similarity (normalized inner product) with int8 scalar-quantized vectors
+    fim.build_index(
+        repo="archethic-foundation/archethic-node",
+        collections=["commits"],
+        index_factory="HNSW32",
+        metric="ip",
+        storage="int8",
+        force=True
+    )
+
+    # Vectors reduced from 384 to 128 dims by a PCA learned at build time
+    # (queries are projected automatically, see scripts/evaluate_index.py)
+    fim.build_index(
+        repo="archethic-foundation/archethic-node",
+        collections=["commits"],
+        pca_dim=128,
+        force=True
     )
 
     # Later ...
     fim.load_index("archethic-foundation/archethic-node", "commits")
+    fim.refresh_if_stale()  # swap to a version built since, between two queries
+    fim.load_index("archethic-foundation/archethic-node", "commits", mmap=True)  # shared, read-only
     D, I, docs, meta_infos = fim.query("how to deploy multisig ?", top_k=3)
+    D, I, docs, meta_infos = fim.query("how to deploy multisig ?", top_k=3, nprobe=64)
+
+    # Filtered search inside a global index (applied during the Faiss search)
+    fim.load_index("archethic-foundation/archethic-node", "global")
+    D, I, docs, meta_infos = fim.query(
+        "how to deploy multisig ?", top_k=5,
+        filters={"collection_src": ["commits", "pull_requests"], "metadata_version": 2},
+    )
+
+    # Many questions at once (one model batch, one search, chunks read from the local store)
+    D, I, docs_per_question, metas_per_question = fim.query_many(
+        ["how to deploy multisig ?", "what is a transaction chain ?"], top_k=3
+    )
+
+On-disk layout: every build / update writes a new immutable version directory,
+then atomically replaces the CURRENT pointer, so readers never mix the files of
+two versions. Superseded versions are deleted after a grace period ::
+
+    <index_root>/<repo>/<repo>/commits/CURRENT            -> "v1718000000000000000"
+    <index_root>/<repo>/<repo>/commits/v1718000000000000000/commits.faiss
+                                                           /commits_mapping.bin
+                                                           /commits_chunks.bin
+                                                           /commits_info.json
+
+Indexes saved before versioning (`commits.faiss` next to the `commits/` directory)
+are still loaded, and replaced by the first versioned save.
 """
 
 from __future__ import annotations
 
 import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, Sequence
 
 import numpy as np
 import faiss  # type: ignore
+from bson import ObjectId
 
+from core.chunk_store import ChunkStore, ChunkStoreWriter, encode_chunk
 from core.database_manager import DatabaseManager
-from embeddings.embeddings import SentenceTransformerEmbeddingModel
+from core.index_filters import AttributeBitmaps
+from core.index_mapping import IndexMapping, chunk_faiss_ids
+from embeddings.embeddings import AbstractEmbeddingModel
+from embeddings.model_registry import get_query_embedding_model
+from utils.perf_helpers import peak_rss_bytes, format_bytes
+
+DEFAULT_BUILD_BATCH_SIZE = 4096  # Vectors added to the index per batch
+DEFAULT_INDEX_FACTORY = "Flat"   # Exact search, see faiss.index_factory for other specs
+DEFAULT_TRAIN_SAMPLE = 100_000   # Max vectors sampled to train IVF / PQ indexes and PCA
+DEFAULT_NPROBE = 32              # IVF lists visited per query
+DEFAULT_EF_SEARCH = 64           # HNSW candidate list size per query
+DEFAULT_METRIC = "l2"            # "l2" (euclidean) or "ip" (cosine: inner product of normalized vectors)
+DEFAULT_STORAGE = "float32"      # Vector storage: "float32", "fp16" or "int8" (scalar quantization)
+METRICS = {"l2": faiss.METRIC_L2, "ip": faiss.METRIC_INNER_PRODUCT}
+STORAGE_CODECS = {"float32": "Flat", "fp16": "SQfp16", "int8": "SQ8"}
+DEFAULT_VERSION_GRACE_SECONDS = 600  # Superseded index versions are kept this long for in-flight readers
+_METADATA_ID_SLICE = 10_000      # Max metadata ids per chunks `$in` query
+_CURRENT_FILE = "CURRENT"        # Name of the current version pointer of an index
+
+# Zero-copy, read-only loading: vectors / codes stay in the OS page cache and are
+# shared by every process opening the same file. IO_FLAG_MMAP_IFC (faiss >= 1.8)
+# covers flat codes (Flat, SQ, PQ, HNSW storage) and IVF lists; older builds only
+# know IO_FLAG_MMAP, which maps IVF inverted lists.
+_MMAP_READ_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", getattr(faiss, "IO_FLAG_MMAP", 0)) \
+    | getattr(faiss, "IO_FLAG_READ_ONLY", 0)
+
+class _LoadedIndex:
+    """
+    Everything a query needs from one index version. Never modified once
+    installed: a reload builds a new instance and swaps the reference.
+    """
+
+    def __init__(
+        self,
+        key: tuple[str, str] | None,
+        version: str | None,
+        index: faiss.Index,
+        mapping: IndexMapping,
+        info: Dict[str, Any],
+        mmapped: bool = False,
+        nbytes: int = 0,
+        chunks: ChunkStore | None = None,
+    ):
+        self.key = key  # (repo, index_name)
+        self.version = version  # None = legacy, unversioned files
+        self.index = index
+        self.mapping = mapping  # Faiss id -> chunk ObjectId + meta infos
+        self.info = info  # Sidecar infos (index factory, search params, ...)
+        self.mmapped = mmapped  # True if the index is memory-mapped (read-only)
+        self.nbytes = nbytes  # On-disk size of the index + mapping + chunk store
+        self.chunks = chunks  # Local chunk documents, None for indexes built before the chunk store
+        self.bitmaps: AttributeBitmaps | None = None  # Filter bitmaps / selectors, built on the first filtered query
+
 
 class FaissIndexManager:
     """Handles Faiss index creation, persistence, and similarity queries."""
@@ -41,7 +156,7 @@ class FaissIndexManager:
     def __init__(
         self,
         db: DatabaseManager,
-        embedding_model: SentenceTransformerEmbeddingModel | None = None,
+        embedding_model: AbstractEmbeddingModel | None = None,
         index_root: str | Path = "local_storage/indexes",
     ):
         """
@@ -49,35 +164,187 @@ class FaissIndexManager:
 
         Args:
             db (DatabaseManager): Connection to MongoDB.
-            embedding_model (SentenceTransformerEmbeddingModel, optional): Model to embed queries.
+            embedding_model (AbstractEmbeddingModel, optional): Model to embed queries, ideally
+                a QueryEmbeddingCache shared with the other index managers and the RAGEngine.
             index_root (str, optional):  base directory used to store indexes.
         """
         self.db = db
-        self.embedding_model = embedding_model or SentenceTransformerEmbeddingModel()
+        self._embedding_model = embedding_model  # Created on first query if not given
         self.index_root = Path(index_root)
-        self.index: faiss.Index | None = None
-        self.id_map: Dict[int, str] = {}  # Faiss idx -> chunk ObjectId
+        self._loaded: _LoadedIndex | None = None  # Swapped as a whole, read once per query
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def embedding_model(self) -> AbstractEmbeddingModel:
+        """
+        Model used to embed queries, the shared one of the model registry if none was
+        given. Resolved lazily so that processes which only build or load indexes do
+        not pay for the model start-up.
+        """
+        if self._embedding_model is None:
+            self._embedding_model = get_query_embedding_model()
+        return self._embedding_model
+
+    # ------------------------------------------------------------------
+    # Loaded index
+    # ------------------------------------------------------------------
+
+    @property
+    def index(self) -> faiss.Index | None:
+        """Faiss index currently loaded."""
+        return self._loaded.index if self._loaded else None
+
+    @property
+    def mapping(self) -> IndexMapping | None:
+        """Faiss id -> chunk ObjectId + meta infos of the loaded index."""
+        return self._loaded.mapping if self._loaded else None
+
+    @property
+    def info(self) -> Dict[str, Any]:
+        """Sidecar infos (index factory, search params, ...) of the loaded index."""
+        return self._loaded.info if self._loaded else {}
+
+    @property
+    def loaded_key(self) -> tuple[str, str] | None:
+        """(repo, index_name) currently loaded."""
+        return self._loaded.key if self._loaded else None
+
+    @property
+    def loaded_version(self) -> str | None:
+        """Version directory of the loaded index, None for legacy unversioned files."""
+        return self._loaded.version if self._loaded else None
+
+    @property
+    def loaded_bytes(self) -> int:
+        """On-disk size of the loaded index + mapping + chunk store (memory budget of IndexRegistry)."""
+        return self._loaded.nbytes if self._loaded else 0
 
-    def _paths(self, repo: str, index_name: str) -> tuple[Path, Path]:
+    @property
+    def mmapped(self) -> bool:
+        """True if the loaded index is memory-mapped (read-only)."""
+        return self._loaded.mmapped if self._loaded else False
+
+    def _install(
+        self, key: tuple[str, str] | None, version: str | None,
+        index: faiss.Index, mapping: IndexMapping, info: Dict[str, Any],
+        mmapped: bool = False, nbytes: int = 0, chunks: ChunkStore | None = None,
+    ) -> None:
+        """Make `index` the loaded index, with a single reference swap."""
+        self._loaded = _LoadedIndex(key, version, index, mapping, info, mmapped, nbytes, chunks)
+
+    # ------------------------------------------------------------------
+    # Paths and versions
+    # ------------------------------------------------------------------
+
+    def _paths(self, repo: str, index_name: str, version: str | None = None) -> tuple[Path, Path]:
         """
-        Compute the path for the FAISS .faiss and the mapping .json files.
+        Compute the path for the FAISS .faiss and the binary mapping .bin files.
         - index_name: e.g. 'commits', 'main_files', 'global'
+        - version: version directory, None for the legacy unversioned files
         """
-        safe_repo = repo.replace("/", "_")
-        base = self.index_root / safe_repo / safe_repo
+        base = self._version_dir(repo, index_name, version)
         return (
             base / f"{index_name}.faiss",
-            base / f"{index_name}_mapping.json",
+            base / f"{index_name}_mapping.bin",
         )
 
+    def _info_path(self, repo: str, index_name: str, version: str | None = None) -> Path:
+        """
+        Path of the JSON sidecar describing how the index was built and should be searched.
+        """
+        return self._version_dir(repo, index_name, version) / f"{index_name}_info.json"
+
+    def _chunks_path(self, repo: str, index_name: str, version: str | None = None) -> Path:
+        """
+        Path of the local chunk store written next to the index (see core/chunk_store.py).
+        """
+        return self._version_dir(repo, index_name, version) / f"{index_name}_chunks.bin"
+
+    def _version_dir(self, repo: str, index_name: str, version: str | None) -> Path:
+        """Directory of one version of an index (the repo directory for legacy files)."""
+        if version is None:
+            return self._base_dir(repo)
+        return self._versions_dir(repo, index_name) / version
+
+    def _versions_dir(self, repo: str, index_name: str) -> Path:
+        """Directory holding the CURRENT pointer and every version of an index."""
+        return self._base_dir(repo) / index_name
+
+    def current_version(self, repo: str, index_name: str) -> str | None:
+        """
+        Version the CURRENT pointer of an index designates, None if the index
+        was never saved with versioning.
+        """
+        try:
+            return (self._versions_dir(repo, index_name) / _CURRENT_FILE).read_text(encoding="utf-8").strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _index_exists(self, repo: str, index_name: str) -> bool:
+        """True if a versioned or legacy index has been saved for `index_name`."""
+        if self.current_version(repo, index_name) is not None:
+            return True
+        index_path, mapping_path = self._paths(repo, index_name)
+        return index_path.exists() and (mapping_path.exists() or self._legacy_mapping_path(repo, index_name).exists())
+
+    def _legacy_mapping_path(self, repo: str, index_name: str) -> Path:
+        """
+        Path of the JSON mapping written by previous versions (read-only support).
+        """
+        return self._base_dir(repo) / f"{index_name}_mapping.json"
+
+    def _base_dir(self, repo: str) -> Path:
+        """Directory holding every index of a repo."""
+        safe_repo = repo.replace("/", "_")
+        return self.index_root / safe_repo / safe_repo
+
     def build_index(
     self, repo: str, collections: list[str] | None = None,
-    force: bool = False, global_index: bool = False
-    ) -> None:
+    force: bool = False, global_index: bool = False,
+    batch_size: int = DEFAULT_BUILD_BATCH_SIZE,
+    index_factory: str = DEFAULT_INDEX_FACTORY,
+    train_sample: int = DEFAULT_TRAIN_SAMPLE,
+    nprobe: int | None = None, ef_search: int | None = None,
+    metric: str = DEFAULT_METRIC, storage: str = DEFAULT_STORAGE,
+    pca_dim: int | None = None
+    ) -> Dict[str, Any]:
         """
         Build or rebuild a Faiss index for all chunks with embeddings in a repo,
         for one or several collections (global_index=True = fusion multi-collections).
+
+        Metadata infos are prefetched in a single query, then chunk vectors are
+        streamed from MongoDB into a preallocated float32 buffer of `batch_size`
+        rows which is added to the index each time it is full. The chunk store
+        records of each batch are spooled to disk at the same time (ChunkStoreWriter).
+
+        `index_factory` accepts any faiss.index_factory description, e.g. "Flat",
+        "HNSW32", "IVF4096,Flat" or "IVF4096,PQ48". Indexes that need training are
+        trained on a random sample of at most `train_sample` vectors. The default
+        nprobe / efSearch are stored in the index sidecar and used by query().
+
+        `metric="ip"` L2-normalizes every vector (and every query), so scores are
+        cosine similarities in [-1, 1], comparable across indexes. `storage`
+        replaces the float32 vectors of Flat / HNSW / IVF indexes with fp16
+        (2x smaller) or int8 (4x smaller) scalar-quantized codes.
+
+        `pca_dim` reduces the vectors to `pca_dim` dimensions with a PCA fitted on
+        the training sample. The projection is saved inside the .faiss file
+        (IndexPreTransform) and applied to every query vector by Faiss itself;
+        with `metric="ip"` the projected vectors are re-normalized.
+
+        Vectors are stored under stable 64-bit ids derived from their chunk ids,
+        so the index can later be refreshed in place with apply_changes().
+
+        Returns:
+            Dict[str, Any]: Build summary {repo, index_name, status ("built", "exists"
+            or "empty"), vectors, seconds, bytes (on disk), version}.
         """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric '{metric}', expected one of {list(METRICS)}.")
+        index_factory = _apply_storage(index_factory, storage)
+        if pca_dim is not None and pca_dim <= 0:
+            raise ValueError(f"pca_dim must be a positive number of dimensions, got {pca_dim}.")
+
         if global_index:
             index_name = "global"
         elif collections and len(collections) == 1:
@@ -85,12 +352,18 @@ class FaissIndexManager:
         else:
             raise ValueError("Specify one collection for legacy mode, or global_index=True for multi.")
 
-        index_path, mapping_path = self._paths(repo, index_name)
-        if not force and index_path.exists() and mapping_path.exists():
+        t0 = time.perf_counter()
+        summary: Dict[str, Any] = {"repo": repo, "index_name": index_name, "status": "empty",
+                                   "vectors": 0, "seconds": 0.0, "bytes": 0, "version": None}
+        if not force and self._index_exists(repo, index_name):
             print(f"[FaissIndex] Index already exists for {index_name} – use force=True to overwrite")
-            return
+            summary["status"] = "exists"
+            return summary
+
+        # Changes logged before this point are covered by the rebuild
+        last_change = self.db.db.chunk_changes.find_one({"repo": repo}, {"_id": 1}, sort=[("_id", -1)])
 
-        # 1. Find relevant metadata_id
+        # 1. Prefetch collection_src / metadata_version of every relevant metadata at once
         meta_query: dict[str, Any] = {"repo": repo}
         if global_index and collections:
             meta_query["collection_src"] = {"$in": collections}
@@ -98,103 +371,741 @@ class FaissIndexManager:
             meta_query["collection_src"] = index_name
 
         print(f"[FaissIndex][DEBUG] Querying metadata with: {meta_query}")
-        meta_cursor = self.db.db.metadata.find(meta_query, {"_id": 1})
-        metadata_ids = [m["_id"] for m in meta_cursor]
-        print(f"[FaissIndex][DEBUG] Found {len(metadata_ids)} metadata entries.")
+        meta_by_id = self._prefetch_metadata(meta_query)
+        print(f"[FaissIndex][DEBUG] Found {len(meta_by_id)} metadata entries.")
 
-        if not metadata_ids:
+        if not meta_by_id:
             print("[FaissIndex] No metadata found – index not built.")
-            return
+            return summary
+
+        # 2. Create (and train if needed) the index from the embedding dimension
+        dim = self._probe_dimension(meta_by_id)
+        if dim is None:
+            print("[FaissIndex] No usable embeddings found – index not built.")
+            return summary
+        if pca_dim:
+            if pca_dim >= dim:
+                raise ValueError(f"pca_dim ({pca_dim}) must be lower than the embedding dimension ({dim}).")
+            index_factory = _apply_pca(index_factory, pca_dim, metric)
+        base_index = faiss.index_factory(dim, index_factory, METRICS[metric])
+        if not base_index.is_trained:
+            self._train_index(base_index, index_factory, meta_by_id, train_sample, metric)
+        index = _with_stable_ids(base_index)
+
+        # 3. Stream the chunk vectors batch by batch into the index, and their chunk
+        #    store records into a temporary file next to the index
+        ids: list[str] = []
+        meta_info: list[dict] = []
+        self._versions_dir(repo, index_name).mkdir(parents=True, exist_ok=True)
+        chunks_writer = ChunkStoreWriter(self._versions_dir(repo, index_name))
+        try:
+            for batch, batch_ids, batch_metas, batch_records in self._iter_embedding_batches(meta_by_id, batch_size):
+                batch_faiss_ids = chunk_faiss_ids(batch_ids)
+                index.add_with_ids(_prepare_vectors(batch, metric), batch_faiss_ids)  # type: ignore
+                chunks_writer.add(batch_faiss_ids, batch_records)
+                ids.extend(batch_ids)
+                meta_info.extend(batch_metas)
 
-        # 2. Find the chunks corresponding to the metadata_id
-        chunk_query = {
-            "metadata_id": {"$in": metadata_ids},
-            "embedding": {"$exists": True}
+            print(f"[FaissIndex][DEBUG] Found {len(ids)} embedding vectors for index '{index_name}'.")
+            if not ids:
+                print("[FaissIndex] No usable embeddings found – index not built.")
+                return summary
+
+            mapping = IndexMapping.from_records(ids, meta_info, ids=chunk_faiss_ids(ids))
+            info = {
+                "repo": repo,
+                "index_name": index_name,
+                "collections": collections if global_index else [index_name],  # None = every collection
+                "index_factory": index_factory,
+                "metric": metric,
+                "storage": storage,
+                "dim": dim,  # Dimension of the stored embeddings (and of the queries), before any PCA
+                "pca_dim": pca_dim or None,
+                "ntotal": int(index.ntotal),
+                "id_mapped": True,
+                "search_params": self._default_search_params(index, nprobe, ef_search),
+                "last_change_id": str(last_change["_id"]) if last_change else None,
+            }
+            version, nbytes = self._save(repo, index_name, index, mapping, info, chunks_writer)
+        finally:
+            chunks_writer.close()
+        chunks = ChunkStore.load(self._chunks_path(repo, index_name, version))
+        self._install((repo, index_name), version, index, mapping, info, nbytes=nbytes, chunks=chunks)
+
+        elapsed = time.perf_counter() - t0
+        print(f"[FaissIndex] Built & saved {index_factory} index ({index_name}, metric={metric}) – "
+              f"{len(ids)} vectors, {format_bytes(nbytes)} on disk ({version}), "
+              f"in {elapsed:.2f}s (peak RSS {format_bytes(peak_rss_bytes())}).")
+        summary.update(status="built", vectors=len(ids), seconds=elapsed, bytes=nbytes, version=version)
+        return summary
+
+    def _prefetch_metadata(self, meta_query: dict[str, Any]) -> Dict[str, dict]:
+        """
+        Load collection_src / metadata_version / repo of all metadata matching `meta_query`
+        in a single query, so that chunks can be joined in memory.
+
+        Returns:
+            Dict[str, dict]: metadata _id -> {"collection_src", "metadata_version", "repo"}
+        """
+        projection = {"_id": 1, "collection_src": 1, "metadata_version": 1, "repo": 1}
+        return {
+            m["_id"]: {
+                "collection_src": m.get("collection_src", ""),
+                "metadata_version": m.get("metadata_version", None),
+                "repo": m.get("repo", ""),
+            }
+            for m in self.db.db.metadata.find(meta_query, projection)
         }
-        print(f"[FaissIndex][DEBUG] Querying chunks with: {chunk_query}")
-        projection = {"_id": 1, "embedding": 1, "metadata_id": 1}
-        chunks_found = self.db.db.chunks.find(chunk_query, projection)
-
-        vectors, ids, meta_info = [], [], []
-        for doc in chunks_found:
-            vec = doc["embedding"]
-            if isinstance(vec, list) and vec:
-                vectors.append(vec)
+
+    def _chunk_queries(self, meta_by_id: Dict[str, dict]) -> Iterator[dict[str, Any]]:
+        """
+        Yield the chunk queries covering every metadata of `meta_by_id`.
+
+        The `$in` list is sliced so that huge repos do not hit the BSON document size limit.
+        """
+        metadata_ids = list(meta_by_id)
+        for start in range(0, len(metadata_ids), _METADATA_ID_SLICE):
+            yield {
+                "metadata_id": {"$in": metadata_ids[start:start + _METADATA_ID_SLICE]},
+                "embedding": {"$exists": True}
+            }
+
+    def _probe_dimension(self, meta_by_id: Dict[str, dict]) -> int | None:
+        """Return the dimension of the first usable embedding, None if there is none."""
+        for chunk_query in self._chunk_queries(meta_by_id):
+            for doc in self.db.db.chunks.find(chunk_query, {"embedding": 1}):
+                vec = doc["embedding"]
+                if isinstance(vec, list) and vec:
+                    return len(vec)
+        return None
+
+    def _sample_vectors(self, meta_by_id: Dict[str, dict], sample_size: int, dim: int) -> np.ndarray:
+        """
+        Draw a random sample of about `sample_size` embeddings with `$sample`,
+        proportionally to the size of each metadata slice.
+        """
+        vectors: list[list[float]] = []
+        for chunk_query in self._chunk_queries(meta_by_id):
+            slice_size = len(chunk_query["metadata_id"]["$in"])
+            size = max(1, math.ceil(sample_size * slice_size / len(meta_by_id)))
+            pipeline = [
+                {"$match": chunk_query},
+                {"$sample": {"size": size}},
+                {"$project": {"_id": 0, "embedding": 1}},
+            ]
+            for doc in self.db.db.chunks.aggregate(pipeline, allowDiskUse=True):
+                vec = doc["embedding"]
+                if isinstance(vec, list) and len(vec) == dim:
+                    vectors.append(vec)
+        return np.asarray(vectors[:sample_size], dtype=np.float32).reshape(-1, dim)
+
+    def _train_index(self, index: faiss.Index, index_factory: str,
+                     meta_by_id: Dict[str, dict], train_sample: int, metric: str = DEFAULT_METRIC) -> None:
+        """Train `index` on a random sample of the embeddings to index."""
+        t0 = time.perf_counter()
+        sample = _prepare_vectors(self._sample_vectors(meta_by_id, train_sample, index.d), metric)
+        print(f"[FaissIndex] Training {index_factory} index on {len(sample)} sampled vectors...")
+        try:
+            index.train(sample)  # type: ignore
+        except RuntimeError as exc:
+            raise ValueError(
+                f"Cannot train a '{index_factory}' index with {len(sample)} vectors "
+                f"(too few embeddings for this index type?): {exc}"
+            ) from exc
+        print(f"[FaissIndex] Training done in {time.perf_counter() - t0:.2f}s.")
+
+    def _iter_embedding_batches(
+        self, meta_by_id: Dict[str, dict], batch_size: int
+    ) -> Iterator[tuple[np.ndarray, list[str], list[dict], list[bytes]]]:
+        """
+        Stream chunk embeddings belonging to `meta_by_id` in fixed-size batches.
+
+        A single float32 buffer of `batch_size` rows is allocated once and reused,
+        so yielded matrices are only valid until the next iteration.
+
+        Yields:
+            tuple: (float32 matrix view, chunk ids, meta infos, chunk store records) for each batch.
+        """
+        projection = {"_id": 1, "embedding": 1, "metadata_id": 1, "chunk_index": 1, "chunk_src": 1}
+        buffer: np.ndarray | None = None
+        ids: list[str] = []
+        metas: list[dict] = []
+        records: list[bytes] = []
+        skipped = 0
+
+        for chunk_query in self._chunk_queries(meta_by_id):
+            cursor = self.db.db.chunks.find(chunk_query, projection, batch_size=batch_size)
+            for doc in cursor:
+                vec = doc["embedding"]
+                if not isinstance(vec, list) or not vec:
+                    continue
+                if buffer is None:
+                    buffer = np.empty((batch_size, len(vec)), dtype=np.float32)
+                elif len(vec) != buffer.shape[1]:
+                    skipped += 1
+                    continue
+
+                buffer[len(ids)] = vec
                 ids.append(str(doc["_id"]))
-                # Retrieve collection_src and metadata_version via metadata_id
-                meta_id = doc["metadata_id"]
-                meta = self.db.db.metadata.find_one({"_id": meta_id}, {"collection_src": 1, "metadata_version": 1})
-                meta_info.append({
-                    "collection_src": meta.get("collection_src", "") if meta else "",
-                    "metadata_version": meta.get("metadata_version", None) if meta else None
-                })
-
-        print(f"[FaissIndex][DEBUG] Found {len(ids)} embedding vectors for index '{index_name}'.")
-        if not vectors:
-            print("[FaissIndex] No usable embeddings found – index not built.")
-            return
+                metas.append(dict(meta_by_id.get(doc["metadata_id"],
+                                                 {"collection_src": "", "metadata_version": None, "repo": ""})))
+                records.append(encode_chunk(doc))
+
+                if len(ids) == batch_size:
+                    yield buffer, ids, metas, records
+                    ids, metas, records = [], [], []
 
-        mat = np.asarray(vectors, dtype=np.float32)
-        dim = mat.shape[1]
-        self.index = faiss.IndexFlatL2(dim)
-        self.index.add(mat)  # type: ignore
+        if buffer is not None and ids:
+            yield buffer[:len(ids)], ids, metas, records
+        if skipped:
+            print(f"[FaissIndex] Skipped {skipped} chunks with an unexpected embedding dimension.")
 
-        self.id_map = {i: oid for i, oid in enumerate(ids)}
-        self.meta_map = {i: meta for i, meta in enumerate(meta_info)}
+    def _save(
+        self, repo: str, index_name: str,
+        index: faiss.Index, mapping: IndexMapping, info: Dict[str, Any],
+        chunks: ChunkStore | ChunkStoreWriter | None = None,
+    ) -> tuple[str, int]:
+        """
+        Persist an index, its mapping, chunk store and sidecar infos as a new version
+        of `index_name`, then atomically point CURRENT to it and garbage-collect old versions.
+
+        Returns:
+            tuple[str, int]: The new version and the on-disk size of its index + mapping + chunk store.
+        """
+        previous = self.current_version(repo, index_name)
+        version = f"v{time.time_ns()}"
+        index_path, mapping_path = self._paths(repo, index_name, version)
+        index_path.parent.mkdir(parents=True)
+        faiss.write_index(index, str(index_path))
+        mapping.save(mapping_path)
+        if chunks is not None:
+            chunks.save(self._chunks_path(repo, index_name, version))
+        with open(self._info_path(repo, index_name, version), "w", encoding="utf-8") as f:
+            json.dump(info, f, indent=2)
+
+        current_path = self._versions_dir(repo, index_name) / _CURRENT_FILE
+        tmp_path = current_path.with_name(f"{_CURRENT_FILE}.tmp")
+        tmp_path.write_text(version, encoding="utf-8")
+        os.replace(tmp_path, current_path)
 
-        index_path.parent.mkdir(parents=True, exist_ok=True)
-        faiss.write_index(self.index, str(index_path))
-        with open(mapping_path, "w", encoding="utf-8") as f:
-            json.dump({
-                "id_map": self.id_map,
-                "meta_map": self.meta_map
-            }, f)
-        self._current_mapping_path = mapping_path
-        print(f"[FaissIndex] Built & saved index ({index_name}) – {len(ids)} vectors.")
+        # The grace period of the superseded version starts now
+        if previous is not None and self._version_dir(repo, index_name, previous).exists():
+            os.utime(self._version_dir(repo, index_name, previous))
+        self._remove_legacy_files(repo, index_name)
+        self.gc_versions(repo, index_name)
+        return version, _files_size(index_path, mapping_path, self._chunks_path(repo, index_name, version))
+
+    def _remove_legacy_files(self, repo: str, index_name: str) -> None:
+        """Drop the unversioned files of `index_name`, superseded by a versioned save."""
+        for path in (*self._paths(repo, index_name), self._info_path(repo, index_name),
+                     self._legacy_mapping_path(repo, index_name)):
+            path.unlink(missing_ok=True)
+
+    def gc_versions(
+        self, repo: str, index_name: str, grace_seconds: float = DEFAULT_VERSION_GRACE_SECONDS
+    ) -> int:
+        """
+        Delete the versions of `index_name` superseded for more than `grace_seconds`,
+        leaving time to processes still reading them to switch to the current one.
 
+        Returns:
+            int: Number of versions deleted.
+        """
+        current = self.current_version(repo, index_name)
+        versions_dir = self._versions_dir(repo, index_name)
+        if current is None or not versions_dir.exists():
+            return 0
+        deadline = time.time() - grace_seconds
+        removed = 0
+        for path in versions_dir.iterdir():
+            if path.is_dir() and path.name != current and path.stat().st_mtime < deadline:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        if removed:
+            print(f"[FaissIndex] Deleted {removed} old version(s) of index ({index_name}).")
+        return removed
+
+    def apply_changes(self, repo: str, index_name: str, batch_size: int = DEFAULT_BUILD_BATCH_SIZE) -> int:
+        """
+        Update a saved index in place from the `chunk_changes` log written by
+        MetadataGenerator, instead of rebuilding it from every embedding.
+
+        Every chunk id logged as removed or added since the last applied change
+        is removed from the index, then the chunks still present in MongoDB are
+        re-added with their current embedding. Applying the same changes twice
+        is therefore harmless.
+
+        Args:
+            repo (str): Repository of the index.
+            index_name (str): Name of the index ('commits', 'global', ...).
+            batch_size (int): Max number of chunks fetched per query.
+
+        Returns:
+            int: Number of change log entries applied.
+        """
+        t0 = time.perf_counter()
+        # Work on a private copy: the loaded index keeps serving queries meanwhile
+        loaded = self._read_version(repo, index_name, self._resolve_version(repo, index_name))
+        index, info = loaded.index, dict(loaded.info)
+        if not info.get("id_mapped"):
+            raise ValueError(f"Index '{index_name}' was built without stable ids – rebuild it with force=True.")
+        if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)) \
+                and faiss.try_extract_index_ivf(index.index) is not None:
+            raise ValueError(f"Index '{index_name}' wraps its IVF lists in an IndexIDMap, which removals "
+                             f"corrupt – rebuild it with force=True.")
+
+        change_query: dict[str, Any] = {"repo": repo}
+        if info.get("collections"):
+            change_query["collection_src"] = {"$in": info["collections"]}
+        if info.get("last_change_id"):
+            change_query["_id"] = {"$gt": ObjectId(info["last_change_id"])}
+        changes = list(self.db.db.chunk_changes.find(change_query).sort("_id", 1))
+        if not changes:
+            print(f"[FaissIndex] Index ({index_name}) is up to date.")
+            return 0
+
+        # Net effect of the log: drop every touched chunk, re-add the ones that still exist
+        touched: dict[str, None] = {}
+        added: dict[str, None] = {}
+        for change in changes:
+            touched.update(dict.fromkeys(change.get("removed", [])))
+            touched.update(dict.fromkeys(change.get("added", [])))
+            added.update(dict.fromkeys(change.get("added", [])))
+
+        added_ids, added_metas, added_records, vectors = self._fetch_chunks(list(added), info["dim"], batch_size)
+
+        removed_ids = chunk_faiss_ids(touched)
+        try:
+            index.remove_ids(faiss.IDSelectorBatch(removed_ids))  # type: ignore
+        except RuntimeError as exc:
+            raise ValueError(
+                f"Index type '{info['index_factory']}' does not support removals – "
+                f"rebuild it with force=True: {exc}"
+            ) from exc
+        if added_ids:
+            vectors = _prepare_vectors(vectors, info.get("metric", DEFAULT_METRIC))
+            index.add_with_ids(vectors, chunk_faiss_ids(added_ids))  # type: ignore
+
+        mapping = loaded.mapping.with_changes(removed_ids, chunk_faiss_ids(added_ids), added_ids, added_metas)
+        chunks = None
+        if loaded.chunks is not None:
+            chunks = loaded.chunks.with_changes(loaded.mapping.ids, removed_ids,
+                                                chunk_faiss_ids(added_ids), added_records)
+        info["ntotal"] = int(index.ntotal)
+        info["last_change_id"] = str(changes[-1]["_id"])
+        version, nbytes = self._save(repo, index_name, index, mapping, info, chunks)
+        self._install((repo, index_name), version, index, mapping, info, nbytes=nbytes, chunks=chunks)
+
+        print(f"[FaissIndex] Applied {len(changes)} changes to index ({index_name}) – "
+              f"{len(touched)} chunks removed, {len(added_ids)} re-added in {time.perf_counter() - t0:.2f}s.")
+        return len(changes)
+
+    def _fetch_chunks(
+        self, chunk_ids: list[str], dim: int, batch_size: int
+    ) -> tuple[list[str], list[dict], list[bytes], np.ndarray]:
+        """
+        Fetch the `dim`-dimensional embeddings, meta infos and chunk store records
+        of `chunk_ids` that still exist in MongoDB.
+
+        Returns:
+            tuple: (found chunk ids, meta infos, chunk store records, float32 matrix of embeddings)
+        """
+        found_ids: list[str] = []
+        metadata_ids: list[str] = []
+        records: list[bytes] = []
+        vectors = np.empty((len(chunk_ids), dim), dtype=np.float32)
+        projection = {"_id": 1, "embedding": 1, "metadata_id": 1, "chunk_index": 1, "chunk_src": 1}
+        for start in range(0, len(chunk_ids), _METADATA_ID_SLICE):
+            chunk_query = {"_id": {"$in": chunk_ids[start:start + _METADATA_ID_SLICE]},
+                           "embedding": {"$exists": True}}
+            for doc in self.db.db.chunks.find(chunk_query, projection, batch_size=batch_size):
+                vec = doc["embedding"]
+                if isinstance(vec, list) and len(vec) == dim:
+                    vectors[len(found_ids)] = vec
+                    found_ids.append(str(doc["_id"]))
+                    metadata_ids.append(doc["metadata_id"])
+                    records.append(encode_chunk(doc))
 
+        meta_by_id = self._prefetch_metadata({"_id": {"$in": list(set(metadata_ids))}})
+        metas = [dict(meta_by_id.get(mid, {"collection_src": "", "metadata_version": None, "repo": ""}))
+                 for mid in metadata_ids]
+        return found_ids, metas, records, vectors[:len(found_ids)]
 
-    def load_index(self, repo: str, index_name: str) -> None:
+    def load_index(self, repo: str, index_name: str, mmap: bool = False) -> None:
         """
         Load a previously-saved index and mapping (for 'commits', 'global', etc).
+        The mapping is loaded once here and reused by every query.
+
+        Args:
+            repo (str): Repository name.
+            index_name (str): Index name, e.g. 'commits' or 'global'.
+            mmap (bool): Memory-map the index read-only instead of copying it in RAM.
+                Loading is near-instant and the pages are shared between processes,
+                but the index can no longer be modified (see apply_changes).
         """
-        index_path, mapping_path = self._paths(repo, index_name)
-        if not index_path.exists() or not mapping_path.exists():
+        self._loaded = self._read_version(repo, index_name, self._resolve_version(repo, index_name), mmap)
+
+    def refresh_if_stale(self) -> bool:
+        """
+        Swap to the current version of the loaded index if a newer one was saved
+        (by another process or manager) since it was loaded.
+
+        The new version is read while queries keep running on the old one, then
+        installed with a single reference swap: in-flight searches finish on the
+        version they started with. Only one thread reloads at a time, the others
+        keep serving the loaded version meanwhile.
+
+        Returns:
+            bool: True if a new version was installed.
+        """
+        loaded = self._loaded
+        if loaded is None or loaded.key is None:
+            return False
+        repo, index_name = loaded.key
+        version = self.current_version(repo, index_name)
+        if version is None or version == loaded.version:
+            return False
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            if self._loaded is not loaded:
+                return False  # Swapped by a concurrent load
+            self._loaded = self._read_version(repo, index_name, version, loaded.mmapped)
+        except FileNotFoundError:
+            return False  # Superseded again and collected meanwhile, next call retries
+        finally:
+            self._refresh_lock.release()
+        print(f"[FaissIndex] Reloaded index ({index_name}): {loaded.version} -> {version}.")
+        return True
+
+    def _resolve_version(self, repo: str, index_name: str) -> str | None:
+        """
+        Current version of `index_name`, None for a legacy unversioned index.
+
+        Raises:
+            FileNotFoundError: If the index was never saved.
+        """
+        if not self._index_exists(repo, index_name):
             raise FileNotFoundError("Index or mapping file not found.")
+        return self.current_version(repo, index_name)
 
-        self.index = faiss.read_index(str(index_path))
-        self._current_mapping_path = mapping_path 
+    def _read_version(
+        self, repo: str, index_name: str, version: str | None, mmap: bool = False
+    ) -> _LoadedIndex:
+        """Read one version of an index, its mapping and sidecar infos (without installing it)."""
+        index_path, mapping_path = self._paths(repo, index_name, version)
+        if mmap:
+            index = faiss.read_index(str(index_path), _MMAP_READ_FLAGS)
+        else:
+            index = faiss.read_index(str(index_path))
+
+        legacy_mapping_path = self._legacy_mapping_path(repo, index_name)
+        if mapping_path.exists() or version is not None:
+            mapping = IndexMapping.load(mapping_path)
+        else:
+            mapping_path = legacy_mapping_path
+            mapping = IndexMapping.from_json(legacy_mapping_path)
+
+        chunks_path = self._chunks_path(repo, index_name, version)
+        chunks = ChunkStore.load(chunks_path) if chunks_path.exists() else None
+
+        info = self._read_info(repo, index_name, version)
+        nbytes = _files_size(index_path, mapping_path, chunks_path)
+        return _LoadedIndex((repo, index_name), version, index, mapping, info, mmap, nbytes, chunks)
+
+    def _read_info(self, repo: str, index_name: str, version: str | None) -> Dict[str, Any]:
+        """Sidecar infos of one version of an index."""
+        info_path = self._info_path(repo, index_name, version)
+        if not info_path.exists():
+            # Indexes built before the sidecar existed are exact Flat indexes
+            return {"index_factory": DEFAULT_INDEX_FACTORY, "search_params": {}}
+        with open(info_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def build_options(self, repo: str, index_name: str) -> Dict[str, Any]:
+        """
+        build_index() keyword arguments reproducing the current version of an index:
+        its index_factory (without the storage / PCA parts build_index adds back),
+        metric, storage, pca_dim and default nprobe / efSearch.
 
-        mapping = self._load_mapping()
-        self.id_map = mapping["id_map"]
-        self.meta_map = mapping.get("meta_map", {})
+        Raises:
+            FileNotFoundError: If the index was never saved.
+        """
+        info = self._read_info(repo, index_name, self._resolve_version(repo, index_name))
+        metric = info.get("metric", DEFAULT_METRIC)
+        storage = info.get("storage", DEFAULT_STORAGE)
+        pca_dim = info.get("pca_dim")
+        search_params = info.get("search_params", {})
+        return {
+            "index_factory": _base_index_factory(info["index_factory"], storage, pca_dim, metric),
+            "metric": metric,
+            "storage": storage,
+            "pca_dim": pca_dim,
+            "nprobe": search_params.get("nprobe"),
+            "ef_search": search_params.get("efSearch"),
+        }
 
-    def query(self, query_text: str, top_k: int = 5) -> tuple[np.ndarray, np.ndarray, list[dict], list[dict]]:
+    def query(
+        self, query_text: str, top_k: int = 5,
+        nprobe: int | None = None, ef_search: int | None = None,
+        filters: Dict[str, Any] | None = None,
+    ) -> tuple[np.ndarray, np.ndarray, list[dict], list[dict]]:
         """
         Perform a similarity search. Returns distances, indices, chunk docs, meta-info for each.
+        `nprobe` (IVF) and `ef_search` (HNSW) override the defaults stored with the index.
+        `filters` restricts the search to chunks matching collection_src / metadata_version / repo,
+        e.g. {"collection_src": "commits"} or {"collection_src": ["issues", "pull_requests"]}.
         """
-        if self.index is None:
+        D, I, docs, chunk_metas = self.query_many([query_text], top_k, nprobe=nprobe,
+                                                  ef_search=ef_search, filters=filters)
+        return D, I, docs[0], chunk_metas[0]
+
+    def query_many(
+        self, query_texts: Sequence[str], top_k: int = 5,
+        nprobe: int | None = None, ef_search: int | None = None,
+        filters: Dict[str, Any] | None = None,
+    ) -> tuple[np.ndarray, np.ndarray, list[list[dict]], list[list[dict]]]:
+        """
+        Batched similarity search: all questions are embedded in one model batch,
+        searched with a single index.search call, and the referenced chunks are
+        read from the local chunk store of the index (or, for indexes built
+        without one, fetched with a single MongoDB `$in` query).
+
+        Filters are applied inside the Faiss search (see core/index_filters.py),
+        so the top_k results all match them.
+
+        Returns:
+            tuple: distances (n, top_k), indices (n, top_k), and for each question
+            its chunk docs (ranked) and meta-infos.
+        """
+        loaded = self._loaded  # Same version for the whole query, even if a reload happens
+        if loaded is None:
             raise RuntimeError("Faiss index not loaded. Call load_index() or build_index() first.")
+        if not query_texts:
+            return np.empty((0, top_k), dtype=np.float32), np.empty((0, top_k), dtype=np.int64), [], []
 
-        query_vec = np.asarray([self.embedding_model.encode(query_text)], dtype=np.float32)
-        D, I = self.index.search(query_vec, top_k) # type: ignore  # faiss types are not well defined
+        D, I = self._search(loaded, self._encode_queries(query_texts), top_k, nprobe, ef_search, filters)
 
         # Retrieves _id and meta-info for each returned chunk
-        mapping = self._load_mapping()  # reads the associated .json file (see below)
-        id_map = mapping["id_map"]
-        meta_map = mapping.get("meta_map", {})
-
-        chunk_ids = [id_map[str(idx)] for idx in I[0] if str(idx) in id_map]
-        chunk_metas = [meta_map.get(str(idx), {}) for idx in I[0]]
+        chunk_metas = [loaded.mapping.metas(row) for row in I]
+        if loaded.chunks is not None:
+            docs = [self._local_chunks(loaded, row) for row in I]
+            return D, I, docs, chunk_metas
+        chunk_ids = [loaded.mapping.chunk_ids(row) for row in I]
 
-        # Search for chunks in Mongo
-        docs = list(self.db.db.chunks.find({"_id": {"$in": chunk_ids}}))
+        # Search for the chunks of every question in Mongo at once
+        unique_ids = list(dict.fromkeys(cid for ids in chunk_ids for cid in ids))
+        docs_by_id = {doc["_id"]: doc for doc in self.db.db.chunks.find({"_id": {"$in": unique_ids}})}
+        docs = [[docs_by_id[cid] for cid in ids if cid in docs_by_id] for ids in chunk_ids]
 
         return D, I, docs, chunk_metas
 
-    def _load_mapping(self):
+    def search_vectors(
+        self, query_vecs: np.ndarray, top_k: int = 5,
+        nprobe: int | None = None, ef_search: int | None = None,
+        filters: Dict[str, Any] | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Search already embedded queries (float32, shape (n, info["dim"])), e.g. to
+        evaluate an index. Vectors are normalized / projected like in query_many,
+        on a copy.
+
+        Returns:
+            tuple: distances (n, top_k) and Faiss ids (n, top_k), -1 for missing results.
         """
-        Reload the mapping file currently in use (called by query()).
+        loaded = self._loaded
+        if loaded is None:
+            raise RuntimeError("Faiss index not loaded. Call load_index() or build_index() first.")
+        return self._search(loaded, np.array(query_vecs, dtype=np.float32), top_k, nprobe, ef_search, filters)
+
+    def _search(
+        self, loaded: _LoadedIndex, query_vecs: np.ndarray, top_k: int,
+        nprobe: int | None, ef_search: int | None, filters: Dict[str, Any] | None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Search `query_vecs` (normalized in place for "ip") in one loaded index version."""
+        query_vecs = _prepare_vectors(query_vecs, loaded.info.get("metric", DEFAULT_METRIC))
+        params = self._search_parameters(loaded, nprobe, ef_search)
+        if filters:
+            return self._filtered_search(loaded, query_vecs, top_k, params, filters)
+        return loaded.index.search(query_vecs, top_k, params=params) # type: ignore  # faiss types are not well defined
+
+    def _local_chunks(self, loaded: _LoadedIndex, faiss_ids: np.ndarray) -> list[dict]:
+        """Chunk docs of `faiss_ids` (ranked) read from the chunk store, skipping -1 labels."""
+        return [{"_id": loaded.mapping.chunk_id(int(row)), **loaded.chunks.record(int(row))}  # type: ignore[union-attr]
+                for row in loaded.mapping.rows(faiss_ids) if row >= 0]
+
+    def _filtered_search(
+        self, loaded: _LoadedIndex, query_vecs: np.ndarray, top_k: int,
+        params: faiss.SearchParameters | None, filters: Dict[str, Any]
+    ) -> tuple[np.ndarray, np.ndarray]:
         """
-        with open(self._current_mapping_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        Search only the vectors matching `filters`, through an IDSelectorBitmap.
+
+        Selectors given to an IndexIDMap are tested against the (63-bit) external
+        ids, so the bitmap is built over the internal positions and the wrapped
+        index is searched directly; labels are translated back afterwards.
+
+        IVF indexes with stable ids store those 63-bit ids in their lists and test
+        the selector against them: the bitmap is then built over the mapping rows
+        and turned into an IDSelectorBatch of the selected ids, cached per filter.
+        """
+        ids_in_lists = _ids_in_lists(loaded.index, loaded.info)
+        if loaded.bitmaps is None:
+            internal_ids = loaded.mapping.ids if ids_in_lists else _internal_ids(loaded.index)
+            loaded.bitmaps = AttributeBitmaps(loaded.mapping, internal_ids,
+                                              constants={"repo": loaded.info.get("repo")})
+        bitmaps = loaded.bitmaps
+        bitmap = bitmaps.bitmap(filters)
+        if not bitmap.any():
+            no_score = -np.inf if loaded.info.get("metric") == "ip" else np.inf
+            return (np.full((len(query_vecs), top_k), no_score, dtype=np.float32),
+                    np.full((len(query_vecs), top_k), -1, dtype=np.int64))
+
+        # Referenced until the search returns
+        selector = bitmaps.id_selector(filters, bitmap) if ids_in_lists else bitmaps.selector(bitmap)
+        if params is None:
+            ivf = faiss.try_extract_index_ivf(loaded.index) is not None
+            params = faiss.SearchParametersIVF() if ivf else faiss.SearchParameters()
+        params.sel = selector
+        if isinstance(loaded.index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+            D, I = loaded.index.index.search(query_vecs, top_k, params=params) # type: ignore
+            I = np.where(I >= 0, bitmaps.internal_ids[np.maximum(I, 0)], -1)
+        else:
+            D, I = loaded.index.search(query_vecs, top_k, params=params) # type: ignore
+        return D, I
+
+    def _encode_queries(self, query_texts: Sequence[str]) -> np.ndarray:
+        """
+        Embed all query texts in a single model batch, as a float32 matrix.
+        The matrix is owned by the caller (a QueryEmbeddingCache returns copies).
+        """
+        return self.embedding_model.encode_batch(query_texts, batch_size=max(len(query_texts), 1))
+
+    def _default_search_params(
+        self, index: faiss.Index, nprobe: int | None, ef_search: int | None
+    ) -> Dict[str, int]:
+        """
+        Search parameters persisted with a freshly built index, depending on its type.
+        """
+        inner = _unwrap_index(index)
+        if faiss.try_extract_index_ivf(index) is not None:
+            return {"nprobe": nprobe or DEFAULT_NPROBE}
+        if isinstance(inner, faiss.IndexHNSW):
+            return {"efSearch": ef_search or DEFAULT_EF_SEARCH}
+        return {}
+
+    def _search_parameters(
+        self, loaded: _LoadedIndex, nprobe: int | None = None, ef_search: int | None = None
+    ) -> faiss.SearchParameters | None:
+        """
+        Build the faiss search parameters of a loaded index: stored defaults,
+        overridden by the values given for this query.
+        """
+        stored = loaded.info.get("search_params", {})
+        if "nprobe" in stored or (nprobe and faiss.try_extract_index_ivf(loaded.index) is not None):
+            return faiss.SearchParametersIVF(nprobe=nprobe or stored.get("nprobe", DEFAULT_NPROBE))
+        if "efSearch" in stored or (ef_search and isinstance(_unwrap_index(loaded.index), faiss.IndexHNSW)):
+            return faiss.SearchParametersHNSW(efSearch=ef_search or stored.get("efSearch", DEFAULT_EF_SEARCH))
+        return None
+
+
+def _apply_storage(index_factory: str, storage: str) -> str:
+    """
+    Return the index_factory description storing vectors as `storage`.
+
+    The float32 "Flat" codes of Flat, HNSW and IVF descriptions are replaced by
+    scalar-quantized ones, e.g. ("HNSW32", "int8") -> "HNSW32,SQ8" and
+    ("IVF4096,Flat", "fp16") -> "IVF4096,SQfp16".
+    """
+    if storage not in STORAGE_CODECS:
+        raise ValueError(f"Unknown storage '{storage}', expected one of {list(STORAGE_CODECS)}.")
+    if storage == DEFAULT_STORAGE:
+        return index_factory
+
+    parts = index_factory.split(",")
+    if parts[-1] == "Flat":
+        parts[-1] = STORAGE_CODECS[storage]
+    elif re.fullmatch(r"HNSW\d+", parts[-1]):
+        parts.append(STORAGE_CODECS[storage])
+    else:
+        raise ValueError(f"storage='{storage}' only applies to Flat, HNSW or IVF*,Flat indexes, "
+                         f"got '{index_factory}' (its codes are already compressed).")
+    return ",".join(parts)
+
+
+def _apply_pca(index_factory: str, pca_dim: int, metric: str) -> str:
+    """
+    Prefix an index_factory description with a PCA down to `pca_dim` dimensions,
+    e.g. ("HNSW32,SQ8", 128, "ip") -> "PCA128,L2norm,HNSW32,SQ8". Projected vectors
+    are no longer unit-length, hence the L2norm step for the inner-product metric.
+    """
+    return f"PCA{pca_dim},{'L2norm,' if metric == 'ip' else ''}{index_factory}"
+
+
+def _base_index_factory(index_factory: str, storage: str, pca_dim: int | None, metric: str) -> str:
+    """
+    Undo `_apply_pca` and `_apply_storage`, e.g. ("PCA128,L2norm,HNSW32,SQ8", "int8", 128, "ip")
+    -> "HNSW32", so that build_index(index_factory=..., storage=..., pca_dim=...) gives it back.
+    """
+    parts = index_factory.split(",")
+    if pca_dim and parts[0] == f"PCA{pca_dim}":
+        parts = parts[1:]
+        if metric == "ip" and parts[0] == "L2norm":
+            parts = parts[1:]
+    if storage != DEFAULT_STORAGE and parts[-1] == STORAGE_CODECS[storage]:
+        if len(parts) > 1 and re.fullmatch(r"HNSW\d+", parts[-2]):
+            parts.pop()
+        else:
+            parts[-1] = "Flat"
+    return ",".join(parts)
+
+
+def _prepare_vectors(vectors: np.ndarray, metric: str) -> np.ndarray:
+    """
+    L2-normalize `vectors` in place for the inner-product metric (cosine similarity).
+    """
+    if metric == "ip" and len(vectors):
+        faiss.normalize_L2(vectors)
+    return vectors
+
+
+def _files_size(*paths: Path) -> int:
+    """Total size of the existing files among `paths`."""
+    return sum(path.stat().st_size for path in paths if path.exists())
+
+
+def _with_stable_ids(index: faiss.Index) -> faiss.Index:
+    """
+    Return `index` ready for add_with_ids() / remove_ids() with the chunk Faiss ids.
+
+    IVF indexes store the id of each vector in their inverted lists, and keep it
+    through removals. Other indexes get an IndexIDMap: its id table is compacted
+    along with the positions of Flat storages, whereas removals from IVF lists
+    leave the positions of the remaining vectors unchanged, so an IndexIDMap on
+    top of them would translate every label after the first removal wrongly.
+    """
+    if faiss.try_extract_index_ivf(index) is not None:
+        return index
+    return faiss.IndexIDMap(index)
+
+
+def _ids_in_lists(index: faiss.Index, info: Dict[str, Any]) -> bool:
+    """True if `index` stores the stable chunk Faiss ids itself (IVF lists, see _with_stable_ids)."""
+    return (bool(info.get("id_mapped")) and not isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2))
+            and faiss.try_extract_index_ivf(index) is not None)
+
+
+def _internal_ids(index: faiss.Index) -> np.ndarray:
+    """Faiss id stored at each internal position of `index`."""
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.vector_to_array(index.id_map)
+    return np.arange(index.ntotal, dtype=np.int64)
+
+
+def _unwrap_index(index: faiss.Index) -> faiss.Index:
+    """
+    Return the index doing the actual search, below id-maps and pre-transforms.
+    """
+    while isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2, faiss.IndexPreTransform)):
+        index = faiss.downcast_index(index.index)
+    return index
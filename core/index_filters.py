@@ -0,0 +1,146 @@
+"""
+index_filters.py
+Attribute filters applied inside a Faiss search.
+
+A global index mixes the chunks of every collection. Filtering the results
+after the search forces to over-fetch and drop most of them, so instead the
+filter is turned into a Faiss `IDSelectorBitmap` and the search only visits
+the vectors that match it.
+
+For each (attribute, value) of the index mapping, a packed bitmap over the
+internal Faiss positions is precomputed once per loaded index. A filter such
+as ::
+
+    {"collection_src": ["commits", "pull_requests"], "metadata_version": 2}
+
+is then an OR of bitmaps per attribute and an AND across attributes, i.e. a
+few vectorized byte operations whatever the size of the index.
+
+IVF indexes test the selector against the 63-bit ids stored in their lists,
+which a bitmap cannot cover: for them the bitmap is built over the mapping rows
+and the matching ids are passed as an `IDSelectorBatch`. Building one costs a
+pass over the index, so the last few are cached per filter (the cache goes away
+with the loaded index version).
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Mapping
+
+import numpy as np
+import faiss  # type: ignore
+
+from core.index_mapping import IndexMapping
+
+FILTER_COLUMNS = ("collection_src", "metadata_version", "repo")
+ID_SELECTOR_CACHE_SIZE = 8  # IDSelectorBatch kept per index, each holds a hash set of the selected ids
+
+
+class AttributeBitmaps:
+    """Per-attribute-value bitmaps over the internal positions of a Faiss index."""
+
+    def __init__(
+        self,
+        mapping: IndexMapping,
+        internal_ids: np.ndarray,
+        constants: Mapping[str, Any] | None = None,
+    ):
+        """
+        Args:
+            mapping (IndexMapping): Mapping of the index (Faiss id -> attributes).
+            internal_ids (np.ndarray): Faiss id stored at each internal position of the index.
+            constants (Mapping[str, Any], optional): Attributes missing from the mapping
+                that have the same value for the whole index (e.g. 'repo' of old mappings).
+        """
+        self.internal_ids = np.asarray(internal_ids, dtype=np.int64)
+        self.ntotal = len(internal_ids)
+        self.constants = dict(constants or {})
+        self._nbytes = (self.ntotal + 7) // 8
+        self._codes: Dict[str, Dict[Any, int]] = {}
+        self._bitmaps: Dict[tuple[str, int], np.ndarray] = {}
+        self._id_selectors: OrderedDict[tuple, faiss.IDSelectorBatch] = OrderedDict()  # LRU, see id_selector
+        self._lock = threading.Lock()
+
+        rows = mapping.rows(internal_ids)
+        known = rows >= 0
+        codes = np.asarray(mapping.codes).reshape(-1, len(mapping.columns))
+        for col_idx, column in enumerate(mapping.columns):
+            if column not in FILTER_COLUMNS:
+                continue
+            self._codes[column] = {value: code for code, value in enumerate(mapping.tables[column])}
+            column_codes = np.where(known, codes[np.maximum(rows, 0), col_idx], -1) if len(codes) \
+                else np.full(self.ntotal, -1)
+            for code in range(len(mapping.tables[column])):
+                self._bitmaps[(column, code)] = np.packbits(column_codes == code, bitorder="little")
+
+    def bitmap(self, filters: Mapping[str, Any]) -> np.ndarray:
+        """
+        Packed bitmap (uint8, little bit order) of the positions matching `filters`.
+
+        Args:
+            filters (Mapping[str, Any]): Attribute -> accepted value, or list / tuple / set
+                of accepted values.
+
+        Raises:
+            ValueError: If an attribute cannot be filtered on.
+        """
+        result = np.full(self._nbytes, 0xFF, dtype=np.uint8)
+        for column, accepted in filters.items():
+            values = _as_values(accepted)
+            if column in self._codes:
+                selected = np.zeros(self._nbytes, dtype=np.uint8)
+                for value in values:
+                    code = self._codes[column].get(value)
+                    if code is not None:
+                        selected |= self._bitmaps[(column, code)]
+                result &= selected
+            elif column in self.constants:
+                if self.constants[column] not in values:
+                    result[:] = 0
+            else:
+                raise ValueError(f"Cannot filter on '{column}', expected one of {FILTER_COLUMNS}.")
+        return result
+
+    def selector(self, bitmap: np.ndarray) -> faiss.IDSelectorBitmap:
+        """
+        Faiss selector over `bitmap`. The caller must keep `bitmap` alive while searching.
+        """
+        return faiss.IDSelectorBitmap(self.ntotal, faiss.swig_ptr(bitmap))
+
+    def id_selector(self, filters: Mapping[str, Any], bitmap: np.ndarray) -> faiss.IDSelectorBatch:
+        """
+        Faiss selector over the ids of the positions matching `filters`, for indexes that
+        test selectors against the ids of their vectors (IVF lists) rather than positions.
+        Built from `bitmap` (= `self.bitmap(filters)`) on the first query with these filters,
+        then reused.
+        """
+        key = _filter_key(filters)
+        with self._lock:
+            selector = self._id_selectors.get(key)
+            if selector is not None:
+                self._id_selectors.move_to_end(key)
+                return selector
+
+        positions = np.flatnonzero(np.unpackbits(bitmap, count=self.ntotal, bitorder="little"))
+        selected = np.ascontiguousarray(self.internal_ids[positions])
+        selector = faiss.IDSelectorBatch(len(selected), faiss.swig_ptr(selected))  # Copies the ids
+        with self._lock:
+            self._id_selectors[key] = selector
+            while len(self._id_selectors) > ID_SELECTOR_CACHE_SIZE:
+                self._id_selectors.popitem(last=False)
+        return selector
+
+
+def _filter_key(filters: Mapping[str, Any]) -> tuple:
+    """Hashable form of `filters`, independent of the order of attributes and values."""
+    return tuple(sorted((column, tuple(sorted(repr(value) for value in _as_values(accepted))))
+                        for column, accepted in filters.items()))
+
+
+def _as_values(accepted: Any) -> Iterable[Any]:
+    """A filter value is either one value or a collection of accepted values."""
+    if isinstance(accepted, (list, tuple, set, frozenset)):
+        return list(accepted)
+    return [accepted]
@@ -0,0 +1,419 @@
+"""
+index_mapping.py
+Compact binary mapping between Faiss ids and chunk information.
+
+For every vector of a Faiss index we need the chunk ObjectId and a few
+attributes of its metadata (collection_src, metadata_version, repo). Instead of a
+JSON dict re-parsed on each query, the mapping is stored as a single binary
+file made of:
+
+- the int64 Faiss id of each row, rows being sorted by id,
+- a chunk-id string table (utf-8 blob + int64 offsets),
+- a uint32 matrix of interned attribute codes (one column per attribute),
+- a small JSON header describing the sections and the interned values.
+
+Faiss ids are stable 64-bit hashes of the chunk ids (see `chunk_faiss_id`),
+so an index can be updated in place when chunks are added or removed.
+Mappings of indexes built before that use the Faiss row number as id.
+
+The file is memory-mapped on load, so opening a mapping with millions of
+rows is immediate and only the rows actually returned by a query are read.
+
+Layout ::
+
+    MAGIC (8 bytes) | header length (uint32 LE) | header JSON | sections...
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import struct
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Sequence
+
+import numpy as np
+
+MAGIC = b"AERAGMAP"
+FORMAT_VERSION = 1
+DEFAULT_COLUMNS = ("collection_src", "metadata_version", "repo")
+LEGACY_COLUMNS = ("collection_src", "metadata_version")  # Attributes of `*_mapping.json` files
+_ALIGNMENT = 8
+_ID_MASK = (1 << 63) - 1  # Faiss ids are signed int64 and -1 means "no result"
+
+
+def chunk_faiss_id(chunk_id: str) -> int:
+    """
+    Stable 63-bit Faiss id derived from a chunk id.
+
+    Args:
+        chunk_id (str): Chunk ObjectId (e.g. 'meta_org/repo_commits_sha_chunk_0').
+
+    Returns:
+        int: Non-negative int64 id, identical across processes and runs.
+    """
+    digest = hashlib.blake2b(chunk_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") & _ID_MASK
+
+
+def chunk_faiss_ids(chunk_ids: Iterable[str]) -> np.ndarray:
+    """Vector version of `chunk_faiss_id`, returns an int64 array."""
+    return np.fromiter((chunk_faiss_id(cid) for cid in chunk_ids), dtype=np.int64)
+
+
+class IndexMapping:
+    """Chunk ids and interned meta attributes of a Faiss index, looked up by Faiss id."""
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        offsets: np.ndarray,
+        blob: np.ndarray,
+        codes: np.ndarray,
+        columns: Sequence[str],
+        tables: Dict[str, List[Any]],
+    ):
+        """
+        Args:
+            ids (np.ndarray): Sorted int64 Faiss id of each row.
+            offsets (np.ndarray): int64 array of size n+1, chunk id i is blob[offsets[i]:offsets[i+1]].
+            blob (np.ndarray): uint8 array holding all utf-8 encoded chunk ids.
+            codes (np.ndarray): uint32 matrix (n, len(columns)) of interned attribute codes.
+            columns (Sequence[str]): Attribute names, in the column order of `codes`.
+            tables (Dict[str, List[Any]]): For each attribute, the list of interned values.
+        """
+        self.ids = ids
+        self.offsets = offsets
+        self.blob = blob
+        self.codes = codes
+        self.columns = list(columns)
+        self.tables = tables
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def from_records(
+        cls,
+        chunk_ids: Sequence[str],
+        metas: Sequence[Dict[str, Any]],
+        ids: np.ndarray | None = None,
+        columns: Sequence[str] = DEFAULT_COLUMNS,
+    ) -> "IndexMapping":
+        """
+        Build an in-memory mapping from chunk ids and meta dicts.
+
+        Args:
+            chunk_ids (Sequence[str]): Chunk id of each vector.
+            metas (Sequence[Dict[str, Any]]): Meta infos of each vector.
+            ids (np.ndarray, optional): Faiss id of each vector, defaults to the row number.
+            columns (Sequence[str]): Attributes of `metas` to keep.
+
+        Returns:
+            IndexMapping: The mapping, rows sorted by Faiss id.
+        """
+        if len(chunk_ids) != len(metas):
+            raise ValueError("chunk_ids and metas must have the same length.")
+        if ids is None:
+            ids = np.arange(len(chunk_ids), dtype=np.int64)
+        elif len(ids) != len(chunk_ids):
+            raise ValueError("ids and chunk_ids must have the same length.")
+
+        order = np.argsort(ids, kind="stable")
+        encoded = [chunk_ids[i].encode("utf-8") for i in order]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        if encoded:
+            np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+        tables: Dict[str, List[Any]] = {}
+        codes = np.zeros((len(metas), len(columns)), dtype=np.uint32)
+        for col_idx, column in enumerate(columns):
+            interned: Dict[Any, int] = {}
+            for row, i in enumerate(order):
+                value = metas[i].get(column)
+                codes[row, col_idx] = interned.setdefault(value, len(interned))
+            tables[column] = list(interned)
+
+        return cls(np.asarray(ids, dtype=np.int64)[order], offsets, blob, codes, columns, tables)
+
+    @classmethod
+    def from_json(cls, path: str | Path) -> "IndexMapping":
+        """
+        Read a legacy `*_mapping.json` file ({"id_map": {...}, "meta_map": {...}}).
+
+        Args:
+            path (str | Path): Path of the JSON mapping.
+
+        Returns:
+            IndexMapping: The equivalent in-memory mapping.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            mapping = json.load(f)
+        id_map = mapping["id_map"]
+        meta_map = mapping.get("meta_map", {})
+        rows = range(len(id_map))
+        return cls.from_records(
+            [id_map[str(i)] for i in rows],
+            [meta_map.get(str(i), {}) for i in rows],
+            columns=LEGACY_COLUMNS,
+        )
+
+    @classmethod
+    def load(cls, path: str | Path) -> "IndexMapping":
+        """
+        Memory-map a binary mapping written by `save()`.
+
+        Args:
+            path (str | Path): Path of the binary mapping.
+
+        Returns:
+            IndexMapping: A mapping whose arrays are read-only memmaps.
+        """
+        header, sections = read_sections(path, MAGIC, FORMAT_VERSION)
+        # Mappings written before stable ids existed are indexed by Faiss row number
+        ids = sections.get("ids")
+        if ids is None:
+            ids = np.arange(header["count"], dtype=np.int64)
+        return cls(ids, sections["offsets"], sections["blob"], sections["codes"],
+                   header["columns"], header["tables"])
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def save(self, path: str | Path) -> None:
+        """
+        Write the mapping to `path` (through a temporary file + atomic rename).
+
+        Args:
+            path (str | Path): Destination file.
+        """
+        write_sections(path, MAGIC, {
+            "version": FORMAT_VERSION,
+            "count": len(self),
+            "columns": self.columns,
+            "tables": self.tables,
+        }, {
+            "ids": np.asarray(self.ids, dtype=np.int64),
+            "offsets": np.asarray(self.offsets, dtype=np.int64),
+            "codes": np.asarray(self.codes, dtype=np.uint32),
+            "blob": np.asarray(self.blob, dtype=np.uint8),
+        })
+
+    # ------------------------------------------------------------------
+    # Incremental updates
+    # ------------------------------------------------------------------
+
+    def with_changes(
+        self,
+        removed_ids: np.ndarray,
+        added_ids: np.ndarray,
+        added_chunk_ids: Sequence[str],
+        added_metas: Sequence[Dict[str, Any]],
+    ) -> "IndexMapping":
+        """
+        Return a new in-memory mapping with `removed_ids` dropped and the given rows added.
+        Added ids already present in the mapping replace the existing rows.
+
+        Args:
+            removed_ids (np.ndarray): Faiss ids to drop.
+            added_ids (np.ndarray): Faiss ids of the added chunks.
+            added_chunk_ids (Sequence[str]): Chunk ids of the added chunks.
+            added_metas (Sequence[Dict[str, Any]]): Meta infos of the added chunks.
+
+        Returns:
+            IndexMapping: The updated mapping.
+        """
+        dropped = np.concatenate([np.asarray(removed_ids, dtype=np.int64),
+                                  np.asarray(added_ids, dtype=np.int64)])
+        kept = self._take(np.nonzero(~np.isin(self.ids, dropped))[0])
+
+        # Intern the added values into the existing tables
+        tables = {column: list(values) for column, values in self.tables.items()}
+        added_codes = np.zeros((len(added_metas), len(self.columns)), dtype=np.uint32)
+        for col_idx, column in enumerate(self.columns):
+            interned = {value: code for code, value in enumerate(tables[column])}
+            for row, meta in enumerate(added_metas):
+                value = meta.get(column)
+                if value not in interned:
+                    interned[value] = len(tables[column])
+                    tables[column].append(value)
+                added_codes[row, col_idx] = interned[value]
+
+        encoded = [cid.encode("utf-8") for cid in added_chunk_ids]
+        added_offsets = np.cumsum([len(e) for e in encoded], dtype=np.int64) + kept.offsets[-1]
+
+        ids = np.concatenate([kept.ids, np.asarray(added_ids, dtype=np.int64)])
+        merged = IndexMapping(
+            ids,
+            np.concatenate([kept.offsets, added_offsets]),
+            np.concatenate([kept.blob, np.frombuffer(b"".join(encoded), dtype=np.uint8)]),
+            np.concatenate([kept.codes, added_codes]),
+            self.columns,
+            tables,
+        )
+        return merged._take(np.argsort(ids, kind="stable"))
+
+    def _take(self, rows: np.ndarray) -> "IndexMapping":
+        """
+        Return an in-memory mapping made of `rows` (in that order), copying the
+        chunk-id strings without decoding them.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        new_offsets, new_blob = take_blob_rows(self.offsets, self.blob, rows)
+        return IndexMapping(
+            np.asarray(self.ids)[rows],
+            new_offsets,
+            new_blob,
+            np.asarray(self.codes).reshape(-1, len(self.columns))[rows],
+            self.columns,
+            self.tables,
+        )
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def rows(self, labels: Sequence[int] | np.ndarray) -> np.ndarray:
+        """
+        Translate Faiss labels (ids) into mapping rows, -1 for unknown labels.
+
+        Args:
+            labels (Sequence[int] | np.ndarray): Labels returned by a Faiss search (-1 = no result).
+
+        Returns:
+            np.ndarray: Row of each label in this mapping.
+        """
+        labels = np.asarray(labels, dtype=np.int64)
+        if len(self) == 0:
+            return np.full(labels.shape, -1, dtype=np.int64)
+        rows = np.searchsorted(self.ids, labels)
+        rows = np.minimum(rows, len(self) - 1)
+        return np.where(np.asarray(self.ids)[rows] == labels, rows, -1)
+
+    def chunk_id(self, row: int) -> str:
+        """Return the chunk id stored at mapping row `row`."""
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return bytes(self.blob[start:end]).decode("utf-8")
+
+    def meta(self, row: int) -> Dict[str, Any]:
+        """Return the meta infos ({collection_src, metadata_version, repo}) of mapping row `row`."""
+        codes = self.codes[row]
+        return {column: self.tables[column][int(codes[i])] for i, column in enumerate(self.columns)}
+
+    def chunk_ids(self, labels: Sequence[int] | np.ndarray) -> List[str]:
+        """Return the chunk ids of known Faiss `labels` (Faiss uses -1 for missing results)."""
+        return [self.chunk_id(int(r)) for r in self.rows(labels) if r >= 0]
+
+    def metas(self, labels: Sequence[int] | np.ndarray) -> List[Dict[str, Any]]:
+        """Return the meta infos of Faiss `labels`, an empty dict for unknown labels."""
+        return [self.meta(int(r)) if r >= 0 else {} for r in self.rows(labels)]
+
+
+def take_blob_rows(offsets: np.ndarray, blob: np.ndarray, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Select `rows` (in that order) of a variable-length table stored as a blob and
+    n+1 offsets, without decoding the values.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The new offsets and blob.
+    """
+    offsets = np.asarray(offsets)
+    starts = offsets[:-1][rows]
+    lengths = offsets[1:][rows] - starts
+    new_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_offsets[1:])
+    positions = np.repeat(starts - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+    return new_offsets, np.asarray(blob)[positions]
+
+
+def write_sections(
+    path: str | Path, magic: bytes, header: Dict[str, Any], arrays: Dict[str, np.ndarray],
+    streams: Dict[str, tuple[Any, int, Iterable[bytes]]] | None = None,
+) -> None:
+    """
+    Write `magic`, a JSON `header` and aligned `arrays` sections to `path`
+    (through a temporary file + atomic rename). The header gets a "sections"
+    entry describing where each array is.
+
+    `streams` maps the name of a 1-D section too large to be held in memory to
+    (dtype, length, iterable of its bytes); it is written piece by piece after `arrays`.
+    """
+    arrays = {name: np.ascontiguousarray(arr) for name, arr in arrays.items()}
+    streams = streams or {}
+    layout = [(name, arr.dtype, list(arr.shape), arr.nbytes) for name, arr in arrays.items()]
+    layout += [(name, np.dtype(dtype), [length], np.dtype(dtype).itemsize * length)
+               for name, (dtype, length, _) in streams.items()]
+    sizes = {name: nbytes for name, _, _, nbytes in layout}
+    sections = {}
+    position = 0  # Relative to the (aligned) end of the header
+    for name, dtype, shape, nbytes in layout:
+        sections[name] = {"offset": position, "dtype": dtype.str, "shape": shape}
+        position = _align(position + nbytes)
+
+    header_bytes = json.dumps({**header, "sections": sections}).encode("utf-8")
+    data_start = _align(len(magic) + 4 + len(header_bytes))
+
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(magic)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        for name, arr in arrays.items():
+            f.write(b"\0" * (data_start + sections[name]["offset"] - f.tell()))
+            f.write(arr.tobytes())
+        for name, (_, _, pieces) in streams.items():
+            start = data_start + sections[name]["offset"]
+            f.write(b"\0" * (start - f.tell()))
+            for piece in pieces:
+                f.write(piece)
+            if f.tell() - start != sizes[name]:
+                raise ValueError(f"Section '{name}' of {path} has {f.tell() - start} bytes, expected {sizes[name]}.")
+    os.replace(tmp_path, path)
+
+
+def read_sections(
+    path: str | Path, magic: bytes, max_version: int
+) -> tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """
+    Read the header of a file written by `write_sections` and memory-map its sections.
+
+    Raises:
+        ValueError: If the file has another magic or a newer format version.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(magic)) != magic:
+            raise ValueError(f"{path} is not a {magic.decode()} file.")
+        (header_len,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(header_len).decode("utf-8"))
+    data_start = _align(len(magic) + 4 + header_len)
+
+    if header.get("version", 0) > max_version:
+        raise ValueError(f"Unsupported {magic.decode()} version {header['version']} in {path}.")
+
+    sections = {
+        name: _memmap_section(path, data_start, section)
+        for name, section in header["sections"].items()
+    }
+    return header, sections
+
+
+def _memmap_section(path: str | Path, data_start: int, section: Dict[str, Any]) -> np.ndarray:
+    """Map one section of the file, empty sections cannot be memory-mapped."""
+    shape = tuple(section["shape"])
+    if 0 in shape:
+        return np.zeros(shape, dtype=section["dtype"])
+    return np.memmap(path, dtype=section["dtype"], mode="r",
+                     offset=data_start + section["offset"], shape=shape)
+
+
+def _align(position: int) -> int:
+    """Round `position` up to the section alignment."""
+    return (position + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
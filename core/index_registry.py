@@ -0,0 +1,161 @@
+"""
+index_registry.py
+Process-wide registry of loaded Faiss indexes.
+
+A FaissIndexManager holds a single index. When many repos / collections are
+queried by the same process, re-loading each index from disk for every query
+dominates latency. The registry keeps one loaded FaissIndexManager per
+(repo, index_name), evicts the least recently used ones when the resident
+size (index + mapping + chunk store) exceeds a memory budget, and reloads
+them lazily on the next miss.
+
+Indexes are read from disk outside the registry lock: queries on resident
+indexes are never blocked by the load of another one. Concurrent misses on
+the same index wait for a single load.
+
+Usage:
+
+    registry = IndexRegistry(db, embedding_model, memory_budget_bytes=2 * 1024**3)
+    index_mgr = registry.get("archethic-foundation/archethic-node", "commits")
+    D, I, docs, meta_infos = index_mgr.query("how to deploy multisig ?", top_k=3)
+    print(registry.stats())
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, Any
+
+from core.database_manager import DatabaseManager
+from core.faiss_index_manager import FaissIndexManager
+from embeddings.embeddings import AbstractEmbeddingModel
+
+DEFAULT_MEMORY_BUDGET_BYTES = 2 * 1024 ** 3  # 2 GB of resident indexes
+
+
+class IndexRegistry:
+    """Keeps hot Faiss indexes loaded, with LRU eviction under a memory budget."""
+
+    def __init__(
+        self,
+        db: DatabaseManager,
+        embedding_model: AbstractEmbeddingModel | None = None,
+        index_root: str | Path = "local_storage/indexes",
+        memory_budget_bytes: int = DEFAULT_MEMORY_BUDGET_BYTES,
+        mmap: bool = False,
+    ):
+        """
+        Args:
+            db (DatabaseManager): Connection to MongoDB, shared by every index.
+            embedding_model (AbstractEmbeddingModel, optional): Model shared by every index
+                (by default the shared query model of the model registry, loaded on first query).
+            index_root (str, optional): Base directory used to store indexes.
+            memory_budget_bytes (int): Max total size of the resident indexes.
+            mmap (bool): Load indexes memory-mapped and read-only (shared page cache).
+        """
+        self.db = db
+        self.embedding_model = embedding_model  # None = resolved by each FaissIndexManager
+        self.index_root = index_root
+        self.memory_budget_bytes = memory_budget_bytes
+        self.mmap = mmap
+
+        self._entries: OrderedDict[tuple[str, str], FaissIndexManager] = OrderedDict()
+        self._loading: Dict[tuple[str, str], Future] = {}  # Loads in progress, outside the lock
+        self._lock = threading.Lock()
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, repo: str, index_name: str) -> FaissIndexManager:
+        """
+        Return the loaded index manager of (repo, index_name), loading it on a miss.
+        A resident index is swapped to its current version if it was rebuilt since.
+
+        Raises:
+            FileNotFoundError: If the index was never built.
+        """
+        key = (repo, index_name)
+        with self._lock:
+            index_mgr = self._entries.get(key)
+            if index_mgr is None:
+                loading = self._loading.get(key)
+                if loading is None:
+                    self.misses += 1
+                    loading = self._loading[key] = Future()
+                    owner = True
+                else:
+                    owner = False
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+
+        if index_mgr is None:
+            if not owner:
+                return loading.result()  # Loaded by another thread, or its error
+            return self._load(key, loading)
+
+        # Reload outside the lock: other indexes stay available and queries keep
+        # running on the loaded version until the new one is swapped in
+        previous_bytes = index_mgr.loaded_bytes
+        if index_mgr.refresh_if_stale():
+            with self._lock:
+                if self._entries.get(key) is index_mgr:
+                    self.resident_bytes += index_mgr.loaded_bytes - previous_bytes
+        return index_mgr
+
+    def _load(self, key: tuple[str, str], loading: Future) -> FaissIndexManager:
+        """Read an index from disk without holding the lock, then register it."""
+        try:
+            index_mgr = FaissIndexManager(self.db, self.embedding_model, self.index_root)
+            index_mgr.load_index(*key, mmap=self.mmap)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            loading.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[key]
+            self._add(key, index_mgr)
+        loading.set_result(index_mgr)
+        return index_mgr
+
+    def invalidate(self, repo: str, index_name: str) -> None:
+        """
+        Drop (repo, index_name) from the registry, e.g. after it was rebuilt on disk.
+        """
+        with self._lock:
+            index_mgr = self._entries.pop((repo, index_name), None)
+            if index_mgr is not None:
+                self.resident_bytes -= index_mgr.loaded_bytes
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Counters of the registry: hits, misses, evictions, resident indexes and bytes.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "resident_indexes": len(self._entries),
+                "resident_bytes": self.resident_bytes,
+                "memory_budget_bytes": self.memory_budget_bytes,
+            }
+
+    def _add(self, key: tuple[str, str], index_mgr: FaissIndexManager) -> None:
+        """Register a freshly loaded index and evict LRU entries above the budget."""
+        self._entries[key] = index_mgr
+        self.resident_bytes += index_mgr.loaded_bytes
+
+        # The index just loaded is never evicted, even if it alone exceeds the budget.
+        while self.resident_bytes > self.memory_budget_bytes and len(self._entries) > 1:
+            evicted_key, evicted = self._entries.popitem(last=False)
+            self.resident_bytes -= evicted.loaded_bytes
+            self.evictions += 1
+            print(f"[IndexRegistry] Evicted index {evicted_key} ({evicted.loaded_bytes} bytes).")
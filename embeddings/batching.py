@@ -0,0 +1,123 @@
+"""
+batching.py
+Lots dʼembeddings regroupés par longueur, sous un budget de tokens.
+
+Les chunks vont de messages de commit de 50 caractères à des blocs de code
+de 1000 caractères. Dans un lot formé dans lʼordre dʼarrivée, chaque texte
+court est complété (padding) jusquʼà la longueur du plus long : le modèle
+calcule surtout du padding.
+
+`plan_batches` trie les textes par nombre de tokens décroissant et forme des
+lots dont le coût paddé (nombre de textes x longueur du plus long) reste sous
+`max_tokens` : beaucoup de textes courts par lot, peu de textes longs.
+`encode_bucketed` encode ces lots puis remet les vecteurs dans lʼordre
+dʼorigine, et `BatchStats` mesure le taux de padding et le débit en tokens/s.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any, Callable, Dict, List, Sequence
+
+import numpy as np
+
+DEFAULT_MAX_BATCH_TOKENS = 16_384  # Ex. 64 textes de 256 tokens, ou 512 de 32 tokens
+MAX_BUCKET_TEXTS = 512  # Limite le nombre de textes très courts dans un même lot
+
+
+class BatchStats:
+    """Compteurs cumulés des lots encodés : tokens réels, tokens paddés et temps."""
+
+    def __init__(self):
+        self.texts = 0
+        self.batches = 0
+        self.tokens = 0
+        self.padded_tokens = 0
+        self.seconds = 0.0
+
+    def add(self, lengths: np.ndarray, seconds: float) -> None:
+        """Enregistre un lot de textes de `lengths` tokens, encodé en `seconds`."""
+        self.texts += len(lengths)
+        self.batches += 1
+        self.tokens += int(lengths.sum())
+        self.padded_tokens += int(lengths.max()) * len(lengths) if len(lengths) else 0
+        self.seconds += seconds
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Taux de padding (part des tokens calculés qui sont du padding) et débits.
+        """
+        return {
+            "texts": self.texts,
+            "batches": self.batches,
+            "tokens": self.tokens,
+            "padded_tokens": self.padded_tokens,
+            "padding_ratio": 1 - self.tokens / self.padded_tokens if self.padded_tokens else 0.0,
+            "tokens_per_sec": self.tokens / self.seconds if self.seconds else 0.0,
+            "texts_per_sec": self.texts / self.seconds if self.seconds else 0.0,
+        }
+
+
+def plan_batches(
+    lengths: Sequence[int] | np.ndarray, max_tokens: int | None, batch_size: int
+) -> List[np.ndarray]:
+    """
+    Découpe des textes en lots.
+
+    Args:
+        lengths (Sequence[int] | np.ndarray): Nombre de tokens de chaque texte.
+        max_tokens (int, optional): Budget de tokens paddés par lot. None = lots de
+            `batch_size` textes dans lʼordre dʼarrivée (comportement sans regroupement).
+        batch_size (int): Nombre de textes par lot quand `max_tokens` est None.
+
+    Returns:
+        List[np.ndarray]: Indices (dans `lengths`) des textes de chaque lot.
+            Un texte plus long que le budget forme un lot à lui seul.
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    if max_tokens is None:
+        return [np.arange(start, min(start + batch_size, len(lengths)))
+                for start in range(0, len(lengths), batch_size)]
+
+    order = np.argsort(-lengths, kind="stable")
+    batches: List[np.ndarray] = []
+    start = 0
+    while start < len(order):
+        longest = max(int(lengths[order[start]]), 1)  # Premier texte = le plus long du lot
+        count = min(max(max_tokens // longest, 1), MAX_BUCKET_TEXTS, len(order) - start)
+        batches.append(order[start:start + count])
+        start += count
+    return batches
+
+
+def encode_bucketed(
+    lengths: Sequence[int] | np.ndarray,
+    encode_fn: Callable[[np.ndarray], np.ndarray],
+    max_tokens: int | None,
+    batch_size: int,
+    stats: BatchStats | None = None,
+) -> np.ndarray:
+    """
+    Encode des textes lot par lot (voir `plan_batches`) et rend les vecteurs dans lʼordre dʼorigine.
+
+    Args:
+        lengths (Sequence[int] | np.ndarray): Nombre de tokens de chaque texte.
+        encode_fn (Callable): Encode les textes dʼindices donnés, retourne leur matrice de vecteurs.
+        max_tokens (int, optional): Budget de tokens paddés par lot (None = lots de `batch_size`).
+        batch_size (int): Nombre de textes par lot quand `max_tokens` est None.
+        stats (BatchStats, optional): Compteurs mis à jour pour chaque lot.
+
+    Returns:
+        np.ndarray: Matrice float32 (len(lengths), dimension).
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    result: np.ndarray | None = None
+    for indices in plan_batches(lengths, max_tokens, batch_size):
+        t0 = time.perf_counter()
+        vectors = np.asarray(encode_fn(indices), dtype=np.float32)
+        if stats is not None:
+            stats.add(lengths[indices], time.perf_counter() - t0)
+        if result is None:
+            result = np.empty((len(lengths), vectors.shape[1]), dtype=np.float32)
+        result[indices] = vectors
+    return result if result is not None else np.empty((0, 0), dtype=np.float32)
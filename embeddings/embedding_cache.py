@@ -0,0 +1,175 @@
+"""
+embedding_cache.py
+Cache persistant des embeddings, indexé par (nom du modèle, hash du texte).
+
+Un même texte de chunk est souvent ré-encodé : fichier inchangé mais
+`metadata_version` incrémentée, fichiers identiques dans `main_files` et
+`last_release_files`, commits partageant le même texte standard...
+`CachedEmbeddingModel` se place devant nʼimporte quel `AbstractEmbeddingModel`
+et ne transmet au modèle que les textes jamais vus.
+
+Les vecteurs sont stockés en float32 dans une base SQLite (un seul fichier,
+sans dépendance). La taille est bornée : au-delà de `max_entries`, les
+entrées les moins récemment utilisées sont supprimées.
+
+Exemple :
+
+    model = CachedEmbeddingModel(SentenceTransformerEmbeddingModel(),
+                                 "local_storage/embedding_cache.sqlite")
+    vectors = model.encode_batch(["texte 1", "texte 2"])
+    print(model.stats())
+"""
+
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from embeddings.embeddings import AbstractEmbeddingModel, DEFAULT_BATCH_SIZE
+
+DEFAULT_MAX_ENTRIES = 2_000_000  # ~3 Go de vecteurs en 384 dimensions
+_SQL_IN_SLICE = 500  # Nombre max de hash par requête `IN (...)`
+
+
+class CachedEmbeddingModel(AbstractEmbeddingModel):
+    """Modèle dʼembeddings précédé dʼun cache disque borné (LRU)."""
+
+    def __init__(
+        self,
+        model: AbstractEmbeddingModel,
+        path: str | Path,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        model_name: str | None = None,
+    ):
+        """
+        Args:
+            model (AbstractEmbeddingModel): Modèle appelé pour les textes absents du cache.
+            path (str | Path): Fichier SQLite du cache (créé si besoin).
+            max_entries (int): Nombre max de vecteurs conservés.
+            model_name (str, optional): Clé du modèle dans le cache, par défaut `model.model_name`.
+                Deux modèles différents ne partagent jamais leurs vecteurs.
+        """
+        self.model = model
+        self.model_name = model_name or getattr(model, "model_name", type(model).__name__)
+        self.path = Path(path)
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, hash BLOB NOT NULL, vector BLOB NOT NULL, last_used INTEGER NOT NULL,"
+            " PRIMARY KEY (model, hash)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def encode(self, text: str) -> List[float]:
+        return self.encode_batch([text])[0].tolist()
+
+    def encode_batch(self, texts: Sequence[str], batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+        """
+        Retourne les embeddings de `texts` (float32, dans lʼordre), en nʼencodant
+        que les textes absents du cache, une seule fois chacun.
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        keys = [hashlib.sha1(text.encode("utf-8")).digest() for text in texts]
+        unique_keys = list(dict.fromkeys(keys))
+
+        with self._lock:
+            found = self._lookup(unique_keys)
+            missing = [key for key in unique_keys if key not in found]
+            cached = sum(1 for key in keys if key in found)
+            self.hits += cached
+            self.misses += len(keys) - cached
+
+        if missing:
+            text_by_key = dict(zip(keys, texts))
+            vectors = self.model.encode_batch([text_by_key[key] for key in missing], batch_size)
+            computed = {key: np.asarray(vectors[i], dtype=np.float32) for i, key in enumerate(missing)}
+            with self._lock:
+                self._store(computed)
+            found.update(computed)
+
+        return np.stack([found[key] for key in keys])
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Compteurs du cache : hits, misses, taux de hit, évictions et nombre dʼentrées.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "model": self.model_name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": self._entries,
+                "max_entries": self.max_entries,
+            }
+
+    def close(self) -> None:
+        """Ferme la base SQLite du cache."""
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # SQLite
+    # ------------------------------------------------------------------
+
+    def _lookup(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """Vecteurs en cache parmi `keys`, dont la date dʼutilisation est rafraîchie."""
+        found: Dict[bytes, np.ndarray] = {}
+        for start in range(0, len(keys), _SQL_IN_SLICE):
+            part = keys[start:start + _SQL_IN_SLICE]
+            rows = self._conn.execute(
+                f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(part))})",
+                [self.model_name, *part],
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+        if found:
+            now = time.time_ns()
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?",
+                [(now, self.model_name, key) for key in found],
+            )
+            self._conn.commit()
+        return found
+
+    def _store(self, vectors: Dict[bytes, np.ndarray]) -> None:
+        """Ajoute `vectors` au cache puis supprime les entrées LRU au-delà de `max_entries`."""
+        now = time.time_ns()
+        before = self._conn.total_changes
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO embeddings (model, hash, vector, last_used) VALUES (?, ?, ?, ?)",
+            [(self.model_name, key, vec.tobytes(), now) for key, vec in vectors.items()],
+        )
+        self._entries += self._conn.total_changes - before
+
+        excess = self._entries - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE (model, hash) IN "
+                "(SELECT model, hash FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+            self.evictions += excess
+            self._entries -= excess
+        self._conn.commit()
@@ -5,9 +5,14 @@ une implémentation basée sur Sentence-Transformers.
 """
 
 from abc import ABC, abstractmethod
-from typing import List
+from typing import List, Optional, Sequence
+import numpy as np
 import torch
 
+from embeddings.batching import BatchStats, DEFAULT_MAX_BATCH_TOKENS, encode_bucketed
+
+DEFAULT_BATCH_SIZE = 32  # Textes encodés par passe du modèle
+
 # --------------------------------------------------------------------------- #
 #  Interface abstraite
 # --------------------------------------------------------------------------- #
@@ -24,6 +29,18 @@ class AbstractEmbeddingModel(ABC):
         """
         pass
 
+    def encode_batch(self, texts: Sequence[str], batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+        """
+        Transforme plusieurs textes en embeddings, dans le même ordre.
+        Retourne une matrice float32 de forme (len(texts), dimension).
+
+        L'implémentation par défaut appelle `encode` texte par texte : les
+        modèles capables de traiter un lot en une passe doivent la surcharger.
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.asarray([self.encode(text) for text in texts], dtype=np.float32)
+
 # --------------------------------------------------------------------------- #
 #  Implementation Sentence-Transformers
 # --------------------------------------------------------------------------- #
@@ -34,12 +51,39 @@ class SentenceTransformerEmbeddingModel(AbstractEmbeddingModel):
     """
     Wrapper tout simple autour dʼun modèle Sentence-Transformers.
     Par défaut : `all-MiniLM-L6-v2` (384 dimensions, rapide et léger).
+
+    Les lots sont formés par longueur en tokens sous un budget de
+    `max_batch_tokens` tokens paddés (voir embeddings/batching.py) ;
+    `batch_stats` cumule le taux de padding et le débit en tokens/s.
     """
 
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", device: Optional[str] = None,
+                 max_batch_tokens: Optional[int] = DEFAULT_MAX_BATCH_TOKENS):
+        self.model_name = model_name  # Identifie les vecteurs produits (cache, index)
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
         self.model = SentenceTransformer(model_name, device=self.device)
+        self.max_batch_tokens = max_batch_tokens  # None = lots de `batch_size` textes, dans lʼordre
+        self.batch_stats = BatchStats()
 
     def encode(self, text: str) -> List[float]:
         # `.tolist()` to get native python list
         return self.model.encode(text).tolist()
+
+    def encode_batch(self, texts: Sequence[str], batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+        # `batch_size` ne sert que si les lots ne sont pas formés sous un budget de tokens
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        texts = list(texts)
+
+        def encode_texts(indices: np.ndarray) -> np.ndarray:
+            return self.model.encode([texts[i] for i in indices], batch_size=len(indices),
+                                     convert_to_numpy=True, show_progress_bar=False)
+
+        return encode_bucketed(self.token_lengths(texts), encode_texts,
+                               self.max_batch_tokens, batch_size, self.batch_stats)
+
+    def token_lengths(self, texts: Sequence[str]) -> np.ndarray:
+        """Nombre de tokens de chaque texte, tel que vu par le modèle (tronqué à max_seq_length)."""
+        input_ids = self.model.tokenizer(list(texts), truncation=True,
+                                         max_length=self.model.max_seq_length)["input_ids"]
+        return np.fromiter((len(ids) for ids in input_ids), dtype=np.int64, count=len(input_ids))
@@ -0,0 +1,150 @@
+"""
+model_registry.py
+Registre des modèles partagés par tout le processus.
+
+Charger all-MiniLM-L6-v2 coûte plusieurs secondes et des centaines de Mo :
+les couches metadata, index et RAG ne doivent pas chacune créer leur propre
+instance. Chaque modèle est chargé une seule fois par (nom, device, backend),
+au premier appel, puis la même instance est rendue à tous les appelants.
+
+Exemple :
+
+    model = get_embedding_model()                        # Sentence-Transformers, device auto
+    model = get_embedding_model(backend="onnx-int8")     # ONNX Runtime, poids int8
+    query_model = get_query_embedding_model()            # Même modèle + cache LRU des questions
+    pool = get_embedding_pool(workers=8)                 # N processus, une copie du modèle chacun
+    summarizer = get_summarizer()                        # T5, chargé seulement si utilisé
+
+Variables dʼenvironnement :
+- ``EMBEDDING_BACKEND``          : backend par défaut (torch, onnx ou onnx-int8, défaut : torch)
+- ``EMBEDDING_DEVICE``           : device par défaut du backend torch (défaut : cuda si disponible)
+- ``QUERY_EMBEDDING_CACHE_SIZE`` : nombre de questions gardées par le cache LRU
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from typing import Dict, Tuple
+
+import torch
+
+from embeddings.embeddings import AbstractEmbeddingModel, SentenceTransformerEmbeddingModel
+from embeddings.process_pool import ProcessPoolEmbeddingModel
+from embeddings.query_cache import QueryEmbeddingCache, DEFAULT_QUERY_CACHE_SIZE
+
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+DEFAULT_SUMMARIZER_MODEL = "t5-small"
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+_lock = threading.RLock()
+_embedding_models: Dict[Tuple[str, str, str], AbstractEmbeddingModel] = {}
+_query_models: Dict[Tuple[str, str, str], QueryEmbeddingCache] = {}
+_pools: Dict[Tuple[str, str, int], ProcessPoolEmbeddingModel] = {}
+_summarizers: Dict[str, object] = {}
+
+
+def get_embedding_model(
+    model_name: str = DEFAULT_EMBEDDING_MODEL, device: str | None = None, backend: str | None = None
+) -> AbstractEmbeddingModel:
+    """
+    Retourne lʼinstance partagée du modèle (model_name, device, backend), chargée au premier appel.
+
+    Args:
+        model_name (str): Nom Sentence-Transformers du modèle.
+        device (str, optional): "cpu", "cuda", ... (backend torch), par défaut EMBEDDING_DEVICE ou auto.
+        backend (str, optional): "torch", "onnx" ou "onnx-int8", par défaut EMBEDDING_BACKEND ou "torch".
+
+    Raises:
+        ValueError: Si le backend est inconnu.
+    """
+    key = _resolve_key(model_name, device, backend)
+    with _lock:
+        model = _embedding_models.get(key)
+        if model is None:
+            print(f"[ModelRegistry] Loading embedding model {key[0]} (device={key[1]}, backend={key[2]}) ...")
+            model = _load_embedding_model(*key)
+            _embedding_models[key] = model
+        return model
+
+
+def get_query_embedding_model(
+    model_name: str = DEFAULT_EMBEDDING_MODEL, device: str | None = None, backend: str | None = None
+) -> QueryEmbeddingCache:
+    """
+    Retourne le modèle partagé (voir `get_embedding_model`) derrière un cache LRU
+    des questions, lui aussi partagé par les index managers et les RAGEngine.
+    """
+    key = _resolve_key(model_name, device, backend)
+    with _lock:
+        query_model = _query_models.get(key)
+        if query_model is None:
+            cache_size = os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "")
+            query_model = QueryEmbeddingCache(
+                get_embedding_model(*key),
+                maxsize=int(cache_size) if cache_size.isdigit() else DEFAULT_QUERY_CACHE_SIZE,
+            )
+            _query_models[key] = query_model
+        return query_model
+
+
+def get_embedding_pool(
+    workers: int, model_name: str = DEFAULT_EMBEDDING_MODEL, backend: str | None = None
+) -> ProcessPoolEmbeddingModel:
+    """
+    Retourne le pool de processus partagé (model_name, backend, workers), démarré au premier appel.
+    Chaque worker charge sa propre copie du modèle, sur CPU.
+    """
+    model_name, _, backend = _resolve_key(model_name, "cpu", backend)
+    key = (model_name, backend, workers)
+    with _lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ProcessPoolEmbeddingModel(model_name, backend=backend, workers=workers)
+            _pools[key] = pool
+        return pool
+
+
+def get_summarizer(model_name: str = DEFAULT_SUMMARIZER_MODEL):
+    """
+    Retourne le résumeur T5 partagé, chargé au premier appel.
+    """
+    with _lock:
+        summarizer = _summarizers.get(model_name)
+        if summarizer is None:
+            from summarizers.summarizers import T5Summarizer
+
+            print(f"[ModelRegistry] Loading summarizer {model_name} ...")
+            summarizer = T5Summarizer(model_name)
+            _summarizers[model_name] = summarizer
+        return summarizer
+
+
+def loaded_models() -> Dict[str, list]:
+    """Modèles actuellement chargés dans le processus (diagnostic)."""
+    with _lock:
+        return {
+            "embedding_models": [list(key) for key in _embedding_models],
+            "embedding_pools": [list(key) for key in _pools],
+            "summarizers": list(_summarizers),
+        }
+
+
+def _resolve_key(model_name: str, device: str | None, backend: str | None) -> Tuple[str, str, str]:
+    """Clé (modèle, device, backend) avec les valeurs par défaut résolues."""
+    backend = backend or os.getenv("EMBEDDING_BACKEND", "torch")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {BACKENDS}.")
+    if backend != "torch":
+        return model_name, "cpu", backend
+    device = device or os.getenv("EMBEDDING_DEVICE") or ("cuda" if torch.cuda.is_available() else "cpu")
+    return model_name, device, backend
+
+
+def _load_embedding_model(model_name: str, device: str, backend: str) -> AbstractEmbeddingModel:
+    """Instancie le modèle ; les backends ONNX ne sont importés que sʼils sont utilisés."""
+    if backend == "torch":
+        return SentenceTransformerEmbeddingModel(model_name, device=device)
+    from embeddings.onnx_embeddings import OnnxEmbeddingModel
+
+    return OnnxEmbeddingModel(model_name, quantize=backend == "onnx-int8")
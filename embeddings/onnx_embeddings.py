@@ -0,0 +1,162 @@
+"""
+onnx_embeddings.py
+Implémentation CPU de `AbstractEmbeddingModel` basée sur ONNX Runtime.
+
+Sans GPU, Sentence-Transformers exécute le modèle en PyTorch « eager », ce
+qui limite le débit de lʼingestion. `OnnxEmbeddingModel` exporte une seule
+fois le transformer du modèle Sentence-Transformers en ONNX (optionnellement
+quantifié en int8 dynamique), puis lʼexécute avec ONNX Runtime.
+
+Le pooling (moyenne des tokens pondérée par le masque dʼattention) et la
+normalisation L2 reproduisent ceux de `all-MiniLM-L6-v2` : les vecteurs
+restent compatibles avec les index existants (voir tests/test_onnx_embeddings.py
+pour les tolérances fp32 / int8).
+
+Exemple :
+
+    model = OnnxEmbeddingModel(quantize=True, intra_op_threads=4)
+    vectors = model.encode_batch(["texte 1", "texte 2"])
+
+Fichiers exportés ::
+
+    <export_dir>/<model>/model.onnx       (fp32)
+                        /model_int8.onnx  (poids int8, si quantize=True)
+                        /tokenizer.json, ...
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import List, Sequence
+
+import numpy as np
+import onnxruntime as ort
+from transformers import AutoTokenizer
+
+from embeddings.batching import BatchStats, DEFAULT_MAX_BATCH_TOKENS, encode_bucketed
+from embeddings.embeddings import AbstractEmbeddingModel, DEFAULT_BATCH_SIZE
+
+DEFAULT_EXPORT_DIR = "models/onnx"
+DEFAULT_MAX_SEQ_LENGTH = 256  # Valeur de Sentence-Transformers pour all-MiniLM-L6-v2
+_ONNX_OPSET = 14
+
+
+class OnnxEmbeddingModel(AbstractEmbeddingModel):
+    """
+    Modèle Sentence-Transformers exécuté par ONNX Runtime sur CPU.
+    Par défaut : `all-MiniLM-L6-v2` (384 dimensions).
+    """
+
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        export_dir: str | Path = DEFAULT_EXPORT_DIR,
+        quantize: bool = False,
+        intra_op_threads: int | None = None,
+        max_seq_length: int = DEFAULT_MAX_SEQ_LENGTH,
+        normalize: bool = True,
+        max_batch_tokens: int | None = DEFAULT_MAX_BATCH_TOKENS,
+    ):
+        """
+        Args:
+            model_name (str): Nom Sentence-Transformers (ou identifiant Hugging Face) du modèle.
+            export_dir (str | Path): Dossier des modèles exportés (réutilisés entre exécutions).
+            quantize (bool): Utilise les poids quantifiés en int8 (quantification dynamique).
+            intra_op_threads (int, optional): Threads ONNX Runtime par opérateur,
+                par défaut ORT_INTRA_OP_THREADS ou le choix dʼONNX Runtime (tous les cœurs).
+            max_seq_length (int): Nombre max de tokens par texte (les suivants sont ignorés).
+            normalize (bool): Normalise les vecteurs (L2), comme le module Normalize du modèle.
+            max_batch_tokens (int, optional): Budget de tokens paddés par lot, les textes étant
+                regroupés par longueur (voir embeddings/batching.py). None = lots de `batch_size`.
+        """
+        # Les vecteurs int8 diffèrent légèrement : ils ne partagent pas le cache des vecteurs fp32
+        self.model_name = f"{model_name}+int8" if quantize else model_name
+        self.max_seq_length = max_seq_length
+        self.normalize = normalize
+        self.max_batch_tokens = max_batch_tokens
+        self.batch_stats = BatchStats()
+
+        model_dir = Path(export_dir) / model_name.replace("/", "_")
+        onnx_path = model_dir / ("model_int8.onnx" if quantize else "model.onnx")
+        if not onnx_path.exists():
+            _export(_hf_model_id(model_name), model_dir, quantize)
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+
+        if intra_op_threads is None and os.getenv("ORT_INTRA_OP_THREADS", "").isdigit():
+            intra_op_threads = int(os.environ["ORT_INTRA_OP_THREADS"])
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.inter_op_num_threads = 1
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(str(onnx_path), options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, text: str) -> List[float]:
+        return self.encode_batch([text])[0].tolist()
+
+    def encode_batch(self, texts: Sequence[str], batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        # Tokenisés une seule fois, sans padding : chaque lot est complété à sa propre longueur
+        features = self.tokenizer(list(texts), truncation=True, max_length=self.max_seq_length)
+        lengths = np.fromiter((len(ids) for ids in features["input_ids"]), dtype=np.int64, count=len(texts))
+
+        def encode_rows(indices: np.ndarray) -> np.ndarray:
+            batch = {name: [values[i] for i in indices] for name, values in features.items()}
+            return self._encode_padded(self.tokenizer.pad(batch, return_tensors="np"))
+
+        return encode_bucketed(lengths, encode_rows, self.max_batch_tokens, batch_size, self.batch_stats)
+
+    def _encode_padded(self, features) -> np.ndarray:
+        """Encode un lot de textes tokenisés et complétés à la longueur du plus long."""
+        feed = {name: np.asarray(value, dtype=np.int64)
+                for name, value in features.items() if name in self._input_names}
+        token_embeddings = self.session.run(["last_hidden_state"], feed)[0]
+
+        # Mean pooling : moyenne des tokens réels (masque dʼattention)
+        mask = feed["attention_mask"][..., None].astype(np.float32)
+        vectors = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors
+
+
+def _hf_model_id(model_name: str) -> str:
+    """Les noms courts de Sentence-Transformers sont publiés sous `sentence-transformers/`."""
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+def _export(hf_model_id: str, model_dir: Path, quantize: bool) -> None:
+    """
+    Exporte le transformer et le tokenizer de `hf_model_id` dans `model_dir`
+    (model.onnx), puis sa version quantifiée en int8 (model_int8.onnx) si demandé.
+    """
+    import torch  # Uniquement nécessaire pour lʼexport
+    from transformers import AutoModel
+
+    model_dir.mkdir(parents=True, exist_ok=True)
+    onnx_path = model_dir / "model.onnx"
+    if not onnx_path.exists():
+        print(f"[OnnxEmbedding] Exporting {hf_model_id} to {onnx_path} ...")
+        tokenizer = AutoTokenizer.from_pretrained(hf_model_id)
+        model = AutoModel.from_pretrained(hf_model_id).eval()
+        sample = tokenizer(["exemple de texte"], return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+        with torch.no_grad():
+            torch.onnx.export(
+                model, tuple(sample[name] for name in input_names), str(onnx_path),
+                input_names=input_names, output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes, opset_version=_ONNX_OPSET,
+            )
+        tokenizer.save_pretrained(str(model_dir))
+
+    if quantize and not (model_dir / "model_int8.onnx").exists():
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        print(f"[OnnxEmbedding] Quantizing {onnx_path} to int8 ...")
+        quantize_dynamic(str(onnx_path), str(model_dir / "model_int8.onnx"), weight_type=QuantType.QInt8)
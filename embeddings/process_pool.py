@@ -0,0 +1,121 @@
+"""
+process_pool.py
+Backend dʼembeddings multi-processus pour lʼingestion sur CPU.
+
+Un seul processus Python ne sature pas une machine à 32 cœurs, même avec des
+lots : `ProcessPoolEmbeddingModel` démarre N workers (spawn), chacun avec sa
+propre copie du modèle et un nombre de threads fixé, découpe chaque lot en
+parts contiguës réparties entre les workers et recolle les résultats dans
+lʼordre. Il implémente `AbstractEmbeddingModel` : MetadataGenerator lʼutilise
+sans modification (voir EMBEDDING_WORKERS dans MetadataManager).
+
+Exemple :
+
+    with ProcessPoolEmbeddingModel(workers=8, threads_per_worker=4) as model:
+        vectors = model.encode_batch(texts, batch_size=64)
+
+Voir scripts/benchmark_embeddings.py pour mesurer le débit selon le nombre de workers.
+"""
+
+from __future__ import annotations
+
+import math
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Sequence
+
+import numpy as np
+
+from embeddings.embeddings import AbstractEmbeddingModel, DEFAULT_BATCH_SIZE
+
+DEFAULT_MIN_SHARD_SIZE = 16  # En dessous, lʼenvoi au worker coûte plus que lʼencodage
+
+_worker_model: AbstractEmbeddingModel | None = None  # Modèle du processus worker
+
+
+class ProcessPoolEmbeddingModel(AbstractEmbeddingModel):
+    """Modèle dʼembeddings réparti sur un pool de processus."""
+
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        backend: str = "torch",
+        workers: int | None = None,
+        threads_per_worker: int | None = None,
+        min_shard_size: int = DEFAULT_MIN_SHARD_SIZE,
+    ):
+        """
+        Args:
+            model_name (str): Nom Sentence-Transformers du modèle chargé par chaque worker.
+            backend (str): "torch", "onnx" ou "onnx-int8" (voir embeddings/model_registry.py).
+            workers (int, optional): Nombre de processus, par défaut le nombre de cœurs.
+            threads_per_worker (int, optional): Threads de calcul par worker,
+                par défaut les cœurs répartis entre les workers.
+            min_shard_size (int): Nombre min de textes envoyés à un worker.
+        """
+        cpus = os.cpu_count() or 1
+        self.workers = workers or cpus
+        self.threads_per_worker = threads_per_worker or max(1, cpus // self.workers)
+        self.min_shard_size = min_shard_size
+        # Même clé de cache que le modèle chargé par les workers
+        self.model_name = f"{model_name}+int8" if backend == "onnx-int8" else model_name
+
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_name, backend, self.threads_per_worker),
+        )
+        print(f"[EmbeddingPool] Started {self.workers} workers ({model_name}, backend={backend}, "
+              f"{self.threads_per_worker} threads each).")
+
+    def encode(self, text: str) -> List[float]:
+        return self.encode_batch([text])[0].tolist()
+
+    def encode_batch(self, texts: Sequence[str], batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+        """
+        Encode `texts` en parallèle : une part contiguë par worker, résultats dans lʼordre.
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        shards = _shard(list(texts), self.workers, self.min_shard_size)
+        futures = [self._executor.submit(_encode_shard, shard, batch_size) for shard in shards]
+        return np.concatenate([future.result() for future in futures]).astype(np.float32, copy=False)
+
+    def close(self) -> None:
+        """Arrête les workers."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self) -> "ProcessPoolEmbeddingModel":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _shard(texts: List[str], workers: int, min_shard_size: int) -> List[List[str]]:
+    """Découpe `texts` en au plus `workers` parts contiguës de taille équilibrée."""
+    count = max(1, min(workers, math.ceil(len(texts) / max(min_shard_size, 1))))
+    size = math.ceil(len(texts) / count)
+    return [texts[start:start + size] for start in range(0, len(texts), size)]
+
+
+def _init_worker(model_name: str, backend: str, threads: int) -> None:
+    """Initialisation dʼun worker : threads de calcul, puis chargement du modèle."""
+    global _worker_model
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["ORT_INTRA_OP_THREADS"] = str(threads)
+    if backend == "torch":
+        import torch
+
+        torch.set_num_threads(threads)
+    from embeddings.model_registry import get_embedding_model
+
+    _worker_model = get_embedding_model(model_name, device="cpu", backend=backend)
+
+
+def _encode_shard(texts: List[str], batch_size: int) -> np.ndarray:
+    """Encode une part dans le worker courant."""
+    assert _worker_model is not None, "Worker not initialized"
+    return _worker_model.encode_batch(texts, batch_size)
@@ -0,0 +1,110 @@
+"""
+query_cache.py
+Cache LRU en mémoire des embeddings de questions.
+
+Une même question est souvent encodée plusieurs fois : question répétée,
+ou posée une fois par collection dans `cmd_rag_query`. `QueryEmbeddingCache`
+enveloppe le modèle dʼembeddings partagé par FaissIndexManager et RAGEngine
+et garde les derniers vecteurs calculés, indexés par le texte normalisé
+(Unicode NFC, espaces fusionnés), pour éviter la passe du modèle.
+
+Exemple :
+
+    embedding_model = QueryEmbeddingCache(SentenceTransformerEmbeddingModel(), maxsize=1024)
+    registry = IndexRegistry(db, embedding_model)
+    vectors = embedding_model.encode_batch(["how to deploy multisig ?"])
+    print(embedding_model.stats())
+"""
+
+from __future__ import annotations
+
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from embeddings.embeddings import AbstractEmbeddingModel, DEFAULT_BATCH_SIZE
+
+DEFAULT_QUERY_CACHE_SIZE = 1024  # Questions gardées en mémoire
+
+
+def normalize_query(text: str) -> str:
+    """Clé de cache dʼune question : Unicode NFC, espaces de début / fin retirés et fusionnés."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class QueryEmbeddingCache(AbstractEmbeddingModel):
+    """Modèle dʼembeddings précédé dʼun cache LRU des questions récentes."""
+
+    def __init__(self, model: AbstractEmbeddingModel, maxsize: int = DEFAULT_QUERY_CACHE_SIZE):
+        """
+        Args:
+            model (AbstractEmbeddingModel): Modèle appelé pour les questions absentes du cache.
+            maxsize (int): Nombre max de questions gardées (0 désactive le cache).
+        """
+        self.model = model
+        self.model_name = getattr(model, "model_name", type(model).__name__)
+        self.maxsize = maxsize
+
+        self._vectors: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, text: str) -> List[float]:
+        return self.encode_batch([text])[0].tolist()
+
+    def encode_batch(self, texts: Sequence[str], batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+        """
+        Retourne les embeddings de `texts` (float32, dans lʼordre). Seules les
+        questions absentes du cache passent par le modèle, en un seul lot.
+
+        La matrice retournée est une copie : lʼappelant peut la modifier
+        (ex. normalisation en place) sans altérer le cache.
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        keys = [normalize_query(text) for text in texts]
+
+        with self._lock:
+            found = {key: self._vectors[key] for key in dict.fromkeys(keys) if key in self._vectors}
+            for key in found:
+                self._vectors.move_to_end(key)
+            cached = sum(1 for key in keys if key in found)
+            self.hits += cached
+            self.misses += len(keys) - cached
+
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing:
+            vectors = self.model.encode_batch(missing, batch_size)
+            computed = {key: np.array(vectors[i], dtype=np.float32) for i, key in enumerate(missing)}
+            with self._lock:
+                for key, vector in computed.items():
+                    self._vectors[key] = vector
+                    self._vectors.move_to_end(key)
+                while len(self._vectors) > self.maxsize:
+                    self._vectors.popitem(last=False)
+            found.update(computed)
+
+        return np.stack([found[key] for key in keys])
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Compteurs du cache : hits, misses, taux de hit et nombre de questions gardées.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._vectors),
+                "maxsize": self.maxsize,
+            }
+
+    def clear(self) -> None:
+        """Vide le cache (ex. après un changement de modèle)."""
+        with self._lock:
+            self._vectors.clear()
@@ -11,10 +11,13 @@ import sys
 from core.database_manager import DatabaseManager
 from core.file_storage_manager import FileStorageManager
 from core.faiss_index_manager import FaissIndexManager
+from core.index_registry import IndexRegistry, DEFAULT_MEMORY_BUDGET_BYTES
 from collectors.github_collector import GitHubCollector
 from metadata.metadata_manager import MetadataManager
 from rag.rag_engine import RAGEngine
-from embeddings.embeddings import SentenceTransformerEmbeddingModel
+from embeddings.embeddings import AbstractEmbeddingModel
+from embeddings.model_registry import get_query_embedding_model
+from embeddings.query_cache import QueryEmbeddingCache
 from utils.cli_helpers import ask_repo, select_collection_interactively, ask_question, ask_top_k
 
 import multiprocessing
@@ -28,6 +31,9 @@ from typing import (Optional)
 # Global variable to track server process
 server_process = None
 
+# Global registry keeping Faiss indexes loaded between RAG queries
+index_registry = None
+
 def interactive_menu():
     """
     Displays a menu and returns user's choice as an integer.
@@ -77,7 +83,6 @@ def run_main_loop():
     local_storage_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.getenv("LOCAL_STORAGE_PATH", "local_storage"))
     base_url = os.getenv("BASE_URL", f"http://localhost:{os.getenv('PORT', 8000)}")
     storage_manager = FileStorageManager(base_storage_path=local_storage_path, base_url=base_url)
-    embedding_model = SentenceTransformerEmbeddingModel()
     recorder = RAGQueryRecorder("experiments/rag_benchmark.jsonl")
 
     try:
@@ -110,7 +115,8 @@ def run_main_loop():
             elif choice == "12":
                 cmd_start_chat()
             elif choice == "13":
-                cmd_rag_query(mongo_uri, db_name, embedding_model, recorder)
+                # Shared model + LRU of query embeddings, loaded on the first RAG query
+                cmd_rag_query(mongo_uri, db_name, get_query_embedding_model(), recorder)
             elif choice == "0":
                 print("Goodbye!")
                 break
@@ -396,7 +402,7 @@ def cmd_start_chat(llm):
         answer = llm.chat(user_input, context=None)
         print("Bot:", answer)
 
-def cmd_rag_query(mongo_uri: str, db_name: str, embedding_model: SentenceTransformerEmbeddingModel, recorder: Optional[RAGQueryRecorder] = None):
+def cmd_rag_query(mongo_uri: str, db_name: str, embedding_model: AbstractEmbeddingModel, recorder: Optional[RAGQueryRecorder] = None):
     """
     Ask the user a natural-language question, retrieve the top-k chunks
     with Faiss, and generate an LLM answer.
@@ -420,18 +426,19 @@ def cmd_rag_query(mongo_uri: str, db_name: str, embedding_model: SentenceTransfo
         },
     )
 
-    # Build / load Faiss index
-    index_mgr = FaissIndexManager(db_manager)
+    # Build / load Faiss index (kept resident between queries by the registry)
+    registry = get_index_registry(mongo_uri, db_name, embedding_model)
 
     for collection in collections:
         print(f"\n[Collection: {collection}]")
         try:
-            index_mgr.load_index(repo, collection)
+            index_mgr = registry.get(repo, collection)
         except FileNotFoundError:
             print("[RAG] Index not found, building…")
             try:
-                index_mgr.build_index(repo, [collection], force=True)
-            except ValueError as ve:
+                FaissIndexManager(db_manager, embedding_model).build_index(repo, [collection], force=True)
+                index_mgr = registry.get(repo, collection)
+            except (ValueError, FileNotFoundError) as ve:
                 print(f"[RAG] No embeddings found for collection '{collection}'. Skipping.")
                 continue
         
@@ -455,6 +462,28 @@ def cmd_rag_query(mongo_uri: str, db_name: str, embedding_model: SentenceTransfo
         answer = rag.answer_query(question, top_k=top_k)
         print("\n--- ANSWER ---\n")
         print(answer)
+        print(f"\n[RAG] Index registry: {registry.stats()}")
+        if isinstance(embedding_model, QueryEmbeddingCache):
+            print(f"[RAG] Query embedding cache: {embedding_model.stats()}")
+
+def get_index_registry(mongo_uri: str, db_name: str, embedding_model: AbstractEmbeddingModel) -> IndexRegistry:
+    """
+    Returns the process-wide index registry, creating it on first use.
+    The memory budget can be set with the FAISS_INDEX_MEMORY_BUDGET_MB env variable,
+    and FAISS_INDEX_MMAP=1 loads the indexes memory-mapped and read-only.
+    """
+    global index_registry
+
+    if index_registry is None:
+        budget_mb = os.getenv("FAISS_INDEX_MEMORY_BUDGET_MB")
+        budget = int(budget_mb) * 1024 * 1024 if budget_mb and budget_mb.isdigit() else DEFAULT_MEMORY_BUDGET_BYTES
+        index_registry = IndexRegistry(
+            DatabaseManager(mongo_uri, db_name, create_indexes=False),
+            embedding_model,
+            memory_budget_bytes=budget,
+            mmap=os.getenv("FAISS_INDEX_MMAP", "0").lower() in ("1", "true", "yes"),
+        )
+    return index_registry
 
 # def cmd_analyze_logs(llm: ILLM):
 def cmd_analyze_logs(llm):
@@ -0,0 +1,136 @@
+"""
+bulk_writer.py
+Buffers MongoDB write operations and sends them as unordered bulk_write batches.
+
+MetadataGenerator used to issue one synchronous round trip per chunk upsert,
+metadata upsert, source link and chunk_changes entry: on a 50k-file repository
+ingestion was bound by Mongo latency. BulkWriter queues these operations per
+collection and flushes them once `flush_size` operations are pending or
+`flush_interval` seconds have passed since the last flush.
+
+Collections listed in `flush_order` are flushed first, in that order, the
+others in the order they were first written to. MetadataGenerator flushes
+chunks, then chunk_changes, then source links, then metadata: a
+chunk_changes entry is never visible before the chunks it refers to, and
+the metadata upsert carrying the source signature only lands once the rest
+of the document is written. Inside a collection the batch is unordered:
+callers must not queue two operations on the same document whose result
+depends on their order. A writer can be shared by several threads.
+
+When a bulk_write fails, the operations that were not written (the failed
+ones of that batch and every collection not flushed yet) are put back in
+the buffer before the error is raised, so the next flush retries them
+instead of losing them.
+
+Example:
+
+    writer = BulkWriter(db_manager.db, flush_size=1000, flush_interval=5.0,
+                        flush_order=("chunks", "chunk_changes", "metadata"))
+    writer.add("chunks", UpdateOne({"_id": chunk_id}, {"$set": chunk_doc}, upsert=True))
+    ...
+    writer.flush()
+    print(writer.stats())
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Sequence
+
+from pymongo import InsertOne
+from pymongo.database import Database
+from pymongo.errors import BulkWriteError
+
+DEFAULT_FLUSH_SIZE = 1000  # Pending operations, all collections together
+DEFAULT_FLUSH_INTERVAL = 5.0  # Seconds between two flushes
+_DUPLICATE_KEY = 11000  # Error code of an InsertOne already written by a previous attempt
+
+
+class BulkWriter:
+    """Per-collection buffers of write operations, flushed as unordered bulk writes."""
+
+    def __init__(self, db: Database, flush_size: int = DEFAULT_FLUSH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, flush_order: Sequence[str] = ()):
+        """
+        Args:
+            db (Database): MongoDB database the operations are written to.
+            flush_size (int): Number of pending operations that triggers a flush (1 = no buffering).
+            flush_interval (float): Maximum number of seconds an operation stays buffered,
+                checked each time an operation is added.
+            flush_order (Sequence[str]): Collections flushed first, in this order; the others
+                follow in the order they were first written to.
+        """
+        self.db = db
+        self.flush_size = max(flush_size, 1)
+        self.flush_interval = flush_interval
+        self.flush_order = tuple(flush_order)
+        self._pending: Dict[str, List[Any]] = {}  # Insertion order = flush order
+        self._pending_count = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.RLock()
+        self.operations = 0  # Operations sent to MongoDB
+        self.batches = 0  # bulk_write calls
+        self.seconds = 0.0  # Time spent in bulk_write
+        self.failures = 0  # Failed bulk_write calls
+
+    def add(self, collection: str, operation: Any) -> None:
+        """
+        Queue a write operation (UpdateOne, DeleteMany, InsertOne, ...) on `collection`,
+        flushing all buffers if the size or time threshold is reached.
+        """
+        with self._lock:
+            self._pending.setdefault(collection, []).append(operation)
+            self._pending_count += 1
+            if (self._pending_count >= self.flush_size
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self.flush()
+
+    def flush(self) -> None:
+        """
+        Send every pending operation, one unordered bulk_write per collection.
+
+        Raises:
+            PyMongoError: If a bulk_write fails. The operations not written are pending again.
+        """
+        with self._lock:
+            pending, self._pending, self._pending_count = self._pending, {}, 0
+            self._last_flush = time.monotonic()
+            collections = [c for c in self.flush_order if c in pending]
+            collections += [c for c in pending if c not in self.flush_order]
+            for position, collection in enumerate(collections):
+                operations = pending[collection]
+                t0 = time.perf_counter()
+                try:
+                    self.db[collection].bulk_write(operations, ordered=False)
+                except BaseException as exc:
+                    self.failures += 1
+                    self._pending = {collection: _unwritten(operations, exc)}
+                    self._pending.update((c, pending[c]) for c in collections[position + 1:])
+                    self._pending_count = sum(len(ops) for ops in self._pending.values())
+                    raise
+                finally:
+                    self.seconds += time.perf_counter() - t0
+                self.operations += len(operations)
+                self.batches += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Operations written, bulk_write calls and write throughput since creation."""
+        return {
+            "operations": self.operations,
+            "batches": self.batches,
+            "pending": self._pending_count,
+            "failures": self.failures,
+            "seconds": round(self.seconds, 3),
+            "writes_per_sec": round(self.operations / self.seconds, 1) if self.seconds else 0.0,
+        }
+
+
+def _unwritten(operations: List[Any], exc: BaseException) -> List[Any]:
+    """
+    Operations of a failed unordered bulk_write to send again: the ones reported as failed,
+    or all of them if the error does not tell (they are upserts / deletes, safe to replay).
+    An InsertOne failing on a duplicate key was already written by a previous attempt.
+    """
+    if not isinstance(exc, BulkWriteError):
+        return list(operations)
+    return [operations[error["index"]] for error in exc.details.get("writeErrors", [])
+            if not (error.get("code") == _DUPLICATE_KEY and isinstance(operations[error["index"]], InsertOne))]
@@ -3,38 +3,86 @@ metadata_generator.py
 Generates metadata for files: chunking, embeddings, summarization, etc.
 """
 
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from pymongo import DeleteMany, InsertOne, UpdateOne
 from pymongo.collection import Collection
 from core.database_manager import DatabaseManager
 from core.file_storage_manager import FileStorageManager
 from embeddings.embeddings import AbstractEmbeddingModel
+from embeddings.model_registry import get_summarizer
 from summarizers.summarizers import AbstractSummarizer
+from metadata.bulk_writer import BulkWriter, DEFAULT_FLUSH_INTERVAL, DEFAULT_FLUSH_SIZE
+from metadata.metadata_runs import MetadataRun
 from metadata.metadata_utils import compute_file_hash_md5, detect_file_type, detect_programming_language, detect_natural_language
 from keywords_extractors.keywords_extractors import AbstractKeywordExtractor
 from chunks.chunking_strategy_factory import ChunkingStrategyFactory
 from chunks.abstract_chunking_strategy import AbstractChunkingStrategy
 import datetime
+import itertools
+
+# Comments collection and parent field of each commented source collection.
+# Collectors store the parent issue/PR number, as a string, next to the repo.
+COMMENT_SOURCES = {
+    "issues": ("issues_comments", "issue_id"),
+    "pull_requests": ("pull_requests_comments", "pr_id"),
+}
+DEFAULT_PAGE_SIZE = 500  # Source documents whose comments are fetched with one query
+METADATA_VERSION = 0  # Current metadata version, outdated metadata is regenerated
+
+# Source field that changes whenever the extracted text can change: blob sha of
+# repository files, sha of commit files and commits, last update of issues and PRs.
+# Recorded in metadata as `source_signature`, see find_changed_items.
+SIGNATURE_FIELDS = {
+    "files": "commit_id",
+    "main_files": "commit_id",
+    "last_release_files": "commit_id",
+    "commits": "_id",
+    "issues": "updated_at",
+    "pull_requests": "updated_at",
+}
+
+# Collections of a document's writes, flushed in this order (see BulkWriter). The metadata
+# upsert carries the source signature and goes last: if a flush fails or the process dies,
+# a document whose chunk_changes entry or source link was not written is not skipped as
+# unchanged by the next run.
+FLUSH_ORDER = ("chunks", "chunk_changes", *SIGNATURE_FIELDS, "metadata")
 
 class MetadataGenerator:
     """Generates or updates metadata (chunks, embeddings, etc.) for files in the database."""
 
     def __init__(self, db_manager : DatabaseManager, file_storage_manager : FileStorageManager,
                  embedding_model: AbstractEmbeddingModel,
-                 summarizer: AbstractSummarizer,
-                 keyword_extractor: AbstractKeywordExtractor):
+                 summarizer: Optional[AbstractSummarizer],
+                 keyword_extractor: AbstractKeywordExtractor,
+                 flush_size: int = DEFAULT_FLUSH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL):
         """
         Args:
             db_manager (DatabaseManager): Provides access to the database.
             file_storage_manager (FileStorageManager): For retrieving file content.
             embedding_model (AbstractEmbeddingModel): Instance implementing the embedding interface.
-            summarizer (AbstractSummarizer): Instance implementing the summarization interface.
+            summarizer (AbstractSummarizer, optional): Instance implementing the summarization interface,
+                None to load the shared T5 summarizer from the model registry on first use.
             keyword_extractor (AbstractKeywordExtractor): Instance implementing the keyword extraction interface.
+            flush_size (int): Chunk, metadata and link writes buffered before an unordered bulk_write.
+            flush_interval (float): Maximum number of seconds a write stays buffered.
         """
         self.db_manager = db_manager
         self.file_storage = file_storage_manager
         self.embedding_model = embedding_model
-        self.summarizer = summarizer
+        self._summarizer = summarizer
         self.keyword_extractor = keyword_extractor
+        self.writer = BulkWriter(db_manager.db, flush_size=flush_size, flush_interval=flush_interval,
+                                 flush_order=FLUSH_ORDER)
+        self._comments: Dict[Tuple[str, str], List[str]] = {}  # (repo, number) -> comments, see prefetch_comments
+
+    @property
+    def summarizer(self) -> AbstractSummarizer:
+        """Summarizer, loaded lazily: most metadata versions never summarize."""
+        if self._summarizer is None:
+            self._summarizer = get_summarizer()
+        return self._summarizer
 
     def extract_text_from_document(self, collection_item: Dict[str, Any], collection: str) -> str:
         """
@@ -62,21 +110,179 @@ class MetadataGenerator:
 
         return ""
 
-    def update_metadata_for_collection(self, repo : str, db_collection: Collection, collection_src: str) -> None:
+    def update_metadata_for_collection(self, repo : str, db_collection: Collection, collection_src: str,
+                                       resume: bool = True) -> None:
         """
         Updates metadata for all documents in a given collection, filtering by repo if needed.
-        
+        Documents whose source signature did not change are skipped before their text is
+        extracted (see find_changed_items). Binary files are detected from their filename,
+        before their content is fetched; they and documents without text only get their
+        signature recorded (see `_write_skipped`).
+
+        The collection is read in `_id` pages, checkpointed in `metadata_runs` once their writes
+        are flushed (see MetadataRun): an interrupted run resumes after its last checkpoint.
+
         Args:
             repo (str): The repository name to filter on.
             db_collection (Dict): The MongoDB collection name (ex. files, main_files, last_release_files, commits, pull_requests, issues).
             collection_src (str): The name of the collection source
+            resume (bool): Resume the last unfinished run of the collection, if any.
+        """
+        run = MetadataRun.start(self.db_manager.db, repo, collection_src, resume=resume)
+        try:
+            for page_ids in run.pages(db_collection, DEFAULT_PAGE_SIZE):
+                page = list(self.find_changed_items(repo, db_collection, collection_src, ids=page_ids))
+                self.prefetch_comments(page, collection_src)
+                for collection_item in page:
+                    run.heartbeat()
+                    skipped = self._skip_reason(collection_item, collection_src)
+                    text = "" if skipped else self.extract_text_from_document(collection_item, collection_src)
+                    if text:
+                        self._generate_metadata_for_document(collection_item, collection_src, text)
+                    else:
+                        self._write_skipped(collection_item, collection_src, skipped or "empty")
+                # Flushed before the checkpoint. On failure nothing is flushed: a failed flush keeps
+                # its operations and would only raise again, hiding the original error
+                self.writer.flush()
+                run.checkpoint(page_ids[-1], pages=1, scanned=len(page_ids), changed=len(page))
+            run.complete()
+        except BaseException as e:
+            run.fail(e)
+            raise
+
+    def find_changed_items(self, repo: str, db_collection: Collection, collection_src: str,
+                           ids: Optional[List[Any]] = None) -> Iterable[Dict[str, Any]]:
+        """
+        Source documents of `repo` that may need new metadata, selected by one aggregation
+        before any text is extracted: a document is left out when its metadata exists, has
+        the current metadata_version and the same `source_signature` (see SIGNATURE_FIELDS).
+        A no-change refresh therefore reads no file content and loads no comments.
+
+        Args:
+            repo (str): The repository name to filter on.
+            db_collection (Collection): Source collection.
+            collection_src (str): The name of the collection source.
+            ids (List[Any], optional): Restrict the selection to these source `_id`s (a page).
+
+        Returns:
+            Iterable[Dict[str, Any]]: Cursor over the new or changed source documents.
+        """
+        query: Dict[str, Any] = {"repo": repo}
+        if ids is not None:
+            query["_id"] = {"$in": ids}
+        field = SIGNATURE_FIELDS.get(collection_src)
+        if field is None:
+            return db_collection.find(query)
+        signature = {"$toString": f"${field}"}
+        return db_collection.aggregate([
+            {"$match": query},
+            # Same id as _compute_metadata_id
+            {"$addFields": {"_metadata_id": {"$concat": ["meta_", "$repo", f"_{collection_src}_", {"$toString": "$_id"}]}}},
+            {"$lookup": {"from": "metadata", "localField": "_metadata_id", "foreignField": "_id", "as": "_metadata"}},
+            {"$unwind": {"path": "$_metadata", "preserveNullAndEmptyArrays": True}},
+            {"$addFields": {"_unchanged": {"$and": [
+                {"$ne": [signature, None]},
+                {"$eq": ["$_metadata.source_signature", signature]},
+                {"$eq": ["$_metadata.metadata_version", METADATA_VERSION]},
+            ]}}},
+            {"$match": {"_unchanged": False}},
+            {"$project": {"_metadata_id": 0, "_metadata": 0, "_unchanged": 0}},
+        ])
+
+    def prefetch_comments(self, collection_items: List[Dict[str, Any]], collection_src: str) -> None:
         """
+        Loads the comments of a page of issues or pull requests with one `$in` query per repo,
+        grouped by parent in memory. Each entry is used once by the text extraction of its
+        document; documents that were not prefetched fall back to a query of their own.
 
-        collection_items = db_collection.find({"repo": repo})
+        Args:
+            collection_items (List[Dict[str, Any]]): Source documents of the page.
+            collection_src (str): Source collection name (nothing to do if it has no comments).
+        """
+        if collection_src not in COMMENT_SOURCES:
+            return
+        comments_collection, parent_field = COMMENT_SOURCES[collection_src]
+        numbers_by_repo: Dict[str, List[str]] = {}
         for collection_item in collection_items:
-            text = self.extract_text_from_document(collection_item, collection_src)
-            if text:
-                self._generate_metadata_for_document(collection_item, collection_src, text)
+            repo, number = _comment_parent_key(collection_item)
+            numbers_by_repo.setdefault(repo, []).append(number)
+            self._comments[(repo, number)] = []
+
+        for repo, numbers in numbers_by_repo.items():
+            cursor = self.db_manager.db[comments_collection].find(
+                {"repo": repo, parent_field: {"$in": numbers}},
+                {parent_field: 1, "comment_body": 1},
+            ).sort([("created_at", 1), ("_id", 1)])
+            for comment in cursor:
+                self._comments[(repo, comment[parent_field])].append(comment["comment_body"])
+
+    def _comments_text(self, collection_item: Dict[str, Any], collection_src: str) -> str:
+        """
+        Comments of an issue or pull request, oldest first, one per line.
+        """
+        key = _comment_parent_key(collection_item)
+        comments = self._comments.pop(key, None)
+        if comments is None:
+            # Not prefetched: single-document query
+            comments_collection, parent_field = COMMENT_SOURCES[collection_src]
+            cursor = self.db_manager.db[comments_collection].find(
+                {"repo": key[0], parent_field: key[1]}, {"comment_body": 1},
+            ).sort([("created_at", 1), ("_id", 1)])
+            comments = [c["comment_body"] for c in cursor]
+        return "\n".join(comments)
+
+    def _skip_reason(self, collection_item: Dict[str, Any], collection_src: str) -> Optional[str]:
+        """
+        "binary" for a file whose content is not indexed, known from its filename alone
+        (so before fetching it), None if the document text must be extracted.
+        """
+        if collection_src in ["files", "main_files", "last_release_files"] \
+                and detect_file_type(collection_item["filename"]) == "binary":
+            return "binary"
+        return None
+
+    def _write_skipped(self, collection_item: Dict[str, Any], collection_src: str, reason: str,
+                       writer: Optional[BulkWriter] = None) -> None:
+        """
+        Queues the metadata of a document that is not indexed (binary file or no text): no chunk,
+        only its source signature, so that find_changed_items leaves it out until it changes.
+        Chunks of a previous, indexed version of the document are deleted.
+
+        Args:
+            collection_item (Dict[str, Any]): Document information from the database.
+            collection_src (str): Source collection name.
+            reason (str): "binary" or "empty".
+            writer (BulkWriter, optional): Write buffer, by default the generator's one.
+        """
+        writer = writer or self.writer
+        repo = collection_item["repo"]
+        collection_id = str(collection_item.get("_id"))
+        metadata_id = self._compute_metadata_id(repo, collection_src, collection_id)
+
+        existing_metadata = self.db_manager.db.metadata.find_one({"_id": metadata_id}, {"chunk_ids": 1})
+        removed_chunk_ids = existing_metadata.get("chunk_ids", []) if existing_metadata else []
+        if removed_chunk_ids:
+            writer.add("chunks", DeleteMany({"metadata_id": metadata_id}))
+            self._record_chunk_changes(repo, collection_src, metadata_id, added=[], removed=removed_chunk_ids,
+                                       writer=writer)
+
+        updated_at = datetime.datetime.now(datetime.timezone.utc)
+        writer.add("metadata", UpdateOne({"_id": metadata_id}, {
+            "$set": {
+                "repo": repo,
+                "collection_src": collection_src,
+                "collection_id": collection_id,
+                "chunk_ids": [],
+                "updated_at": updated_at,
+                "metadata_version": METADATA_VERSION,
+                "source_signature": source_signature(collection_item, collection_src),
+                "skipped": reason,
+            },
+            # Indexed again as soon as it has text, even if it is the text it had before
+            "$unset": {"file_hash": ""},
+            "$setOnInsert": {"created_at": updated_at},
+        }, upsert=True))
+        print(f"⏩ Skipping {metadata_id} ({reason}), source signature recorded")
 
     def _compute_metadata_id(self, repo: str, collection_src: str, collection_id: str) -> str:
         """
@@ -135,9 +341,8 @@ class MetadataGenerator:
         issue_title = collection_item.get("title", "").strip()
         issue_body = collection_item.get("body", "").strip()
         
-        # Fetch comments if available
-        comments = self.db_manager.db.issues_comments.find({"issue_id": collection_item["_id"]})
-        comments_text = "\n".join([c["comment_body"] for c in comments])
+        # Comments, prefetched for the whole page when possible
+        comments_text = self._comments_text(collection_item, "issues")
         return f"{issue_title}\n\n{issue_body}\n\nComments:\n{comments_text}".strip()
 
     def _extract_text_from_pull_requests(self, collection_item: Dict) -> str:
@@ -154,9 +359,8 @@ class MetadataGenerator:
         pr_body_url = collection_item.get("body_url")
         pr_body = self.file_storage.fetch_file_content(pr_body_url) if pr_body_url else collection_item.get("body", "").strip()
 
-        # Fetch comments if available
-        comments = self.db_manager.db.pull_requests_comments.find({"pr_id": collection_item["_id"]})
-        comments_text = "\n".join([c["comment_body"] for c in comments])
+        # Comments, prefetched for the whole page when possible
+        comments_text = self._comments_text(collection_item, "pull_requests")
 
         return f"{pr_title}\n\n{pr_body}\n\nComments:\n{comments_text}".strip()
 
@@ -166,78 +370,121 @@ class MetadataGenerator:
         Handles both new metadata creation and update of existing metadata.
         Also updates the metadata_id field in related collections.
 
+        The work is split in the steps run by the stages of MetadataPipeline:
+        `_plan_metadata`, `split_document`, embedding, `_write_metadata`.
+
         Args:
             collection_item (Dict[str, Any]): Document information from the database.
             collection_src (str): Source collection name.
             content (str): The text content extracted from the document.
         """
+        plan = self._plan_metadata(collection_item, collection_src, content)
+        if plan is None:
+            # No update
+            return
+        chunks, tags = split_document(plan["file_type"], plan["settings"], content, self.keyword_extractor)
+        # Embed every chunk of the document in one model batch
+        vectors = self.embedding_model.encode_batch(chunks)
+        self._write_metadata(plan, content, chunks, tags, vectors)
+
+    def _plan_metadata(self, collection_item: Dict[str, Any], collection_src: str,
+                       content: str) -> Optional[Dict[str, Any]]:
+        """
+        Decides whether a document needs new metadata and gathers what the next steps need.
+        Update is needed if there is no metadata yet, if the file_hash differs or if
+        metadata_version is outdated.
 
+        Args:
+            collection_item (Dict[str, Any]): Document information from the database.
+            collection_src (str): Source collection name.
+            content (str): The text content extracted from the document.
+
+        Returns:
+            Optional[Dict[str, Any]]: Plan {collection_item, collection_src, metadata_id, collection_id,
+                file_hash, source_signature, existing_metadata, metadata_version, file_type, language,
+                settings}, None if the document is skipped (empty or unchanged).
+        """
         if not content:
-            return
-        
+            return None
+
         collection_id = str(collection_item.get("_id"))
         metadata_id = self._compute_metadata_id(collection_item["repo"], collection_src, collection_id)
         file_hash =  compute_file_hash_md5(content)
+        signature = source_signature(collection_item, collection_src)
 
         # Check if metadata already exists
         existing_metadata = self.db_manager.db.metadata.find_one({"_id": metadata_id})
-        current_metadata_version = 0  # Define current metadata version
+        current_metadata_version = METADATA_VERSION
+
+        if existing_metadata is not None:
+            previous_metadata_version = existing_metadata.get("metadata_version", 1)
+            if (existing_metadata.get("file_hash") == file_hash and previous_metadata_version == current_metadata_version):
+                if signature is not None and existing_metadata.get("source_signature") != signature:
+                    # Same text under a new signature (or metadata written before signatures):
+                    # record it so that the next runs skip the document before extraction.
+                    self.writer.add("metadata", UpdateOne({"_id": metadata_id},
+                                                          {"$set": {"source_signature": signature}}))
+                print(f"⏩ Skipping {metadata_id} (hash and metadata version unchanged)")
+                return None
+            collection_src = existing_metadata.get("collection_src")
+            collection_id = existing_metadata.get("collection_id")
 
-        if existing_metadata is None:
-            # New metadata document to be created.
-            metadata_obj = self._create_metadata(collection_item, metadata_id, collection_src, collection_id, file_hash, content, current_metadata_version)
-        else:
-            # Update is needed if the file_hash differs or if metadata_version is outdated.
-            metadata_obj = self._update_existing_metadata(existing_metadata, collection_item, file_hash, content, current_metadata_version)
-
-        if metadata_obj is None:
-            # No update
-            return
-        
-        # Log metadata details before update to help trace potential size issues.
-        num_chunks = len(metadata_obj.get("chunk_ids", []))
-        content_length = len(content)
-        print(f"[DEBUG] Updating metadata with id: {metadata_id}")
-        print(f"[DEBUG] Repo: {collection_item['repo']}, Collection: {collection_src}, Document _id: {collection_id}")
-        print(f"[DEBUG] File hash: {file_hash}, Content length: {content_length}, Number of chunks: {num_chunks}")
-
-        # Update or insert the metadata document.
-        self.db_manager.db.metadata.update_one({"_id": metadata_id}, {"$set": metadata_obj}, upsert=True)
-        print(f"✅ Metadata {metadata_id} updated")
-
-        # Update the source document with the metadata_id.
-        self.db_manager.db[collection_src].update_one({"_id": collection_item["_id"]}, {"$set": {"metadata_id": metadata_id}})
-        print(f"✅ collection {collection_src} with id {collection_id} is linked to metadata_id {metadata_id}")
-
-    def _create_metadata(self, collection_item, metadata_id, collection_src, collection_id, file_hash, content, current_metadata_version):
-        
-        created_at = datetime.datetime.now(datetime.timezone.utc)
         has_filename = collection_src in ["files", "main_files", "last_release_files"]
-        is_binary = False
         ext = "txt"
         file_type="doc"
         if has_filename:
+            # Binary files never get here, see _skip_reason
             file_type = detect_file_type(collection_item["filename"])
-            is_binary = file_type == "binary"
             ext = collection_item["filename"].split(".")[-1].lower()
-        
-        if is_binary:
-            # TODO Currently the system doesn't handle binary files
-            return None
 
         language = self._detect_language(collection_item, has_filename, content)
-        settings = {
-            "extension": ext,
+        return {
+            "collection_item": collection_item,
+            "collection_src": collection_src,
+            "metadata_id": metadata_id,
+            "collection_id": collection_id,
+            "file_hash": file_hash,
+            "source_signature": signature,
+            "existing_metadata": existing_metadata,
+            "metadata_version": current_metadata_version,
+            "file_type": file_type,
             "language": language,
-            "min_chunk_size": 300,
-            "chunk_size": 1000,
-            "overlap": 200
+            "settings": {
+                "extension": ext,
+                "language": language,
+                "min_chunk_size": 300,
+                "chunk_size": 1000,
+                "overlap": 200
+            },
         }
-        strategy = ChunkingStrategyFactory.get_strategy(file_type, settings)
-        chunks_ids = self._create_chunks(metadata_id, strategy, content)
-        tags = self.keyword_extractor.extract(content)
+
+    def _write_metadata(self, plan: Dict[str, Any], content: str, chunks: List[str], tags: List[str],
+                        vectors: np.ndarray, writer: Optional[BulkWriter] = None) -> None:
+        """
+        Queues the chunk, metadata, source link and chunk_changes writes of a planned document.
+
+        Args:
+            plan (Dict[str, Any]): Output of `_plan_metadata`.
+            content (str): The text content extracted from the document.
+            chunks (List[str]): Chunk texts, see `split_document`.
+            tags (List[str]): Keywords of the content.
+            vectors (np.ndarray): Embedding of each chunk.
+            writer (BulkWriter, optional): Write buffer, by default the generator's one.
+        """
+        writer = writer or self.writer
+        collection_item = plan["collection_item"]
+        collection_src = plan["collection_src"]
+        metadata_id = plan["metadata_id"]
+        existing_metadata = plan["existing_metadata"]
+
+        chunk_ids = self._create_chunks(metadata_id, chunks, vectors, writer)
+        if existing_metadata is not None:
+            # Remove obsolete chunks. The new chunks are excluded rather than deleted first:
+            # the delete and their upserts may run in any order inside the unordered bulk write.
+            writer.add("chunks", DeleteMany({"metadata_id": metadata_id, "_id": {"$nin": chunk_ids}}))
+
         description = ""
-        if not is_binary and current_metadata_version != 0:
+        if plan["metadata_version"] != 0:
             # TODO not use description currently and try to accelerate process to create chunk and embeddings
             # TODO think how description can be use to improve the RAG system
             # that mean the content contains something that can be understood by the model
@@ -246,23 +493,67 @@ class MetadataGenerator:
         # Store the content of chunk in local_storage and get url to this content
         external_url = self.file_storage.store_file_content(content=content, repo=collection_item["repo"], reference_id="meta", filename=metadata_id)
 
+        created_at = datetime.datetime.now(datetime.timezone.utc)
         metadata_obj = {
                 "_id": metadata_id,
                 "repo": collection_item["repo"],
                 "collection_src": collection_src,
-                "collection_id": collection_id,
-                "language": language,
+                "collection_id": plan["collection_id"],
+                "language": plan["language"],
                 "description": description,
                 "tags": tags,
-                "chunk_ids": chunks_ids,
+                "chunk_ids": chunk_ids,
                 "created_at": created_at,
                 "updated_at": created_at,
                 "source_url": external_url,
-                "metadata_version": current_metadata_version,
-                "file_hash": file_hash
+                "metadata_version": plan["metadata_version"],
+                "file_hash": plan["file_hash"],
+                "source_signature": plan["source_signature"]
             }
-        
-        return metadata_obj
+
+        # Log metadata details before update to help trace potential size issues.
+        print(f"[DEBUG] Updating metadata with id: {metadata_id}")
+        print(f"[DEBUG] Repo: {collection_item['repo']}, Collection: {collection_src}, Document _id: {plan['collection_id']}")
+        print(f"[DEBUG] File hash: {plan['file_hash']}, Content length: {len(content)}, Number of chunks: {len(chunk_ids)}")
+
+        # Log which chunks changed so that Faiss indexes can be updated incrementally.
+        removed_chunk_ids = existing_metadata.get("chunk_ids", []) if existing_metadata else []
+        self._record_chunk_changes(collection_item["repo"], collection_src, metadata_id,
+                                   added=chunk_ids, removed=removed_chunk_ids, writer=writer)
+
+        # Update the source document with the metadata_id.
+        writer.add(collection_src, UpdateOne({"_id": collection_item["_id"]}, {"$set": {"metadata_id": metadata_id}}))
+        print(f"✅ collection {collection_src} with id {plan['collection_id']} queued to link to metadata_id {metadata_id}")
+
+        # Update or insert the metadata document, queued and flushed last (see FLUSH_ORDER).
+        writer.add("metadata", UpdateOne({"_id": metadata_id}, {"$set": metadata_obj, "$unset": {"skipped": ""}},
+                                         upsert=True))
+        print(f"✅ Metadata {metadata_id} queued for update")
+
+    def _record_chunk_changes(self, repo: str, collection_src: str, metadata_id: str,
+                              added: List[str], removed: List[str],
+                              writer: Optional[BulkWriter] = None) -> None:
+        """
+        Appends an entry to the `chunk_changes` log, consumed by FaissIndexManager.apply_changes().
+
+        Args:
+            repo (str): Repository name.
+            collection_src (str): Source collection name.
+            metadata_id (str): Metadata whose chunks changed.
+            added (List[str]): Chunk ids created (or recreated) for this metadata.
+            removed (List[str]): Chunk ids deleted for this metadata.
+            writer (BulkWriter, optional): Write buffer, by default the generator's one.
+        """
+        if not added and not removed:
+            return
+        (writer or self.writer).add("chunk_changes", InsertOne({
+            "repo": repo,
+            "collection_src": collection_src,
+            "metadata_id": metadata_id,
+            "added": added,
+            "removed": removed,
+            "created_at": datetime.datetime.now(datetime.timezone.utc)
+        }))
 
     def _detect_language(self, collection_item, has_filename=False, content=None):
         language = "undefined"
@@ -277,31 +568,11 @@ class MetadataGenerator:
                 language = detect_natural_language(content)
         return language
 
-    def _update_existing_metadata(self, existing_metadata, collection_item, file_hash, content, current_metadata_version):
-        previous_metadata_version = existing_metadata.get("metadata_version", 1)
-        if (existing_metadata.get("file_hash") != file_hash or previous_metadata_version != current_metadata_version):
-            # Remove obsolete chunks
-            self.db_manager.db.chunks.delete_many({"metadata_id": existing_metadata.get("_id")})
-
-            return self._create_metadata(collection_item=collection_item,
-                                        metadata_id=existing_metadata.get("_id"),
-                                        collection_src=existing_metadata.get("collection_src"),
-                                        collection_id=existing_metadata.get("collection_id"),
-                                        file_hash=file_hash,
-                                        content=content,
-                                        current_metadata_version=current_metadata_version)
-        else:
-            metadata_id = existing_metadata.get("_id")
-            print(f"⏩ Skipping {metadata_id} (hash and metadata version unchanged)")
-            return None
-
-    def _create_chunks(self, metadata_id : str,
-                       strategy: AbstractChunkingStrategy,
-                       content: str):
-        chunks = strategy.chunk(content)
+    def _create_chunks(self, metadata_id: str, chunks: List[str], vectors: np.ndarray,
+                       writer: BulkWriter) -> List[str]:
         chunk_ids = []
         for i, chunk_text in enumerate(chunks):
-            vector = self.embedding_model.encode(chunk_text)
+            vector = vectors[i].tolist()
             chunk_id = f"{metadata_id}_chunk_{i}"  # Format: meta_id_chunk_index
             chunk_doc = {
                 "_id": chunk_id,
@@ -310,6 +581,55 @@ class MetadataGenerator:
                 "chunk_src": chunk_text,
                 "embedding": vector
             }
-            self.db_manager.db.chunks.update_one({"_id": chunk_id}, {"$set": chunk_doc}, upsert=True)
+            writer.add("chunks", UpdateOne({"_id": chunk_id}, {"$set": chunk_doc}, upsert=True))
             chunk_ids.append(chunk_id)
         return chunk_ids
+
+
+def source_signature(collection_item: Dict[str, Any], collection_src: str) -> Optional[str]:
+    """
+    Cheap change signal of a source document (see SIGNATURE_FIELDS), as a string,
+    None if the collection or the document has none.
+    """
+    field = SIGNATURE_FIELDS.get(collection_src)
+    value = collection_item.get(field) if field else None
+    return None if value is None else str(value)
+
+
+def iter_pages(items: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Groups source documents into pages of `size` documents.
+    """
+    iterator = iter(items)
+    while page := list(itertools.islice(iterator, size)):
+        yield page
+
+
+def _comment_parent_key(collection_item: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    (repo, number) under which the collectors store the comments of an issue or pull request,
+    the number being taken from the `{repo}_{number}` _id of documents without a `number` field.
+    """
+    number = collection_item.get("number")
+    if number is None:
+        number = str(collection_item["_id"]).rsplit("_", 1)[-1]
+    return collection_item["repo"], str(number)
+
+
+def split_document(file_type: str, settings: Dict[str, Any], content: str,
+                   keyword_extractor: AbstractKeywordExtractor) -> Tuple[List[str], List[str]]:
+    """
+    Chunks a document and extracts its keywords: the CPU-bound, model-free part of
+    metadata generation, run in worker processes by MetadataPipeline.
+
+    Args:
+        file_type (str): "code", "doc", ... (see detect_file_type).
+        settings (Dict[str, Any]): Chunking settings (extension, language, sizes).
+        content (str): The text content extracted from the document.
+        keyword_extractor (AbstractKeywordExtractor): Keyword extractor.
+
+    Returns:
+        Tuple[List[str], List[str]]: (chunk texts, keywords)
+    """
+    strategy: AbstractChunkingStrategy = ChunkingStrategyFactory.get_strategy(file_type, settings)
+    return strategy.chunk(content), keyword_extractor.extract(content)
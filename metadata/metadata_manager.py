@@ -3,12 +3,15 @@ metadata_manager.py
 Handles the orchestration of metadata extraction, generation, and storage.
 """
 
-from typing import List, Dict
+import os
+from typing import List, Dict, Optional
 from core.database_manager import DatabaseManager
 from core.file_storage_manager import FileStorageManager
+from metadata.bulk_writer import DEFAULT_FLUSH_INTERVAL, DEFAULT_FLUSH_SIZE
 from metadata.metadata_generator import MetadataGenerator
-from embeddings.embeddings import SentenceTransformerEmbeddingModel
-from summarizers.summarizers import T5Summarizer
+from metadata.metadata_pipeline import MetadataPipeline, DEFAULT_EXTRACT_WORKERS
+from embeddings.embedding_cache import CachedEmbeddingModel, DEFAULT_MAX_ENTRIES
+from embeddings.model_registry import get_embedding_model, get_embedding_pool
 from keywords_extractors.keywords_extractors import YakeKeywordExtractor
 
 class MetadataManager:
@@ -20,15 +23,55 @@ class MetadataManager:
         """
         Initializes MetadataManager with database and file storage access.
 
+        The embedding model is the process-wide instance of the model registry
+        (see embeddings/model_registry.py), or a pool of EMBEDDING_WORKERS processes
+        when it is set above 1; the summarizer is only loaded if used.
+        Chunk embeddings go through a persistent cache keyed by (model, text hash),
+        stored in EMBEDDING_CACHE_PATH (default: embedding_cache.sqlite in the file storage)
+        and bounded by EMBEDDING_CACHE_MAX_ENTRIES. Set EMBEDDING_CACHE_PATH to an
+        empty value to disable it.
+        Chunk, metadata and link writes are sent as unordered bulk writes of
+        METADATA_FLUSH_SIZE operations, or every METADATA_FLUSH_INTERVAL seconds.
+        With METADATA_PIPELINE=1, collections go through MetadataPipeline: extraction,
+        chunking, embedding and writes run as concurrent stages, sized by
+        METADATA_EXTRACT_WORKERS, METADATA_SPLIT_WORKERS, METADATA_EMBED_WORKERS
+        and METADATA_WRITE_WORKERS.
+
         Args:
             db_manager (DatabaseManager): Handles MongoDB interactions.
             file_storage (FileStorageManager): Manages file retrieval/storage.
         """
         self.db_manager = db_manager
-        embedding_model = SentenceTransformerEmbeddingModel()
-        summarizer = T5Summarizer()
+        workers = os.getenv("EMBEDDING_WORKERS", "")
+        if workers.isdigit() and int(workers) > 1:
+            embedding_model = get_embedding_pool(int(workers))
+        else:
+            embedding_model = get_embedding_model()
+        cache_path = os.getenv("EMBEDDING_CACHE_PATH",
+                               os.path.join(file_storage.base_storage_path, "embedding_cache.sqlite"))
+        if cache_path:
+            max_entries = os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "")
+            embedding_model = CachedEmbeddingModel(
+                embedding_model, cache_path,
+                max_entries=int(max_entries) if max_entries.isdigit() else DEFAULT_MAX_ENTRIES,
+            )
+        self.embedding_model = embedding_model
         keywords_extractor = YakeKeywordExtractor()
-        self.metadata_generator = MetadataGenerator(db_manager, file_storage, embedding_model, summarizer, keywords_extractor)
+        flush_interval = os.getenv("METADATA_FLUSH_INTERVAL", "")
+        self.metadata_generator = MetadataGenerator(
+            db_manager, file_storage, embedding_model, None, keywords_extractor,
+            flush_size=_env_int("METADATA_FLUSH_SIZE", DEFAULT_FLUSH_SIZE),
+            flush_interval=float(flush_interval) if flush_interval else DEFAULT_FLUSH_INTERVAL,
+        )
+        self.metadata_pipeline = None
+        if os.getenv("METADATA_PIPELINE", "") == "1":
+            self.metadata_pipeline = MetadataPipeline(
+                self.metadata_generator,
+                extract_workers=_env_int("METADATA_EXTRACT_WORKERS", DEFAULT_EXTRACT_WORKERS),
+                split_workers=_env_int("METADATA_SPLIT_WORKERS", None),
+                embed_workers=_env_int("METADATA_EMBED_WORKERS", 1),
+                write_workers=_env_int("METADATA_WRITE_WORKERS", 1),
+            )
 
     def update_metadata_multiple_repos_specific_data(self, repos: List[str], selected_data: List[str]):
         """
@@ -54,9 +97,22 @@ class MetadataManager:
         for entry in selected_data:
             collection_name = entry["collection_src"]
             print(f"🔄 Updating metadata for '{repo}', collection '{collection_name}'...")
-            self.metadata_generator.update_metadata_for_collection(
-                repo,
-                self.db_manager.db[collection_name],
-                collection_name
-            )
+            if self.metadata_pipeline is not None:
+                self.metadata_pipeline.run(repo, self.db_manager.db[collection_name], collection_name)
+            else:
+                self.metadata_generator.update_metadata_for_collection(
+                    repo,
+                    self.db_manager.db[collection_name],
+                    collection_name
+                )
             print(f"✅ Metadata update completed for {collection_name} in {repo}.")
+        if self.metadata_pipeline is None:
+            print(f"[BulkWriter] {self.metadata_generator.writer.stats()}")
+        if isinstance(self.embedding_model, CachedEmbeddingModel):
+            print(f"[EmbeddingCache] {self.embedding_model.stats()}")
+
+
+def _env_int(name: str, default: Optional[int]) -> Optional[int]:
+    """Integer value of an environment variable, `default` if unset or not a number."""
+    value = os.getenv(name, "")
+    return int(value) if value.isdigit() else default
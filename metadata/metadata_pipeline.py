@@ -0,0 +1,491 @@
+"""
+metadata_pipeline.py
+Pipelined metadata generation: stages connected by bounded queues.
+
+MetadataGenerator.update_metadata_for_collection handles one document at a
+time: network I/O, CPU-bound chunking and embedding, and Mongo writes never
+overlap. MetadataPipeline runs the same steps as concurrent stages:
+
+    cursor -> extract -> split -> embed -> write
+              threads    processes batches  threads (one BulkWriter each)
+
+- extract : text extraction (HTTP, comments prefetched per page of source
+            documents) and the skip/update decision (`_plan_metadata`), in a thread pool.
+            Binary files and documents without text go straight to the write stage.
+- split   : chunking and keyword extraction (`split_document`), in a process pool.
+- embed   : chunks of several documents embedded in one `encode_batch` call,
+            large enough to keep an embedding process pool busy.
+- write   : chunk, metadata and link writes through a BulkWriter.
+
+Each queue holds at most `queue_size` documents, so a slow stage blocks the
+upstream ones instead of buffering the whole collection in memory. Queue
+depths are sampled while running and printed every `report_interval`
+seconds: the bottleneck is the stage whose input queue stays full while its
+output queue stays empty.
+
+Example:
+
+    pipeline = MetadataPipeline(generator, extract_workers=16, split_workers=4)
+    pipeline.run(repo, db_manager.db.files, "files")
+    print(pipeline.stats())
+"""
+
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from pymongo.collection import Collection
+
+from keywords_extractors.keywords_extractors import AbstractKeywordExtractor
+from metadata.bulk_writer import BulkWriter
+from metadata.metadata_generator import DEFAULT_PAGE_SIZE, MetadataGenerator, iter_pages, split_document
+from metadata.metadata_runs import MetadataRun
+
+DEFAULT_EXTRACT_WORKERS = 8  # I/O-bound: well above the number of cores
+DEFAULT_EMBED_BATCH_SIZE = 256  # Chunks per encode_batch call
+DEFAULT_QUEUE_SIZE = 64  # Documents per queue
+DEFAULT_REPORT_INTERVAL = 30.0  # Seconds between two queue reports
+DEFAULT_CHECKPOINT_EVERY = 5000  # Scanned source documents between two run checkpoints
+
+_DONE = object()  # End-of-stream marker, one per worker of the next stage
+
+_worker_keyword_extractor: Optional[AbstractKeywordExtractor] = None  # Extractor of the split worker process
+
+
+class StageStats:
+    """Counters of one stage: documents in/out, errors, busy time and input queue depths."""
+
+    def __init__(self, name: str, workers: int, capacity: int):
+        self.name = name
+        self.workers = workers
+        self.capacity = capacity
+        self.items = 0
+        self.outputs = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.queue_samples = 0
+        self.queue_total = 0
+        self.queue_max = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, outputs: int = 0, items: int = 1, error: bool = False) -> None:
+        """Account `items` documents processed in `seconds`, producing `outputs` documents."""
+        with self._lock:
+            self.items += items
+            self.outputs += outputs
+            self.errors += int(error)
+            self.busy_seconds += seconds
+
+    def sample(self, depth: int) -> None:
+        """Record the current depth of the stage input queue."""
+        self.queue_samples += 1
+        self.queue_total += depth
+        self.queue_max = max(self.queue_max, depth)
+
+    def as_dict(self, elapsed: float) -> Dict[str, Any]:
+        """
+        Counters, utilization (busy time / (workers x elapsed)) and input queue depths.
+        """
+        return {
+            "workers": self.workers,
+            "items": self.items,
+            "outputs": self.outputs,
+            "errors": self.errors,
+            "busy_seconds": round(self.busy_seconds, 2),
+            "utilization": round(self.busy_seconds / (self.workers * elapsed), 3) if elapsed else 0.0,
+            "queue_mean": round(self.queue_total / self.queue_samples, 1) if self.queue_samples else 0.0,
+            "queue_max": self.queue_max,
+            "queue_capacity": self.capacity,
+        }
+
+
+class MetadataPipeline:
+    """Runs MetadataGenerator steps as concurrent stages connected by bounded queues."""
+
+    def __init__(
+        self,
+        generator: MetadataGenerator,
+        extract_workers: int = DEFAULT_EXTRACT_WORKERS,
+        split_workers: Optional[int] = None,
+        embed_workers: int = 1,
+        write_workers: int = 1,
+        embed_batch_size: int = DEFAULT_EMBED_BATCH_SIZE,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        report_interval: float = DEFAULT_REPORT_INTERVAL,
+        checkpoint_every: int = DEFAULT_CHECKPOINT_EVERY,
+    ):
+        """
+        Args:
+            generator (MetadataGenerator): Provides text extraction, the embedding model,
+                the keyword extractor and the write settings.
+            extract_workers (int): Text extraction threads.
+            split_workers (int, optional): Chunking/keyword processes, by default the number
+                of cores. 0 runs them in a thread of the current process.
+            embed_workers (int): Threads calling the embedding model (more than 1 only helps
+                if the model releases the GIL or is a process pool).
+            write_workers (int): Writer threads, each with its own BulkWriter.
+            embed_batch_size (int): Chunks gathered, across documents, per encode_batch call.
+            queue_size (int): Capacity of each queue, in documents.
+            report_interval (float): Seconds between two queue-depth reports (0 = no report).
+            checkpoint_every (int): Scanned source documents between two checkpoints of a run:
+                the stages are drained at each checkpoint.
+        """
+        self.generator = generator
+        self.extract_workers = max(extract_workers, 1)
+        self.split_workers = (os.cpu_count() or 1) if split_workers is None else split_workers
+        self.embed_workers = max(embed_workers, 1)
+        self.write_workers = max(write_workers, 1)
+        self.embed_batch_size = embed_batch_size
+        self.queue_size = queue_size
+        self.report_interval = report_interval
+        self.checkpoint_every = checkpoint_every
+        self._stage_workers: Dict[str, int] = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._t0 = 0.0
+        self._stages: Dict[str, StageStats] = {}
+        self._queues: Dict[str, queue.Queue] = {}
+        self._writers: List[BulkWriter] = []
+        self._writers_lock = threading.Lock()
+        self._local = threading.local()  # BulkWriter of the current writer thread
+        self._elapsed = 0.0
+
+    def run(self, repo: str, db_collection: Collection, collection_src: str, resume: bool = True) -> Dict[str, Any]:
+        """
+        Updates metadata for all documents of `repo` in a collection, like
+        MetadataGenerator.update_metadata_for_collection (only new or changed documents, see
+        find_changed_items, in checkpointed `_id` pages, see MetadataRun), with the stages
+        running concurrently.
+
+        The stages are drained and the writes flushed every `checkpoint_every` scanned source
+        documents, then the run is checkpointed. A document dropped after an error is counted
+        in the run counters; it has no metadata yet, so the next run selects it again. A failed
+        bulk write fails the run before the segment is checkpointed.
+
+        Args:
+            repo (str): The repository name to filter on.
+            db_collection (Collection): Source collection (files, commits, issues, ...).
+            collection_src (str): The name of the collection source.
+            resume (bool): Resume the last unfinished run of the collection, if any.
+
+        Returns:
+            Dict[str, Any]: Per-stage metrics, see `stats`.
+        """
+        run = MetadataRun.start(self.generator.db_manager.db, repo, collection_src, resume=resume)
+        pages = run.pages(db_collection, DEFAULT_PAGE_SIZE)
+        self._begin()
+        try:
+            while True:
+                progress = {"pages": 0, "scanned": 0, "changed": 0}
+                last_ids = []
+
+                def segment():
+                    """Changed documents of the next pages, up to `checkpoint_every` scanned documents."""
+                    for page_ids in pages:
+                        items = list(self.generator.find_changed_items(repo, db_collection, collection_src,
+                                                                       ids=page_ids))
+                        progress["pages"] += 1
+                        progress["scanned"] += len(page_ids)
+                        progress["changed"] += len(items)
+                        last_ids.append(page_ids[-1])
+                        yield from items
+                        if progress["scanned"] >= self.checkpoint_every:
+                            return
+
+                errors = self._errors()
+                self._run_segment(segment(), collection_src, heartbeat=run.heartbeat)
+                if not last_ids:
+                    break
+                run.checkpoint(last_ids[-1], errors=self._errors() - errors, **progress)
+            run.complete()
+        except BaseException as e:
+            run.fail(e)
+            raise
+        finally:
+            self._end()
+        stats = self.stats()
+        print(f"[MetadataPipeline] {collection_src} done in {self._elapsed:.1f}s: {stats}")
+        return stats
+
+    def run_items(self, collection_items: Iterable[Dict[str, Any]], collection_src: str) -> Dict[str, Any]:
+        """
+        Processes the given source documents of `collection_src` through the stages, without checkpoints.
+
+        Returns:
+            Dict[str, Any]: Per-stage metrics, see `stats`.
+        """
+        self._begin()
+        try:
+            self._run_segment(collection_items, collection_src)
+        finally:
+            self._end()
+        stats = self.stats()
+        print(f"[MetadataPipeline] {collection_src} done in {self._elapsed:.1f}s: {stats}")
+        return stats
+
+    def _begin(self) -> None:
+        """Resets the metrics and starts the split process pool."""
+        self._stage_workers = {"extract": self.extract_workers, "split": max(self.split_workers, 1),
+                               "embed": self.embed_workers, "write": self.write_workers}
+        self._stages = {name: StageStats(name, workers, self.queue_size)
+                        for name, workers in self._stage_workers.items()}
+        self._writers = []
+        self._executor = None
+        if self.split_workers > 0:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.split_workers,
+                mp_context=mp.get_context("spawn"),
+                initializer=_init_split_worker,
+                initargs=(self.generator.keyword_extractor,),
+            )
+        self._t0 = time.perf_counter()
+
+    def _end(self) -> None:
+        """Stops the split process pool."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self._elapsed = time.perf_counter() - self._t0
+
+    def _errors(self) -> int:
+        """Documents dropped after an error so far, all stages together."""
+        return sum(stage.errors for stage in self._stages.values())
+
+    def _run_segment(self, collection_items: Iterable[Dict[str, Any]], collection_src: str,
+                     heartbeat: Optional[Callable[[], None]] = None) -> None:
+        """
+        Runs the stages over `collection_items` until every document is written and flushed,
+        calling `heartbeat` (if any) each time a document is queued.
+
+        Raises:
+            RuntimeError: If a bulk write failed during the segment. A failed flush holds
+                the writes of many documents, not only the one being written when it raised,
+                so the segment must not be checkpointed.
+        """
+        failures = self._flush_failures()
+        self._queues = {name: queue.Queue(self.queue_size) for name in self._stage_workers}
+        extract = lambda item: self._extract(item, collection_src)
+        split = lambda job: self._split(job, self._executor)
+        groups = [
+            self._start("extract", extract, "split"),
+            self._start("split", split, "embed"),
+            self._start_embed(),
+            self._start("write", self._write, None),
+        ]
+        stop_monitor = threading.Event()
+        monitor = threading.Thread(target=self._monitor, args=(stop_monitor,), daemon=True)
+        monitor.start()
+        try:
+            for page in iter_pages(collection_items, DEFAULT_PAGE_SIZE):
+                if self._flush_failures() > failures:
+                    break  # The segment fails anyway, stop feeding it
+                self.generator.prefetch_comments(page, collection_src)
+                for collection_item in page:
+                    if heartbeat is not None:
+                        heartbeat()
+                    self._queues["extract"].put(collection_item)
+        finally:
+            # Each stage stops its workers once the upstream stage is done, in order
+            for (name, workers), threads in zip(self._stage_workers.items(), groups):
+                for _ in range(workers):
+                    self._queues[name].put(_DONE)
+                for thread in threads:
+                    thread.join()
+            try:
+                for writer in [*self._writers, self.generator.writer]:
+                    writer.flush()
+            finally:
+                stop_monitor.set()
+                monitor.join()
+        if self._flush_failures() > failures:
+            raise RuntimeError(f"{self._flush_failures() - failures} bulk write(s) failed during the segment, "
+                               f"its writes may be incomplete")
+
+    def _flush_failures(self) -> int:
+        """Failed bulk writes so far, all writers together."""
+        with self._writers_lock:
+            writers = [*self._writers, self.generator.writer]
+        return sum(writer.failures for writer in writers)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Metrics of the last run: per stage {workers, items, outputs, errors, busy_seconds,
+        utilization, queue_mean, queue_max, queue_capacity} and the writers' stats.
+        """
+        writes = [writer.stats() for writer in self._writers]
+        return {
+            "seconds": round(self._elapsed, 2),
+            "stages": {name: stage.as_dict(self._elapsed) for name, stage in self._stages.items()},
+            "writes": {
+                "operations": sum(w["operations"] for w in writes),
+                "batches": sum(w["batches"] for w in writes),
+                "seconds": round(sum(w["seconds"] for w in writes), 3),
+            },
+        }
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Current number of documents waiting in front of each stage."""
+        return {name: q.qsize() for name, q in self._queues.items()}
+
+    # ---------------------------------------------------------------------------
+    # Stages
+    # ---------------------------------------------------------------------------
+
+    def _extract(self, collection_item: Dict[str, Any], collection_src: str) -> List[Dict[str, Any]]:
+        """
+        Extracts the text and plans the metadata update (nothing if the document is unchanged).
+        A document without text to index is queued for the write stage directly, which only
+        records its signature (see MetadataGenerator._write_skipped).
+        """
+        skipped = self.generator._skip_reason(collection_item, collection_src)
+        text = "" if skipped else self.generator.extract_text_from_document(collection_item, collection_src)
+        if not text:
+            self._queues["write"].put({"skipped": skipped or "empty", "collection_item": collection_item,
+                                       "collection_src": collection_src})
+            return []
+        plan = self.generator._plan_metadata(collection_item, collection_src, text)
+        return [{"plan": plan, "content": text}] if plan else []
+
+    def _split(self, job: Dict[str, Any], executor: Optional[ProcessPoolExecutor]) -> List[Dict[str, Any]]:
+        """Chunks the document and extracts its keywords, in a worker process if there is a pool."""
+        plan = job["plan"]
+        if executor is None:
+            job["chunks"], job["tags"] = split_document(plan["file_type"], plan["settings"], job["content"],
+                                                        self.generator.keyword_extractor)
+        else:
+            job["chunks"], job["tags"] = executor.submit(
+                _split_in_worker, plan["file_type"], plan["settings"], job["content"]).result()
+        return [job]
+
+    def _embed(self, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Embeds the chunks of several documents in one model call, then splits the vectors back."""
+        texts = [chunk for job in jobs for chunk in job["chunks"]]
+        vectors = self.generator.embedding_model.encode_batch(texts, batch_size=self.embed_batch_size)
+        start = 0
+        for job in jobs:
+            job["vectors"] = vectors[start:start + len(job["chunks"])]
+            start += len(job["chunks"])
+        return jobs
+
+    def _write(self, job: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Queues the document writes in the BulkWriter of the current writer thread."""
+        writer = getattr(self._local, "writer", None)
+        if writer is None:
+            writer = BulkWriter(self.generator.db_manager.db, self.generator.writer.flush_size,
+                                self.generator.writer.flush_interval, self.generator.writer.flush_order)
+            self._local.writer = writer
+            with self._writers_lock:
+                self._writers.append(writer)
+        if "skipped" in job:
+            self.generator._write_skipped(job["collection_item"], job["collection_src"], job["skipped"],
+                                          writer=writer)
+        else:
+            self.generator._write_metadata(job["plan"], job["content"], job["chunks"], job["tags"],
+                                           job["vectors"], writer=writer)
+        return []
+
+    # ---------------------------------------------------------------------------
+    # Workers
+    # ---------------------------------------------------------------------------
+
+    def _start(self, name: str, fn: Callable[[Any], List[Any]], next_name: Optional[str]) -> List[threading.Thread]:
+        """Starts the worker threads of a one-document-at-a-time stage."""
+        threads = [threading.Thread(target=self._stage_loop, args=(name, fn, next_name),
+                                    name=f"metadata-{name}-{i}", daemon=True)
+                   for i in range(self._stages[name].workers)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def _stage_loop(self, name: str, fn: Callable[[Any], List[Any]], next_name: Optional[str]) -> None:
+        """Takes documents from the stage queue until the end marker; a failing document is logged and dropped."""
+        stats, in_q = self._stages[name], self._queues[name]
+        while (item := in_q.get()) is not _DONE:
+            t0 = time.perf_counter()
+            try:
+                outputs = fn(item)
+            except Exception as e:
+                print(f"[MetadataPipeline] ❌ {name} failed for {_describe(item)}: {e}")
+                stats.record(time.perf_counter() - t0, error=True)
+                continue
+            stats.record(time.perf_counter() - t0, outputs=len(outputs))
+            for output in outputs:
+                self._queues[next_name].put(output)
+
+    def _start_embed(self) -> List[threading.Thread]:
+        """Starts the embedding threads, which gather documents into batches of chunks."""
+        threads = [threading.Thread(target=self._embed_loop, name=f"metadata-embed-{i}", daemon=True)
+                   for i in range(self.embed_workers)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def _embed_loop(self) -> None:
+        """
+        Waits for one document, then takes every document already queued, up to
+        `embed_batch_size` chunks, and embeds them together.
+        """
+        stats, in_q = self._stages["embed"], self._queues["embed"]
+        done = False
+        while not done:
+            job = in_q.get()
+            if job is _DONE:
+                break
+            jobs, count = [job], len(job["chunks"])
+            while count < self.embed_batch_size:
+                try:
+                    job = in_q.get_nowait()
+                except queue.Empty:
+                    break
+                if job is _DONE:
+                    done = True
+                    break
+                jobs.append(job)
+                count += len(job["chunks"])
+
+            t0 = time.perf_counter()
+            try:
+                outputs = self._embed(jobs)
+            except Exception as e:
+                print(f"[MetadataPipeline] ❌ embed failed for {len(jobs)} documents: {e}")
+                stats.record(time.perf_counter() - t0, items=len(jobs), error=True)
+                continue
+            stats.record(time.perf_counter() - t0, outputs=len(outputs), items=len(jobs))
+            for output in outputs:
+                self._queues["write"].put(output)
+
+    def _monitor(self, stop: threading.Event) -> None:
+        """Samples queue depths every second and prints them every `report_interval` seconds."""
+        last_report = time.monotonic()
+        while not stop.wait(1.0):
+            depths = self.queue_depths()
+            for name, depth in depths.items():
+                self._stages[name].sample(depth)
+            if self.report_interval and time.monotonic() - last_report >= self.report_interval:
+                last_report = time.monotonic()
+                done = {name: stage.items for name, stage in self._stages.items()}
+                print(f"[MetadataPipeline] queues {depths} (capacity {self.queue_size}), processed {done}")
+
+
+def _describe(item: Any) -> str:
+    """Identifier of a queued document for error messages."""
+    if isinstance(item, dict) and "plan" in item:
+        return item["plan"]["metadata_id"]
+    if isinstance(item, dict) and "skipped" in item:
+        return str(item["collection_item"].get("_id"))
+    return str(item.get("_id")) if isinstance(item, dict) else repr(item)
+
+
+def _init_split_worker(keyword_extractor: AbstractKeywordExtractor) -> None:
+    """Initialization of a split worker: keeps its copy of the keyword extractor."""
+    global _worker_keyword_extractor
+    _worker_keyword_extractor = keyword_extractor
+
+
+def _split_in_worker(file_type: str, settings: Dict[str, Any], content: str):
+    """`split_document` in the current split worker."""
+    assert _worker_keyword_extractor is not None, "Worker not initialized"
+    return split_document(file_type, settings, content, _worker_keyword_extractor)
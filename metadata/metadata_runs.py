@@ -0,0 +1,266 @@
+"""
+metadata_runs.py
+Checkpointed, resumable metadata runs.
+
+A metadata run over a large <repo, collection_src> can last hours. With a
+single unbounded cursor, a crash or a cursor timeout meant starting the
+collection over. A run now pages the source collection by `_id` (short
+`find` queries sorted on `_id`, no server-side cursor kept open between
+pages) and records a checkpoint in the `metadata_runs` collection once the
+writes of each page are flushed:
+
+    {
+        "_id": run_id,
+        "repo": ..., "collection_src": ...,
+        "status": "running" | "completed" | "failed" | "abandoned",
+        "owner": "<host>:<pid>" of the process running it,
+        "last_id": last source _id whose page is fully processed,
+        "counters": {"pages": ..., "scanned": ..., "changed": ...},
+        "started_at", "updated_at", "finished_at", "resumes", "error"
+    }
+
+Starting a run on a <repo, collection_src> whose last run did not complete
+resumes it from `last_id`; documents of the interrupted page are processed
+again, which is harmless since their metadata writes are idempotent and
+documents already done are skipped by their source signature.
+
+A running run is leased to its owner: checkpoints and heartbeats renew
+`updated_at`, and another process only takes the run over once it has not
+been updated for `lease_seconds` (its owner died without marking it
+failed). The takeover is claimed with one atomic update on the status and
+`updated_at` read, and every later write of the run checks the owner, so
+two processes never page the same collection under the same run. Starting a
+run while another one is alive raises RuntimeError.
+
+Example:
+
+    run = MetadataRun.start(db_manager.db, repo, "files")
+    for page_ids in run.pages(db_manager.db.files, page_size=500):
+        ...  # process and flush the page
+        run.checkpoint(page_ids[-1], pages=1, scanned=len(page_ids))
+    run.complete()
+
+Long pages call `run.heartbeat()` between documents to keep the lease.
+"""
+
+import datetime
+import os
+import re
+import socket
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Optional
+
+from bson import Binary, Decimal128, Int64, ObjectId, Regex, Timestamp
+from pymongo import ReturnDocument
+from pymongo.collection import Collection
+from pymongo.database import Database
+from pymongo.errors import DuplicateKeyError
+
+RUNS_COLLECTION = "metadata_runs"
+DEFAULT_LEASE_SECONDS = 600  # A running run not updated for this long is taken over
+
+# BSON comparison order of the types an _id can have (arrays are not allowed).
+# A `$gt` query only matches values of the same type, so paging past the last
+# value of one type must also select every value of the types sorted after it.
+_BSON_TYPE_ORDER = ["number", "string", "object", "binData", "objectId", "bool", "date", "timestamp", "regex"]
+
+
+class MetadataRun:
+    """Progress of a metadata run over one <repo, collection_src>, persisted in `metadata_runs`."""
+
+    def __init__(self, db: Database, run_doc: Dict[str, Any], lease_seconds: float = DEFAULT_LEASE_SECONDS):
+        """
+        Args:
+            db (Database): MongoDB database holding the `metadata_runs` collection.
+            run_doc (Dict[str, Any]): Run document, see the module docstring.
+            lease_seconds (float): Lease of the owner on the run, renewed by its updates.
+        """
+        self.db = db
+        self.run_id = run_doc["_id"]
+        self.repo = run_doc["repo"]
+        self.collection_src = run_doc["collection_src"]
+        self.owner = run_doc["owner"]
+        self.last_id = run_doc.get("last_id")
+        self.counters: Dict[str, int] = dict(run_doc.get("counters", {}))
+        self.lease_seconds = lease_seconds
+        self._renewed = time.monotonic()
+
+    @classmethod
+    def start(cls, db: Database, repo: str, collection_src: str, resume: bool = True,
+              lease_seconds: float = DEFAULT_LEASE_SECONDS) -> "MetadataRun":
+        """
+        Resumes the last unfinished run of <repo, collection_src>, or starts a new one.
+
+        Args:
+            db (Database): MongoDB database.
+            repo (str): Repository name.
+            collection_src (str): Source collection name.
+            resume (bool): If False, unfinished runs are marked "abandoned" and a new
+                run starts from the beginning of the collection.
+            lease_seconds (float): Time after which a running run that is no longer
+                updated is considered dead and can be taken over.
+
+        Returns:
+            MetadataRun: The running run, owned by this process.
+
+        Raises:
+            RuntimeError: If a run of <repo, collection_src> is held by a live process.
+        """
+        runs = db[RUNS_COLLECTION]
+        now = datetime.datetime.now(datetime.timezone.utc)
+        owner = f"{socket.gethostname()}:{os.getpid()}"
+        scope = {"repo": repo, "collection_src": collection_src}
+        expired = now - datetime.timedelta(seconds=lease_seconds)
+
+        live = runs.find_one({**scope, "status": "running", "updated_at": {"$gte": expired}})
+        if live is not None:
+            raise RuntimeError(f"[MetadataRun] Run {live['_id']} on {repo}/{collection_src} is held by "
+                               f"{live.get('owner')} (last update {live['updated_at']}), its lease of "
+                               f"{lease_seconds}s has not expired")
+
+        # Failed runs, and running runs whose owner stopped renewing its lease
+        unfinished = {**scope, "$or": [{"status": "failed"},
+                                       {"status": "running", "updated_at": {"$lt": expired}}]}
+        if resume:
+            run_doc = runs.find_one(unfinished, sort=[("started_at", -1)])
+            if run_doc is not None:
+                claimed = runs.find_one_and_update(
+                    {"_id": run_doc["_id"], "status": run_doc["status"], "updated_at": run_doc["updated_at"]},
+                    {"$set": {"status": "running", "owner": owner, "updated_at": now}, "$inc": {"resumes": 1}},
+                    return_document=ReturnDocument.AFTER,
+                )
+                if claimed is None:
+                    raise RuntimeError(f"[MetadataRun] Run {run_doc['_id']} on {repo}/{collection_src} "
+                                       f"was claimed by another process meanwhile")
+                print(f"[MetadataRun] Resuming {run_doc['status']} run {run_doc['_id']} on {repo}/{collection_src} "
+                      f"after _id {run_doc.get('last_id')!r} ({run_doc.get('counters', {})})")
+                return cls(db, claimed, lease_seconds)
+        else:
+            runs.update_many(unfinished, {"$set": {"status": "abandoned", "updated_at": now}})
+
+        run_doc = {
+            "_id": uuid.uuid4().hex,
+            "repo": repo,
+            "collection_src": collection_src,
+            "status": "running",
+            "owner": owner,
+            "last_id": None,
+            "counters": {},
+            "started_at": now,
+            "updated_at": now,
+            "finished_at": None,
+            "resumes": 0,
+            "error": None,
+        }
+        try:
+            runs.insert_one(run_doc)
+        except DuplicateKeyError as e:  # Unique index on the running run of <repo, collection_src>
+            raise RuntimeError(f"[MetadataRun] Another process started a run on {repo}/{collection_src} "
+                               f"meanwhile") from e
+        print(f"[MetadataRun] Started run {run_doc['_id']} on {repo}/{collection_src}")
+        return cls(db, run_doc, lease_seconds)
+
+    def pages(self, db_collection: Collection, page_size: int) -> Iterator[List[Any]]:
+        """
+        Yields the `_id`s of the next source documents of the repo, `page_size` at a time in
+        `_id` order, starting after the checkpoint. Each page is a new short query; pages must
+        be checkpointed by the caller once processed.
+        """
+        last_id = self.last_id
+        while True:
+            query = {"repo": self.repo, **id_after(last_id)}
+            ids = [doc["_id"] for doc in db_collection.find(query, {"_id": 1}).sort("_id", 1).limit(page_size)]
+            if not ids:
+                return
+            yield ids
+            last_id = ids[-1]
+
+    def heartbeat(self) -> None:
+        """
+        Renews the lease of the run (at most every tenth of the lease, cheap to call
+        once per document) while a page or segment is being processed.
+
+        Raises:
+            RuntimeError: If the run was taken over by another process.
+        """
+        if time.monotonic() - self._renewed >= self.lease_seconds / 10:
+            self._update({"$set": {"updated_at": datetime.datetime.now(datetime.timezone.utc)}})
+
+    def checkpoint(self, last_id: Any, **counters: int) -> None:
+        """
+        Records that every source document up to `last_id` is processed and its writes flushed,
+        and adds `counters` (pages, scanned, changed, ...) to the run counters.
+
+        Raises:
+            RuntimeError: If the run was taken over by another process.
+        """
+        self._update({
+            "$set": {"last_id": last_id, "updated_at": datetime.datetime.now(datetime.timezone.utc)},
+            "$inc": {f"counters.{name}": value for name, value in counters.items()},
+        })
+        self.last_id = last_id
+        for name, value in counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def complete(self) -> None:
+        """Marks the run as completed: the next run starts from the beginning."""
+        self._finish("completed")
+        print(f"[MetadataRun] Run {self.run_id} on {self.repo}/{self.collection_src} completed: {self.counters}")
+
+    def fail(self, error: BaseException) -> None:
+        """Marks the run as failed: the next run resumes from the last checkpoint."""
+        try:
+            self._finish("failed", error=repr(error))
+        except RuntimeError as e:
+            print(e)  # Taken over: the new owner resumes it, `error` is still raised by the caller
+        print(f"[MetadataRun] Run {self.run_id} on {self.repo}/{self.collection_src} failed "
+              f"after _id {self.last_id!r}: {error!r}")
+
+    def _finish(self, status: str, error: Optional[str] = None) -> None:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        self._update({"$set": {"status": status, "updated_at": now, "finished_at": now, "error": error}})
+
+    def _update(self, update: Dict[str, Any]) -> None:
+        """Applies `update` to the run document if this process still owns the run."""
+        result = self.db[RUNS_COLLECTION].update_one(
+            {"_id": self.run_id, "status": "running", "owner": self.owner}, update)
+        if result.matched_count == 0:
+            raise RuntimeError(f"[MetadataRun] Run {self.run_id} on {self.repo}/{self.collection_src} "
+                               f"is no longer owned by {self.owner} (lease expired and taken over)")
+        self._renewed = time.monotonic()
+
+
+def id_after(last_id: Any) -> Dict[str, Any]:
+    """
+    Query selecting the `_id`s sorted after `last_id` in BSON order ({} for None = from the start).
+    """
+    if last_id is None:
+        return {}
+    later_types = _BSON_TYPE_ORDER[_BSON_TYPE_ORDER.index(_bson_type(last_id)) + 1:]
+    if not later_types:
+        return {"_id": {"$gt": last_id}}
+    return {"$or": [{"_id": {"$gt": last_id}}, *({"_id": {"$type": t}} for t in later_types)]}
+
+
+def _bson_type(value: Any) -> str:
+    """$type alias of the BSON type a Python `_id` value is stored as."""
+    if isinstance(value, bool):  # Before int: bool is an int subclass
+        return "bool"
+    if isinstance(value, (int, float, Int64, Decimal128)):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, dict):
+        return "object"
+    if isinstance(value, (bytes, Binary, uuid.UUID)):
+        return "binData"
+    if isinstance(value, ObjectId):
+        return "objectId"
+    if isinstance(value, datetime.datetime):
+        return "date"
+    if isinstance(value, Timestamp):
+        return "timestamp"
+    if isinstance(value, (Regex, re.Pattern)):
+        return "regex"
+    raise TypeError(f"Unsupported _id type for paging: {type(value).__name__}")
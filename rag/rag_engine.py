@@ -22,7 +22,7 @@ import time
 import numpy as np
 
 from core.faiss_index_manager import FaissIndexManager
-from embeddings.embeddings import SentenceTransformerEmbeddingModel
+from embeddings.embeddings import AbstractEmbeddingModel
 from LLMs.llm_interface import ILLM  # Unified interface (chat, summarise, etc.)
 from rag.query_recorder import RAGQueryRecorder
 
@@ -56,7 +56,7 @@ class RAGEngine:
     def __init__(
         self,
         index_mgr: FaissIndexManager,
-        embedding_model: SentenceTransformerEmbeddingModel,
+        embedding_model: AbstractEmbeddingModel,
         generative_llm: ILLM,
         *,
         repo: str,
@@ -105,12 +105,25 @@ class RAGEngine:
 
         return answer
 
+    def retrieve_many(self, questions: Sequence[str], *, top_k: int = 5) -> List[List[dict]]:
+        """
+        Return the top k chunk documents of each question, ranked.
+        All questions are embedded, searched and fetched in one batch, which is
+        much cheaper than calling the engine once per question (evaluation runs,
+        bulk FAQ generation, ...).
+        """
+        self.index_mgr.refresh_if_stale()
+        D, I, docs, meta_infos = self.index_mgr.query_many(questions, top_k=top_k)
+        return docs
+
     # ------------------------------------------------------------------
     # Internal helpers
     # ------------------------------------------------------------------
 
     def _ensure_index(self) -> None:
         """Load the Faiss index if it exists; otherwise build it on the fly."""
+        if self.index_mgr.loaded_key == (self.repo, self.collection_src):
+            return  # Already loaded (e.g. handed out by an IndexRegistry)
         try:
             self.index_mgr.load_index(self.repo, self.collection_src)
         except FileNotFoundError:
@@ -119,6 +132,8 @@ class RAGEngine:
 
     def _retrieve_chunks(self, question: str, *, top_k: int) -> List[dict]:
         """Return top k chunk documents for a user query."""
+        # Pick up an index rebuilt since the last query (swap is atomic, never blocks searches)
+        self.index_mgr.refresh_if_stale()
         D, I, docs, meta_infos = self.index_mgr.query(question, top_k=top_k)
         # metas already contains chunk docs in the same order as I.
         return docs
@@ -0,0 +1,162 @@
+"""
+benchmark_embeddings.py
+-----------------------
+Measure embedding throughput (texts/s) on CPU, in-process and with the
+multi-process pool (embeddings/process_pool.py) for several worker counts,
+to check that ingestion scales with the number of cores.
+
+The texts are chunk texts sampled from MongoDB (``--from-db``), or synthetic
+texts of realistic, varied lengths. Every configuration encodes the same
+texts; the first batch of each pool is a warm-up and is not timed.
+
+With ``--compare-bucketing`` the in-process model is also run with fixed-size
+batches in input order, to show the padding saved by length-bucketed batches
+under a token budget (embeddings/batching.py): the padding ratio and tokens/s
+are reported for the in-process runs.
+
+Usage examples
+~~~~~~~~~~~~~~
+$ python -m scripts.benchmark_embeddings --workers 1 2 4 8 16 32 --texts 8192
+
+$ python -m scripts.benchmark_embeddings --workers 4 8 --backend onnx-int8 --from-db
+
+$ python -m scripts.benchmark_embeddings --workers 4 --compare-bucketing --max-batch-tokens 8192
+
+Environment
+~~~~~~~~~~~
+- ``MONGO_URI``   : connection string (default: mongodb://localhost:27017), with ``--from-db``
+- ``DB_NAME``     : database name      (default: archethic_github_test_data), with ``--from-db``
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import time
+from typing import Any, Dict, List
+
+from dotenv import load_dotenv
+
+from embeddings.batching import DEFAULT_MAX_BATCH_TOKENS, BatchStats
+from embeddings.embeddings import AbstractEmbeddingModel
+from embeddings.model_registry import BACKENDS, get_embedding_model
+from embeddings.process_pool import ProcessPoolEmbeddingModel
+
+_WORDS = ("transaction chain node smart contract deploy validation beacon oracle "
+          "reward fee wallet key keychain genesis replication shard consensus proof "
+          "defmodule def end do fn when case cond with struct map list binary").split()
+
+# ---------------------------------------------------------------------------
+# Argument parsing
+# ---------------------------------------------------------------------------
+
+def _parse_args() -> argparse.Namespace:
+    """
+    Define and parse command-line arguments for the script.
+
+    Returns:
+        argparse.Namespace: Parsed arguments from sys.argv
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark CPU embedding throughput in-process and with a process pool.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Pool sizes to benchmark.")
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="Compute threads per worker (default: cores / workers).")
+    parser.add_argument("--backend", choices=BACKENDS, default="torch", help="Embedding backend.")
+    parser.add_argument("--texts", type=int, default=4096, help="Number of texts encoded per configuration.")
+    parser.add_argument("--batch-size", type=int, default=64, help="Model batch size inside each worker.")
+    parser.add_argument("--from-db", action="store_true", help="Sample chunk texts from MongoDB.")
+    parser.add_argument("--max-batch-tokens", type=int, default=DEFAULT_MAX_BATCH_TOKENS,
+                        help="Padded-token budget of the length-bucketed batches (in-process runs).")
+    parser.add_argument("--compare-bucketing", action="store_true",
+                        help="Also run in-process with fixed-size batches in input order.")
+    parser.add_argument("--skip-in-process", action="store_true", help="Do not run the in-process baseline.")
+    return parser.parse_args()
+
+# ---------------------------------------------------------------------------
+# Texts
+# ---------------------------------------------------------------------------
+
+def _synthetic_texts(count: int) -> List[str]:
+    """Texts of 20 to 400 words, roughly the spread of the chunk sizes."""
+    rng = random.Random(0)
+    return [" ".join(rng.choices(_WORDS, k=rng.randint(20, 400))) for _ in range(count)]
+
+
+def _db_texts(count: int) -> List[str]:
+    """Chunk texts sampled from the `chunks` collection."""
+    from core.database_manager import DatabaseManager
+
+    db = DatabaseManager(os.getenv("MONGO_URI", "mongodb://localhost:27017"),
+                         os.getenv("DB_NAME", "archethic_github_test_data"), create_indexes=False)
+    docs = db.db.chunks.aggregate([{"$sample": {"size": count}}, {"$project": {"chunk_src": 1}}])
+    texts = [doc["chunk_src"] for doc in docs if doc.get("chunk_src")]
+    db.close_connection()
+    return texts
+
+# ---------------------------------------------------------------------------
+# Main logic
+# ---------------------------------------------------------------------------
+
+def _measure(model: AbstractEmbeddingModel, texts: List[str], batch_size: int) -> float:
+    """Seconds spent encoding `texts`, after a warm-up batch."""
+    model.encode_batch(texts[:batch_size], batch_size)
+    t0 = time.perf_counter()
+    model.encode_batch(texts, batch_size)
+    return time.perf_counter() - t0
+
+
+def _in_process(model: AbstractEmbeddingModel, texts: List[str], batch_size: int,
+                max_batch_tokens: int | None) -> Dict[str, Any]:
+    """Time the in-process model with the given batching, and collect its batch stats."""
+    model.max_batch_tokens = max_batch_tokens  # type: ignore[attr-defined]
+    seconds = _measure(model, texts, batch_size)
+    model.batch_stats = BatchStats()  # type: ignore[attr-defined]
+    model.encode_batch(texts, batch_size)  # Same texts, stats without the warm-up batch
+    name = f"in-process, {max_batch_tokens} tok" if max_batch_tokens else f"in-process, {batch_size}/batch"
+    return {"name": name, "seconds": seconds, "batching": model.batch_stats.as_dict()}  # type: ignore[attr-defined]
+
+
+def _report(results: List[Dict[str, Any]], count: int) -> None:
+    """Print one line per configuration, with the speed-up over the first one."""
+    base = results[0]["seconds"]
+    print(f"\n{'configuration':<26} {'seconds':>9} {'texts/s':>10} {'speed-up':>9} {'padding':>8} {'tokens/s':>10}")
+    for r in results:
+        batching = r.get("batching")
+        padding = f"{batching['padding_ratio']:>8.1%} {batching['tokens_per_sec']:>10.0f}" if batching else ""
+        print(f"{r['name']:<26} {r['seconds']:>9.2f} {count / r['seconds']:>10.1f} "
+              f"{base / r['seconds']:>8.2f}x {padding}")
+
+
+def _main() -> None:
+    """
+    Entry point executed when the script is run directly from CLI.
+    """
+    args = _parse_args()
+    load_dotenv()
+    texts = _db_texts(args.texts) if args.from_db else _synthetic_texts(args.texts)
+    print(f"[Benchmark] {len(texts)} texts, backend={args.backend}, batch size {args.batch_size}.")
+
+    results = []
+    if not args.skip_in_process:
+        model = get_embedding_model(device="cpu", backend=args.backend)
+        if args.compare_bucketing:
+            results.append(_in_process(model, texts, args.batch_size, None))
+        results.append(_in_process(model, texts, args.batch_size, args.max_batch_tokens))
+    for workers in args.workers:
+        with ProcessPoolEmbeddingModel(backend=args.backend, workers=workers,
+                                       threads_per_worker=args.threads_per_worker) as pool:
+            # Each worker loads its model in the initializer: warm every one up before timing
+            pool.encode_batch(texts[:workers * pool.min_shard_size], args.batch_size)
+            results.append({"name": f"pool x{workers}", "seconds": _measure(pool, texts, args.batch_size)})
+    _report(results, len(texts))
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    _main()
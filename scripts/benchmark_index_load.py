@@ -0,0 +1,169 @@
+"""
+benchmark_index_load.py
+-----------------------
+Measure the cold-start cost of Faiss query workers: how long each worker
+takes to load an index and how much resident memory (RSS) it uses, with
+the regular in-RAM loading and with memory-mapped, read-only loading.
+
+Every worker is a fresh process (spawn) that loads the index, runs a few
+searches with random vectors so that the pages actually used are touched,
+then reports its timings and RSS. With ``--mmap`` the vectors live in the
+OS page cache and are shared by all the workers: they still show up in the
+RSS of each worker once touched, but not in its private memory.
+
+Usage examples
+~~~~~~~~~~~~~~
+$ python -m scripts.benchmark_index_load --repo archethic-foundation/archethic-node \
+                                         --collection commits --workers 4
+
+$ python -m scripts.benchmark_index_load --repo archethic-foundation/archethic-node \
+                                         --collection commits --workers 4 --compare
+
+Environment
+~~~~~~~~~~~
+- ``MONGO_URI``   : connection string (default: mongodb://localhost:27017)
+- ``DB_NAME``     : database name      (default: archethic_github_test_data)
+"""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing as mp
+import os
+import statistics
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+from dotenv import load_dotenv
+
+from core.database_manager import DatabaseManager
+from core.faiss_index_manager import FaissIndexManager
+from utils.perf_helpers import current_rss_bytes, private_rss_bytes, format_bytes
+
+# ---------------------------------------------------------------------------
+# Argument parsing
+# ---------------------------------------------------------------------------
+
+def _parse_args() -> argparse.Namespace:
+    """
+    Define and parse command-line arguments for the script.
+
+    Returns:
+        argparse.Namespace: Parsed arguments from sys.argv
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark cold-start time and RSS of Faiss query workers.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--repo", required=True, help="Full GitHub repository name.")
+    parser.add_argument("--collection", required=True, help="Index name, e.g. commits or global.")
+    parser.add_argument("--index-root", default="local_storage/indexes", help="Base directory of the indexes.")
+    parser.add_argument("--workers", type=int, default=4, help="Number of worker processes started together.")
+    parser.add_argument("--queries", type=int, default=100, help="Random searches run by each worker after loading.")
+    parser.add_argument("--top-k", type=int, default=5, help="Neighbours returned per search.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--mmap", action="store_true", help="Load the index memory-mapped and read-only.")
+    mode.add_argument("--compare", action="store_true", help="Run the benchmark in both modes.")
+    return parser.parse_args()
+
+# ---------------------------------------------------------------------------
+# Worker
+# ---------------------------------------------------------------------------
+
+def _worker(params: Dict[str, Any], results: mp.Queue) -> None:
+    """
+    Load the index in a fresh process, run random searches and report the measures.
+    """
+    rss_start = current_rss_bytes()
+    private_start = private_rss_bytes()
+    db = DatabaseManager(params["mongo_uri"], params["db_name"], create_indexes=False)
+    idx_mgr = FaissIndexManager(db, index_root=params["index_root"])
+
+    t0 = time.perf_counter()
+    idx_mgr.load_index(params["repo"], params["collection"], mmap=params["mmap"])
+    load_s = time.perf_counter() - t0
+    rss_loaded = current_rss_bytes()
+
+    rng = np.random.default_rng(os.getpid())
+    queries = rng.standard_normal((params["queries"], idx_mgr.index.d)).astype("float32")
+    t0 = time.perf_counter()
+    for i in range(len(queries)):
+        idx_mgr.index.search(queries[i:i + 1], params["top_k"])
+    search_s = time.perf_counter() - t0
+
+    results.put({
+        "pid": os.getpid(),
+        "load_s": load_s,
+        "search_ms": 1000 * search_s / max(len(queries), 1),
+        "rss_loaded": _delta(rss_loaded, rss_start),
+        "rss_searched": _delta(current_rss_bytes(), rss_start),
+        "private_searched": _delta(private_rss_bytes(), private_start),
+    })
+    db.close_connection()
+
+
+def _delta(rss: int | None, rss_start: int | None) -> int | None:
+    """RSS growth since the worker started, None if RSS is not available."""
+    return None if rss is None or rss_start is None else rss - rss_start
+
+# ---------------------------------------------------------------------------
+# Main logic
+# ---------------------------------------------------------------------------
+
+def _run(params: Dict[str, Any], workers: int) -> List[Dict[str, Any]]:
+    """Start every worker at once and collect their measures."""
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(params, results)) for _ in range(workers)]
+    for proc in procs:
+        proc.start()
+    measures = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    return measures
+
+
+def _report(mode: str, measures: List[Dict[str, Any]]) -> None:
+    """Print one line per worker and a summary line."""
+    print(f"\n=== {mode} ({len(measures)} workers) ===")
+    print(f"{'pid':>8} {'load':>10} {'search/q':>10} {'RSS loaded':>12} {'RSS searched':>13} {'private':>10}")
+    for m in measures:
+        print(f"{m['pid']:>8} {m['load_s'] * 1000:>8.1f}ms {m['search_ms']:>8.2f}ms "
+              f"{format_bytes(m['rss_loaded']):>12} {format_bytes(m['rss_searched']):>13} "
+              f"{format_bytes(m['private_searched']):>10}")
+    rss = [m["rss_searched"] for m in measures if m["rss_searched"] is not None]
+    private = [m["private_searched"] for m in measures if m["private_searched"] is not None]
+    print(f"mean load: {statistics.mean(m['load_s'] for m in measures) * 1000:.1f}ms | "
+          f"max load: {max(m['load_s'] for m in measures) * 1000:.1f}ms | "
+          f"mean RSS per worker: {format_bytes(statistics.mean(rss) if rss else None)} "
+          f"(private: {format_bytes(statistics.mean(private) if private else None)})")
+
+
+def _main() -> None:
+    """
+    Entry point executed when the script is run directly from CLI.
+    """
+    args = _parse_args()
+    load_dotenv()
+    params = {
+        "mongo_uri": os.getenv("MONGO_URI", "mongodb://localhost:27017"),
+        "db_name": os.getenv("DB_NAME", "archethic_github_test_data"),
+        "index_root": args.index_root,
+        "repo": args.repo,
+        "collection": args.collection,
+        "queries": args.queries,
+        "top_k": args.top_k,
+    }
+
+    modes = [False, True] if args.compare else [args.mmap]
+    for mmap in modes:
+        measures = _run({**params, "mmap": mmap}, args.workers)
+        _report("mmap, read-only" if mmap else "read_index (private copy)", measures)
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    _main()
@@ -1,11 +1,15 @@
 """
 build_index.py
 ---------------
-Small CLI helper to build (or rebuild) a Faiss index for a given
-<repo, collection_src> pair.
+Small CLI helper to build (or rebuild) Faiss indexes for one or several
+<repo, collection_src> pairs.
 It wraps *FaissIndexManager* so that you can trigger indexing from
 terminal or CI without opening a Python shell.
 
+Several repos / collections (or ``--all`` pairs found in the metadata) are
+built in parallel by a process pool, bounded by ``--workers`` and by an
+estimated ``--memory-budget-mb``, then a per-index summary is printed.
+
 Usage examples
 ~~~~~~~~~~~~~~
 $ python build_index.py --repo archethic-foundation/archethic-node \
@@ -14,6 +18,24 @@ $ python build_index.py --repo archethic-foundation/archethic-node \
 $ python build_index.py --repo archethic-foundation/archethic-node \
                         --collection main_files --force
 
+$ python build_index.py --repo archethic-foundation/archethic-node \
+                        --collection commits --index-factory "IVF4096,PQ48" --nprobe 16
+
+$ python build_index.py --repo archethic-foundation/archethic-node \
+                        --collection commits --incremental
+
+$ python build_index.py --repo archethic-foundation/archethic-node \
+                        --collection commits --index-factory HNSW32 --metric ip --storage int8
+
+$ python build_index.py --repo archethic-foundation/archethic-node \
+                        --collection commits --pca-dim 128 --force
+
+# Batch mode: every pair, 4 builds at a time within ~8 GB
+$ python build_index.py --repo archethic-foundation/archethic-node archethic-foundation/archethic-wallet \
+                        --collection commits issues pull_requests --workers 4 --memory-budget-mb 8192
+
+$ python build_index.py --all --force --workers 8
+
 Environment
 ~~~~~~~~~~~
 The script relies on the same .env variables as the rest of the project:
@@ -28,14 +50,38 @@ from __future__ import annotations
 import argparse
 import os
 import sys
-from pathlib import Path
-from typing import NoReturn
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+from typing import Any, Dict, List
 
 from dotenv import load_dotenv
 
 # Local imports – project root must be in PYTHONPATH when running
 from core.database_manager import DatabaseManager
-from core.faiss_index_manager import FaissIndexManager
+from core.faiss_index_manager import (
+    FaissIndexManager,
+    DEFAULT_INDEX_FACTORY,
+    DEFAULT_TRAIN_SAMPLE,
+    DEFAULT_METRIC,
+    DEFAULT_STORAGE,
+    METRICS,
+    STORAGE_CODECS,
+)
+from utils.perf_helpers import format_bytes
+
+COLLECTIONS = [
+    "files",
+    "main_files",
+    "last_release_files",
+    "commits",
+    "pull_requests",
+    "issues",
+]
+DEFAULT_MEMORY_BUDGET_MB = 4096
+# Rough peak memory of a build per vector: float32 384-d vector in the index,
+# in the streaming buffer, and as decoded BSON list while it is fetched.
+_EST_BYTES_PER_VECTOR = 8 * 1024
 
 # ---------------------------------------------------------------------------
 # Argument parsing
@@ -55,27 +101,86 @@ def _parse_args() -> argparse.Namespace:
 
     parser.add_argument(
         "--repo",
-        required=True,
-        help="Full GitHub repository name, e.g. archethic-foundation/archethic-node",
+        nargs="+",
+        help="Full GitHub repository name(s), e.g. archethic-foundation/archethic-node",
     )
     parser.add_argument(
         "--collection",
-        required=True,
-        choices=[
-            "files",
-            "main_files",
-            "last_release_files",
-            "commits",
-            "pull_requests",
-            "issues",
-        ],
-        help="Name of the source collection to index.",
+        nargs="+",
+        choices=COLLECTIONS,
+        help="Name(s) of the source collection(s) to index.",
+    )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Build every (repo, collection) pair found in the metadata "
+             "(restricted to --repo / --collection when given).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=min(4, os.cpu_count() or 1),
+        help="Max number of indexes built in parallel.",
+    )
+    parser.add_argument(
+        "--memory-budget-mb",
+        type=int,
+        default=DEFAULT_MEMORY_BUDGET_MB,
+        help="Max estimated memory of the builds running at the same time.",
     )
     parser.add_argument(
         "--force",
         action="store_true",
         help="Rebuild index even if it already exists.",
     )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Apply the chunk change log to the existing index instead of rebuilding it "
+             "(an index that cannot be updated is rebuilt with its own settings).",
+    )
+    parser.add_argument(
+        "--index-factory",
+        default=DEFAULT_INDEX_FACTORY,
+        help="Faiss index_factory description, e.g. Flat, HNSW32, 'IVF4096,Flat', 'IVF4096,PQ48'.",
+    )
+    parser.add_argument(
+        "--train-sample",
+        type=int,
+        default=DEFAULT_TRAIN_SAMPLE,
+        help="Max number of sampled vectors used to train IVF / PQ indexes.",
+    )
+    parser.add_argument(
+        "--nprobe",
+        type=int,
+        default=None,
+        help="Default number of IVF lists visited per query (stored with the index).",
+    )
+    parser.add_argument(
+        "--ef-search",
+        type=int,
+        default=None,
+        help="Default HNSW efSearch (stored with the index).",
+    )
+    parser.add_argument(
+        "--metric",
+        choices=list(METRICS),
+        default=DEFAULT_METRIC,
+        help="Distance: l2, or ip (cosine similarity on normalized vectors).",
+    )
+    parser.add_argument(
+        "--storage",
+        choices=list(STORAGE_CODECS),
+        default=DEFAULT_STORAGE,
+        help="Vector storage of Flat / HNSW / IVF*,Flat indexes (fp16 / int8 = scalar quantization).",
+    )
+    parser.add_argument(
+        "--pca-dim",
+        type=int,
+        default=None,
+        help="Reduce vectors to this many dimensions with a PCA learned at build time "
+             "(see scripts/evaluate_index.py for the recall trade-off).",
+    )
     parser.add_argument(
         "--verbose",
         "-v",
@@ -83,12 +188,128 @@ def _parse_args() -> argparse.Namespace:
         help="Enable extra logging output.",
     )
 
-    return parser.parse_args()
+    args = parser.parse_args()
+    if not args.all and not (args.repo and args.collection):
+        parser.error("--repo and --collection are required unless --all is given.")
+    return args
 
 # ---------------------------------------------------------------------------
 # Main logic
 # ---------------------------------------------------------------------------
 
+def _discover_jobs(db: DatabaseManager, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """
+    List the (repo, collection) pairs to build with their estimated vector count.
+
+    With --all the pairs come from the metadata collection; pairs without any
+    embedding end up with an "empty" status in the summary.
+    """
+    match: Dict[str, Any] = {}
+    if args.repo:
+        match["repo"] = {"$in": args.repo}
+    if args.collection:
+        match["collection_src"] = {"$in": args.collection}
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": {"repo": "$repo", "collection_src": "$collection_src"}, "metadata": {"$sum": 1}}},
+    ]
+    counts = {
+        (group["_id"]["repo"], group["_id"]["collection_src"]): group["metadata"]
+        for group in db.db.metadata.aggregate(pipeline)
+    }
+    if args.all:
+        pairs = sorted(pair for pair in counts if pair[1] in COLLECTIONS)
+    else:
+        pairs = [(repo, collection) for repo in args.repo for collection in args.collection]
+
+    # Estimated vectors of a pair = its metadata count x average chunks per metadata
+    total_metadata = db.db.metadata.estimated_document_count()
+    chunks_per_metadata = db.db.chunks.estimated_document_count() / total_metadata if total_metadata else 1.0
+    return [
+        {"repo": repo, "collection": collection,
+         "est_bytes": int(counts.get((repo, collection), 0) * chunks_per_metadata * _EST_BYTES_PER_VECTOR)}
+        for repo, collection in pairs
+    ]
+
+
+def _run_job(job: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build (or incrementally update) one index. Runs in a pool worker, so it
+    opens its own MongoDB connection and never raises.
+    """
+    repo, collection = job["repo"], job["collection"]
+    t0 = time.perf_counter()
+    db = DatabaseManager(options["mongo_uri"], options["db_name"], create_indexes=False)
+    try:
+        idx_mgr = FaissIndexManager(db)
+        build_options = {key: options[key] for key in
+                         ("index_factory", "nprobe", "ef_search", "metric", "storage", "pca_dim")}
+        if options["incremental"]:
+            try:
+                applied = idx_mgr.apply_changes(repo, collection)
+                return {"repo": repo, "index_name": collection, "status": f"updated ({applied} changes)",
+                        "vectors": idx_mgr.index.ntotal, "seconds": time.perf_counter() - t0,
+                        "bytes": idx_mgr.loaded_bytes, "version": idx_mgr.loaded_version}
+            except FileNotFoundError as exc:
+                print(f"[build_index] No index to update for {repo}/{collection} ({exc}), building it.",
+                      file=sys.stderr)
+            except ValueError as exc:
+                # Rebuilt the way the existing index was built, not with the CLI defaults
+                build_options = idx_mgr.build_options(repo, collection)
+                print(f"[build_index] Incremental update of {repo}/{collection} impossible ({exc}), "
+                      f"rebuilding it with {build_options}.", file=sys.stderr)
+        return idx_mgr.build_index(
+            repo,
+            [collection],
+            force=options["force"] or options["incremental"],
+            train_sample=options["train_sample"],
+            **build_options,
+        )
+    except Exception as exc:  # Reported in the summary, the other builds go on
+        return {"repo": repo, "index_name": collection, "status": f"failed: {exc}",
+                "vectors": 0, "seconds": time.perf_counter() - t0, "bytes": 0, "version": None}
+    finally:
+        db.close_connection()
+
+
+def _run_pool(jobs: List[Dict[str, Any]], options: Dict[str, Any],
+              workers: int, memory_budget: int) -> List[Dict[str, Any]]:
+    """
+    Run the jobs in a process pool. The biggest indexes are started first, and a
+    job only starts when its estimated memory fits in what the running ones
+    leave of the budget (a job alone over budget still runs, on its own).
+    """
+    pending = sorted(jobs, key=lambda job: job["est_bytes"], reverse=True)
+    running: Dict[Future, Dict[str, Any]] = {}
+    summaries: List[Dict[str, Any]] = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+        while pending or running:
+            reserved = sum(job["est_bytes"] for job in running.values())
+            for job in list(pending):
+                if len(running) >= workers:
+                    break
+                if running and reserved + job["est_bytes"] > memory_budget:
+                    continue
+                pending.remove(job)
+                running[pool.submit(_run_job, job, options)] = job
+                reserved += job["est_bytes"]
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                running.pop(future)
+                summaries.append(future.result())
+    return summaries
+
+
+def _print_summary(summaries: List[Dict[str, Any]], elapsed: float) -> None:
+    """Print one line per index and the totals."""
+    print(f"\n{'repo':<45} {'index':<20} {'status':<22} {'vectors':>10} {'seconds':>9} {'size':>10}")
+    for s in sorted(summaries, key=lambda s: (s["repo"], s["index_name"])):
+        print(f"{s['repo']:<45} {s['index_name']:<20} {s['status']:<22} {s['vectors']:>10} "
+              f"{s['seconds']:>9.2f} {format_bytes(s['bytes']):>10}")
+    print(f"{len(summaries)} indexes, {sum(s['vectors'] for s in summaries)} vectors, "
+          f"{format_bytes(sum(s['bytes'] for s in summaries))} in {elapsed:.2f}s.")
+
+
 def _main() -> None:
     """
     Entry point executed when the script is run directly from CLI.
@@ -97,27 +318,42 @@ def _main() -> None:
 
     # Load environment variables from .env file (optional)
     load_dotenv()
-    mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-    db_name   = os.getenv("DB_NAME", "archethic_github_test_data")
+    options = {
+        "mongo_uri": os.getenv("MONGO_URI", "mongodb://localhost:27017"),
+        "db_name": os.getenv("DB_NAME", "archethic_github_test_data"),
+        "force": args.force,
+        "incremental": args.incremental,
+        "index_factory": args.index_factory,
+        "train_sample": args.train_sample,
+        "nprobe": args.nprobe,
+        "ef_search": args.ef_search,
+        "metric": args.metric,
+        "storage": args.storage,
+        "pca_dim": args.pca_dim,
+    }
 
     if args.verbose:
         print("[build_index] Connecting to MongoDB ...", file=sys.stderr)
-
-    # Initialize database and index manager
-    db = DatabaseManager(mongo_uri, db_name, create_indexes=False)
-    idx_mgr = FaissIndexManager(db)
+    db = DatabaseManager(options["mongo_uri"], options["db_name"], create_indexes=False)
+    try:
+        jobs = _discover_jobs(db, args)
+    finally:
+        db.close_connection()
 
     if args.verbose:
         print(
-            f"[build_index] Building index: repo={args.repo}, collection={args.collection}",
+            f"[build_index] Building {len(jobs)} index(es) with {args.workers} worker(s): "
+            f"index_factory={args.index_factory}, metric={args.metric}, storage={args.storage}, "
+            f"pca_dim={args.pca_dim}",
             file=sys.stderr,
         )
 
-    # Build the index and close DB connection afterward
-    try:
-        idx_mgr.build_index(args.repo, args.collection, force=args.force)
-    finally:
-        db.close_connection()
+    t0 = time.perf_counter()
+    if len(jobs) == 1 or args.workers <= 1:
+        summaries = [_run_job(job, options) for job in jobs]
+    else:
+        summaries = _run_pool(jobs, options, args.workers, args.memory_budget_mb * 1024 * 1024)
+    _print_summary(summaries, time.perf_counter() - t0)
 
     if args.verbose:
         print("[build_index] Done.", file=sys.stderr)
@@ -0,0 +1,192 @@
+"""
+evaluate_index.py
+-----------------
+Report the recall / latency / memory trade-off of Faiss index settings for
+one <repo, collection_src>, to shrink indexes (PCA, scalar quantization,
+approximate index types) without silently losing search quality.
+
+Every configuration is built from the embeddings stored in MongoDB into a
+scratch directory (the real indexes are left untouched). Queries are chunk
+embeddings sampled from the collection; the ground truth is an exact, full
+dimension Flat search with the same metric, the query chunk itself excluded.
+For each configuration the script prints:
+
+- recall@k     : share of the exact top-k neighbours that are found,
+- latency      : mean and p95 of single-query searches (ms),
+- size on disk : index + mapping (what a worker maps into memory),
+- build time.
+
+Usage examples
+~~~~~~~~~~~~~~
+$ python -m scripts.evaluate_index --repo archethic-foundation/archethic-node \
+                                   --collection commits --pca-dims 96 128 192
+
+$ python -m scripts.evaluate_index --repo archethic-foundation/archethic-node \
+                                   --collection commits --metric ip --index-factory HNSW32 \
+                                   --storage int8 --pca-dims 128 --top-k 10
+
+Environment
+~~~~~~~~~~~
+- ``MONGO_URI``   : connection string (default: mongodb://localhost:27017)
+- ``DB_NAME``     : database name      (default: archethic_github_test_data)
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+from dotenv import load_dotenv
+
+from core.database_manager import DatabaseManager
+from core.faiss_index_manager import (
+    DEFAULT_INDEX_FACTORY, DEFAULT_METRIC, DEFAULT_STORAGE, METRICS, STORAGE_CODECS, FaissIndexManager,
+)
+from core.index_mapping import chunk_faiss_ids
+from utils.perf_helpers import format_bytes
+
+# ---------------------------------------------------------------------------
+# Argument parsing
+# ---------------------------------------------------------------------------
+
+def _parse_args() -> argparse.Namespace:
+    """
+    Define and parse command-line arguments for the script.
+
+    Returns:
+        argparse.Namespace: Parsed arguments from sys.argv
+    """
+    parser = argparse.ArgumentParser(
+        description="Evaluate recall, latency and size of Faiss index settings (PCA, quantization, ...).",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--repo", required=True, help="Full GitHub repository name.")
+    parser.add_argument("--collection", required=True, help="Collection to index, e.g. commits.")
+    parser.add_argument("--index-factory", default=DEFAULT_INDEX_FACTORY, help="Faiss index_factory description.")
+    parser.add_argument("--metric", choices=list(METRICS), default=DEFAULT_METRIC, help="Distance metric.")
+    parser.add_argument("--storage", choices=list(STORAGE_CODECS), default=DEFAULT_STORAGE, help="Vector storage.")
+    parser.add_argument("--pca-dims", type=int, nargs="*", default=[128, 192],
+                        help="PCA output dimensions to evaluate (the full dimension is always evaluated).")
+    parser.add_argument("--queries", type=int, default=500, help="Number of sampled query chunks.")
+    parser.add_argument("--top-k", type=int, default=10, help="k of recall@k.")
+    parser.add_argument("--nprobe", type=int, default=None, help="IVF nprobe used for the searches.")
+    parser.add_argument("--ef-search", type=int, default=None, help="HNSW efSearch used for the searches.")
+    return parser.parse_args()
+
+# ---------------------------------------------------------------------------
+# Main logic
+# ---------------------------------------------------------------------------
+
+def _sample_queries(idx_mgr: FaissIndexManager, repo: str, collection: str, count: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Reservoir-sample `count` chunk embeddings of the collection.
+
+    Returns:
+        tuple: (float32 query matrix, Faiss id of each query chunk)
+    """
+    meta_by_id = idx_mgr._prefetch_metadata({"repo": repo, "collection_src": collection})
+    rng = random.Random(0)
+    vectors: List[np.ndarray] = []
+    ids: List[str] = []
+    seen = 0
+    for batch, batch_ids, _, _ in idx_mgr._iter_embedding_batches(meta_by_id, 4096):
+        for row, chunk_id in enumerate(batch_ids):
+            slot = seen if seen < count else rng.randrange(seen + 1)
+            if slot < count:
+                if slot == len(vectors):
+                    vectors.append(batch[row].copy())
+                    ids.append(chunk_id)
+                else:
+                    vectors[slot], ids[slot] = batch[row].copy(), chunk_id
+            seen += 1
+    if not vectors:
+        raise SystemExit(f"No embeddings found for {repo}/{collection}.")
+    return np.stack(vectors), chunk_faiss_ids(ids)
+
+
+def _neighbours(idx_mgr: FaissIndexManager, queries: np.ndarray, query_ids: np.ndarray,
+                top_k: int, args: argparse.Namespace) -> np.ndarray:
+    """Top-k Faiss ids of each query, the query chunk itself excluded."""
+    _, I = idx_mgr.search_vectors(queries, top_k + 1, nprobe=args.nprobe, ef_search=args.ef_search)
+    result = np.full((len(queries), top_k), -1, dtype=np.int64)
+    for q, (row, own_id) in enumerate(zip(I, query_ids)):
+        kept = row[(row != own_id) & (row >= 0)][:top_k]
+        result[q, :len(kept)] = kept
+    return result
+
+
+def _evaluate(idx_mgr: FaissIndexManager, queries: np.ndarray, query_ids: np.ndarray,
+              truth: np.ndarray, args: argparse.Namespace) -> Dict[str, Any]:
+    """Recall@k against `truth` and single-query latencies of the loaded index."""
+    found = _neighbours(idx_mgr, queries, query_ids, args.top_k, args)
+    hits = sum(len(np.intersect1d(f[f >= 0], t[t >= 0])) for f, t in zip(found, truth))
+    expected = int((truth >= 0).sum())
+
+    latencies = []
+    for i in range(len(queries)):
+        t0 = time.perf_counter()
+        idx_mgr.search_vectors(queries[i:i + 1], args.top_k + 1, nprobe=args.nprobe, ef_search=args.ef_search)
+        latencies.append(time.perf_counter() - t0)
+    return {
+        "recall": hits / expected if expected else 0.0,
+        "latency_ms": 1000 * float(np.mean(latencies)),
+        "p95_ms": 1000 * float(np.percentile(latencies, 95)),
+    }
+
+
+def _report(results: List[Dict[str, Any]], top_k: int) -> None:
+    """Print one line per configuration."""
+    print(f"\n{'configuration':<40} {'dim':>5} {f'recall@{top_k}':>10} {'mean ms':>8} {'p95 ms':>8} "
+          f"{'size':>10} {'build':>8}")
+    for r in results:
+        print(f"{r['name']:<40} {r['dim']:>5} {r['recall']:>10.3f} {r['latency_ms']:>8.3f} {r['p95_ms']:>8.3f} "
+              f"{format_bytes(r['bytes']):>10} {r['seconds']:>7.1f}s")
+
+
+def _main() -> None:
+    """
+    Entry point executed when the script is run directly from CLI.
+    """
+    args = _parse_args()
+    load_dotenv()
+    db = DatabaseManager(os.getenv("MONGO_URI", "mongodb://localhost:27017"),
+                         os.getenv("DB_NAME", "archethic_github_test_data"), create_indexes=False)
+    try:
+        with tempfile.TemporaryDirectory(prefix="evaluate_index_") as index_root:
+            idx_mgr = FaissIndexManager(db, index_root=index_root)
+            queries, query_ids = _sample_queries(idx_mgr, args.repo, args.collection, args.queries)
+            print(f"[evaluate_index] {len(queries)} query chunks sampled from {args.repo}/{args.collection}.")
+
+            # Ground truth: exact search on the full-dimension float32 vectors
+            idx_mgr.build_index(args.repo, [args.collection], force=True, metric=args.metric)
+            truth = _neighbours(idx_mgr, queries, query_ids, args.top_k, args)
+
+            results = []
+            for pca_dim in [None, *args.pca_dims]:
+                summary = idx_mgr.build_index(
+                    args.repo, [args.collection], force=True, index_factory=args.index_factory,
+                    metric=args.metric, storage=args.storage, pca_dim=pca_dim,
+                    nprobe=args.nprobe, ef_search=args.ef_search,
+                )
+                results.append({
+                    "name": idx_mgr.info["index_factory"],
+                    "dim": pca_dim or queries.shape[1],
+                    "bytes": summary["bytes"],
+                    "seconds": summary["seconds"],
+                    **_evaluate(idx_mgr, queries, query_ids, truth, args),
+                })
+            _report(results, args.top_k)
+    finally:
+        db.close_connection()
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    _main()
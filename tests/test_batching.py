@@ -0,0 +1,35 @@
+"""
+Unit tests for the length-bucketed, token-budget embedding batches.
+"""
+import numpy as np
+
+from embeddings.batching import BatchStats, encode_bucketed, plan_batches
+
+
+def test_batches_respect_token_budget_and_cover_every_text():
+    rng = np.random.default_rng(0)
+    lengths = rng.integers(8, 256, size=500)
+    batches = plan_batches(lengths, max_tokens=2048, batch_size=32)
+
+    assert sorted(np.concatenate(batches).tolist()) == list(range(500))
+    for indices in batches:
+        assert len(indices) * lengths[indices].max() <= 2048
+    # A text longer than the budget is encoded alone
+    assert [len(b) for b in plan_batches([5000, 10], max_tokens=2048, batch_size=32)] == [1, 1]
+
+
+def test_encode_bucketed_restores_order_and_cuts_padding():
+    rng = np.random.default_rng(1)
+    lengths = rng.choice([12, 20, 250], size=300)
+
+    def encode(indices):
+        return np.stack([np.full(4, i, dtype=np.float32) for i in indices])
+
+    naive, bucketed = BatchStats(), BatchStats()
+    expected = encode_bucketed(lengths, encode, None, 32, naive)
+    vectors = encode_bucketed(lengths, encode, 4096, 32, bucketed)
+
+    assert np.array_equal(vectors[:, 0], np.arange(300))
+    assert np.array_equal(vectors, expected)
+    assert bucketed.tokens == naive.tokens == lengths.sum()
+    assert bucketed.as_dict()["padding_ratio"] < 0.05 < naive.as_dict()["padding_ratio"]
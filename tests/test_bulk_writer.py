@@ -0,0 +1,88 @@
+"""
+Unit tests for the BulkWriter buffers (metadata/bulk_writer.py), on a recording fake database.
+"""
+import pytest
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from metadata.bulk_writer import BulkWriter
+
+
+class _RecordingDb:
+    """Records every bulk_write call as (collection, operations, ordered)."""
+
+    def __init__(self, failures=None):
+        self.calls = []
+        self.failures = failures or {}  # collection -> exceptions raised by its next bulk_writes
+
+    def __getitem__(self, collection):
+        db = self
+
+        class _Collection:
+            def bulk_write(self, operations, ordered=True):
+                db.calls.append((collection, list(operations), ordered))
+                if db.failures.get(collection):
+                    raise db.failures[collection].pop(0)
+
+        return _Collection()
+
+
+def test_flushes_by_size_in_first_write_order():
+    db = _RecordingDb()
+    writer = BulkWriter(db, flush_size=3, flush_interval=3600)
+    writer.add("chunks", UpdateOne({"_id": "c0"}, {"$set": {"x": 1}}, upsert=True))
+    writer.add("metadata", UpdateOne({"_id": "m0"}, {"$set": {"x": 1}}, upsert=True))
+    assert db.calls == []
+    writer.add("chunks", UpdateOne({"_id": "c1"}, {"$set": {"x": 1}}, upsert=True))
+
+    assert [(c, len(ops), ordered) for c, ops, ordered in db.calls] == [("chunks", 2, False), ("metadata", 1, False)]
+    stats = writer.stats()
+    assert stats["operations"] == 3 and stats["batches"] == 2 and stats["pending"] == 0
+
+
+def test_flushes_by_interval_and_on_demand():
+    db = _RecordingDb()
+    writer = BulkWriter(db, flush_size=1000, flush_interval=0)
+    writer.add("chunk_changes", InsertOne({"metadata_id": "m0"}))
+    assert len(db.calls) == 1
+
+    writer = BulkWriter(db, flush_size=1000, flush_interval=3600)
+    writer.add("chunk_changes", InsertOne({"metadata_id": "m1"}))
+    writer.flush()
+    writer.flush()  # Nothing pending: no empty bulk_write
+    assert len(db.calls) == 2 and writer.stats()["operations"] == 1
+
+
+def test_flush_order_then_first_write_order():
+    db = _RecordingDb()
+    writer = BulkWriter(db, flush_size=1000, flush_interval=3600, flush_order=("chunks", "chunk_changes", "metadata"))
+    writer.add("metadata", UpdateOne({"_id": "m0"}, {"$set": {"x": 1}}))
+    writer.add("issues", UpdateOne({"_id": "i0"}, {"$set": {"metadata_id": "m0"}}))
+    writer.add("chunk_changes", InsertOne({"metadata_id": "m0"}))
+    writer.add("chunks", UpdateOne({"_id": "c0"}, {"$set": {"x": 1}}, upsert=True))
+    writer.flush()
+    assert [c for c, _, _ in db.calls] == ["chunks", "chunk_changes", "metadata", "issues"]
+
+
+def test_failed_flush_keeps_unwritten_operations():
+    inserts = [InsertOne({"metadata_id": f"m{i}"}) for i in range(3)]
+    partial = BulkWriteError({"writeErrors": [{"index": 1, "code": 11000}, {"index": 2, "code": 91}]})
+    db = _RecordingDb({"chunk_changes": [AutoReconnect("primary stepped down"), partial]})
+    writer = BulkWriter(db, flush_size=1000, flush_interval=3600, flush_order=("chunk_changes", "metadata"))
+    for op in inserts:
+        writer.add("chunk_changes", op)
+    upsert = UpdateOne({"_id": "m0"}, {"$set": {"x": 1}})
+    writer.add("metadata", upsert)
+
+    # Nothing is known to be written: everything is pending again, metadata included
+    with pytest.raises(AutoReconnect):
+        writer.flush()
+    assert writer.stats()["pending"] == 4 and writer.stats()["failures"] == 1
+
+    # Only the insert that failed for another reason than being already written is retried
+    with pytest.raises(BulkWriteError):
+        writer.flush()
+    assert writer.stats()["pending"] == 2
+    writer.flush()
+    assert [(c, ops) for c, ops, _ in db.calls[-2:]] == [("chunk_changes", [inserts[2]]), ("metadata", [upsert])]
+    assert writer.stats()["pending"] == 0 and writer.stats()["operations"] == 2
@@ -0,0 +1,75 @@
+"""
+Unit tests for the local chunk store written next to each Faiss index.
+"""
+import numpy as np
+
+from core.chunk_store import ChunkStore, ChunkStoreWriter, encode_chunk
+from core.index_mapping import IndexMapping, chunk_faiss_ids
+
+
+def _chunk(metadata_id, i):
+    return {"_id": f"{metadata_id}_chunk_{i}", "metadata_id": metadata_id, "chunk_index": i,
+            "chunk_src": f"texte n°{i} de {metadata_id}", "embedding": [0.1, 0.2]}
+
+
+def test_chunk_store_roundtrip_follows_mapping_rows(tmp_path):
+    docs = [_chunk(f"meta_{m}", i) for m in range(4) for i in range(3)]
+    ids = [doc["_id"] for doc in docs]
+    mapping = IndexMapping.from_records(ids, [{"collection_src": "commits"}] * len(ids),
+                                        ids=chunk_faiss_ids(ids))
+    path = tmp_path / "commits_chunks.bin"
+    ChunkStore.from_records(chunk_faiss_ids(ids), [encode_chunk(doc) for doc in docs]).save(path)
+
+    store = ChunkStore.load(path)
+
+    assert len(store) == len(mapping)
+    by_id = {doc["_id"]: doc for doc in docs}
+    for row in range(len(mapping)):
+        doc = by_id[mapping.chunk_id(row)]
+        assert store.record(row) == {"metadata_id": doc["metadata_id"], "chunk_index": doc["chunk_index"],
+                                     "chunk_src": doc["chunk_src"]}
+
+
+def test_chunk_store_with_changes_stays_aligned():
+    docs = [_chunk(f"meta_{m}", i) for m in range(5) for i in range(2)]
+    ids = [doc["_id"] for doc in docs]
+    mapping = IndexMapping.from_records(ids, [{"collection_src": "issues"}] * len(ids),
+                                        ids=chunk_faiss_ids(ids))
+    store = ChunkStore.from_records(chunk_faiss_ids(ids), [encode_chunk(doc) for doc in docs])
+
+    removed = chunk_faiss_ids(["meta_0_chunk_0", "meta_3_chunk_1"])
+    added = [dict(_chunk("meta_3", 1), chunk_src="mis à jour"), _chunk("meta_9", 0)]
+    added_ids = [doc["_id"] for doc in added]
+    new_mapping = mapping.with_changes(removed, chunk_faiss_ids(added_ids), added_ids,
+                                       [{"collection_src": "issues"}] * len(added))
+    new_store = store.with_changes(mapping.ids, removed, chunk_faiss_ids(added_ids),
+                                   [encode_chunk(doc) for doc in added])
+
+    assert len(new_store) == len(new_mapping) == len(ids)
+    records = {new_mapping.chunk_id(row): new_store.record(row) for row in range(len(new_mapping))}
+    assert "meta_0_chunk_0" not in records
+    assert records["meta_3_chunk_1"]["chunk_src"] == "mis à jour"
+    assert records["meta_9_chunk_0"]["metadata_id"] == "meta_9"
+    assert all(np.diff(new_mapping.ids) > 0)
+
+
+def test_spooled_writer_matches_in_memory_store(tmp_path, monkeypatch):
+    monkeypatch.setattr("core.chunk_store._COPY_BUFFER_SIZE", 64)  # Several copy buffers
+    docs = [_chunk(f"meta_{m}", i) for m in range(10) for i in range(5)]
+    ids = chunk_faiss_ids([doc["_id"] for doc in docs])
+    records = [encode_chunk(doc) for doc in docs]
+
+    writer = ChunkStoreWriter(tmp_path)
+    for start in range(0, len(docs), 16):  # Batches of a build
+        writer.add(ids[start:start + 16], records[start:start + 16])
+    writer.save(tmp_path / "spooled.bin")
+    writer.close()
+    ChunkStore.from_records(ids, records).save(tmp_path / "in_memory.bin")
+
+    assert (tmp_path / "spooled.bin").read_bytes() == (tmp_path / "in_memory.bin").read_bytes()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["in_memory.bin", "spooled.bin"]
+
+    empty = ChunkStoreWriter(tmp_path)
+    empty.save(tmp_path / "empty.bin")
+    empty.close()
+    assert len(ChunkStore.load(tmp_path / "empty.bin")) == 0
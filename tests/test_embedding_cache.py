@@ -0,0 +1,57 @@
+"""
+Unit tests for the persistent (model, text hash) embedding cache.
+"""
+import numpy as np
+
+from embeddings.embeddings import AbstractEmbeddingModel
+from embeddings.embedding_cache import CachedEmbeddingModel
+
+
+class _CountingModel(AbstractEmbeddingModel):
+    model_name = "counting"
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, text):
+        self.encoded.append(text)
+        return [float(len(text)), float(sum(map(ord, text)) % 97)]
+
+
+def test_cache_only_encodes_unseen_texts(tmp_path):
+    path = tmp_path / "embedding_cache.sqlite"
+    model = _CountingModel()
+    cache = CachedEmbeddingModel(model, path)
+
+    first = cache.encode_batch(["a", "bb", "a"])
+    assert model.encoded == ["a", "bb"]
+    assert first.dtype == np.float32 and first.shape == (3, 2)
+    assert np.array_equal(first[0], first[2])
+    cache.close()
+
+    # Persisted across instances: nothing left to encode
+    cache = CachedEmbeddingModel(model, path)
+    assert np.array_equal(cache.encode_batch(["bb", "a"]), first[[1, 0]])
+    assert cache.encode("a") == first[0].tolist()
+    assert model.encoded == ["a", "bb"]
+    assert cache.stats()["hits"] == 3 and cache.stats()["misses"] == 0
+
+    # Another model name never reuses these vectors
+    other = CachedEmbeddingModel(model, path, model_name="other")
+    other.encode_batch(["a"])
+    assert model.encoded == ["a", "bb", "a"]
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    model = _CountingModel()
+    cache = CachedEmbeddingModel(model, tmp_path / "embedding_cache.sqlite", max_entries=2)
+    cache.encode_batch(["a"])
+    cache.encode_batch(["b"])
+    cache.encode_batch(["a"])  # "b" becomes the least recently used
+    cache.encode_batch(["c"])
+
+    assert cache.stats()["entries"] == 2 and cache.stats()["evictions"] == 1
+    cache.encode_batch(["a", "c"])
+    assert model.encoded == ["a", "b", "c"]
+    cache.encode_batch(["b"])
+    assert model.encoded == ["a", "b", "c", "b"]
@@ -1,4 +1,6 @@
 # tests/test_embeddings.py
+import numpy as np
+
 from embeddings.embeddings import SentenceTransformerEmbeddingModel
 
 def test_embedding_dim():
@@ -7,3 +9,12 @@ def test_embedding_dim():
     assert isinstance(vec, list)
     assert len(vec) == 384      # all-MiniLM-L6-v2 default
     assert all(isinstance(x, float) for x in vec)
+
+def test_encode_batch_matches_encode():
+    model = SentenceTransformerEmbeddingModel()
+    texts = ["Hello Archethic", "How to deploy a multisig ?", "Hello Archethic"]
+    vectors = model.encode_batch(texts, batch_size=2)
+    assert vectors.shape == (3, 384)
+    assert vectors.dtype == np.float32
+    assert np.allclose(vectors[0], model.encode(texts[0]), atol=1e-5)
+    assert np.allclose(vectors[0], vectors[2])
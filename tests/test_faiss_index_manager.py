@@ -0,0 +1,207 @@
+"""
+Unit tests for the FaissIndexManager helpers that do not need MongoDB.
+"""
+from types import SimpleNamespace
+
+import faiss
+import numpy as np
+import pytest
+from bson import ObjectId
+
+from core.faiss_index_manager import (FaissIndexManager, _apply_pca, _apply_storage, _base_index_factory,
+                                     _prepare_vectors, _with_stable_ids)
+from core.index_mapping import IndexMapping, chunk_faiss_ids
+
+REPO = "archethic-foundation/archethic-node"
+
+
+def _save_version(fim, n_vectors, dim=8):
+    """Save a small id-mapped Flat index as a new version of 'commits'."""
+    chunk_ids = [f"meta_{i}_chunk_0" for i in range(n_vectors)]
+    ids = chunk_faiss_ids(chunk_ids)
+    index = faiss.IndexIDMap(faiss.IndexFlatL2(dim))
+    index.add_with_ids(np.random.rand(n_vectors, dim).astype(np.float32), ids)
+    mapping = IndexMapping.from_records(chunk_ids, [{"collection_src": "commits"}] * n_vectors, ids=ids)
+    return fim._save(REPO, "commits", index, mapping, {"index_factory": "Flat", "dim": dim, "search_params": {}})[0]
+
+
+class _Cursor(list):
+    def sort(self, key, direction=1):
+        return _Cursor(sorted(self, key=lambda doc: doc[key], reverse=direction < 0))
+
+
+class _Collection:
+    """Answers the equality / $in / $gt / $exists queries of apply_changes."""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection=None, batch_size=None):
+        return _Cursor(doc for doc in self.docs if all(_matches(doc, k, v) for k, v in query.items()))
+
+
+def _matches(doc, field, condition):
+    value = doc.get(field)
+    if not isinstance(condition, dict):
+        return value == condition
+    return (("$in" not in condition or value in condition["$in"])
+            and ("$gt" not in condition or (value is not None and value > condition["$gt"]))
+            and ("$exists" not in condition or (field in doc) == condition["$exists"]))
+
+
+def _changes_db(chunks, changes):
+    """In-memory chunks / metadata / chunk_changes collections, one metadata per chunk."""
+    metadata = [{"_id": chunk["metadata_id"], "collection_src": "commits", "metadata_version": 0, "repo": REPO}
+                for chunk in chunks]
+    return SimpleNamespace(db=SimpleNamespace(chunks=_Collection(chunks), metadata=_Collection(metadata),
+                                              chunk_changes=_Collection(changes)))
+
+
+@pytest.mark.parametrize("index_factory, storage, expected", [
+    ("Flat", "float32", "Flat"),
+    ("Flat", "fp16", "SQfp16"),
+    ("Flat", "int8", "SQ8"),
+    ("HNSW32", "int8", "HNSW32,SQ8"),
+    ("HNSW32,Flat", "fp16", "HNSW32,SQfp16"),
+    ("IVF4096,Flat", "int8", "IVF4096,SQ8"),
+])
+def test_apply_storage(index_factory, storage, expected):
+    assert _apply_storage(index_factory, storage) == expected
+
+
+def test_apply_storage_rejects_compressed_or_unknown():
+    with pytest.raises(ValueError):
+        _apply_storage("IVF4096,PQ48", "int8")
+    with pytest.raises(ValueError):
+        _apply_storage("Flat", "bf16")
+
+
+@pytest.mark.parametrize("index_factory, metric, expected", [
+    ("Flat", "l2", "PCA128,Flat"),
+    ("HNSW32,SQ8", "ip", "PCA128,L2norm,HNSW32,SQ8"),
+])
+def test_apply_pca(index_factory, metric, expected):
+    assert _apply_pca(index_factory, 128, metric) == expected
+
+
+@pytest.mark.parametrize("built, storage, pca_dim, metric, expected", [
+    ("Flat", "float32", None, "l2", "Flat"),
+    ("PCA128,L2norm,HNSW32,SQ8", "int8", 128, "ip", "HNSW32"),
+    ("HNSW32,SQfp16", "fp16", None, "l2", "HNSW32"),
+    ("PCA64,IVF4096,SQ8", "int8", 64, "l2", "IVF4096,Flat"),
+    ("PCA128,L2norm,IVF4096,PQ48", "float32", 128, "ip", "IVF4096,PQ48"),
+])
+def test_base_index_factory_undoes_storage_and_pca(built, storage, pca_dim, metric, expected):
+    assert _base_index_factory(built, storage, pca_dim, metric) == expected
+    rebuilt = _apply_storage(expected, storage)
+    assert (_apply_pca(rebuilt, pca_dim, metric) if pca_dim else rebuilt) == built
+
+
+def test_build_options_reproduce_the_saved_index(tmp_path):
+    fim = FaissIndexManager(None, object(), tmp_path)
+    with pytest.raises(FileNotFoundError):
+        fim.build_options(REPO, "commits")
+    _save_version(fim, 10)
+    assert fim.build_options(REPO, "commits") == {"index_factory": "Flat", "metric": "l2", "storage": "float32",
+                                                  "pca_dim": None, "nprobe": None, "ef_search": None}
+
+    index = faiss.IndexIDMap(faiss.IndexFlatL2(8))
+    mapping = IndexMapping.from_records([], [], ids=np.zeros(0, dtype=np.int64))
+    fim._save(REPO, "commits", index, mapping, {
+        "index_factory": "PCA4,L2norm,HNSW32,SQ8", "metric": "ip", "storage": "int8", "pca_dim": 4,
+        "dim": 8, "search_params": {"efSearch": 128}})
+    assert fim.build_options(REPO, "commits") == {"index_factory": "HNSW32", "metric": "ip", "storage": "int8",
+                                                  "pca_dim": 4, "nprobe": None, "ef_search": 128}
+
+
+def test_pca_index_projects_query_vectors(tmp_path):
+    vectors = np.random.default_rng(0).normal(size=(200, 16)).astype(np.float32)
+    chunk_ids = [f"meta_{i}_chunk_0" for i in range(len(vectors))]
+    ids = chunk_faiss_ids(chunk_ids)
+    index = faiss.IndexIDMap(faiss.index_factory(16, _apply_pca("Flat", 4, "l2")))
+    index.train(vectors)
+    index.add_with_ids(vectors, ids)
+    mapping = IndexMapping.from_records(chunk_ids, [{"collection_src": "commits"}] * len(ids), ids=ids)
+    fim = FaissIndexManager(None, object(), tmp_path)
+    fim._save(REPO, "commits", index, mapping, {"index_factory": "PCA4,Flat", "dim": 16, "search_params": {}})
+    fim.load_index(REPO, "commits")
+
+    # Full-dimension queries are projected by the index itself
+    _, I = fim.search_vectors(vectors[:5], top_k=1)
+    assert list(I[:, 0]) == list(ids[:5])
+
+
+def test_prepare_vectors_normalizes_for_inner_product_only():
+    vectors = np.array([[3.0, 4.0], [0.0, 2.0]], dtype=np.float32)
+    assert np.allclose(_prepare_vectors(vectors.copy(), "l2"), vectors)
+    assert np.allclose(np.linalg.norm(_prepare_vectors(vectors.copy(), "ip"), axis=1), 1.0)
+
+
+def test_new_version_is_picked_up_and_old_ones_collected(tmp_path):
+    writer = FaissIndexManager(None, object(), tmp_path)
+    first = _save_version(writer, 10)
+    reader = FaissIndexManager(None, object(), tmp_path)
+    reader.load_index(REPO, "commits")
+    assert reader.loaded_version == first and not reader.refresh_if_stale()
+
+    previous_index = reader.index
+    second = _save_version(writer, 20)
+    assert writer.current_version(REPO, "commits") == second
+    assert previous_index.ntotal == 10  # in-flight queries keep the version they started with
+    assert reader.refresh_if_stale()
+    assert reader.loaded_version == second and reader.index.ntotal == 20
+
+    # The superseded version is only deleted once its grace period is over
+    assert writer.gc_versions(REPO, "commits") == 0
+    assert writer.gc_versions(REPO, "commits", grace_seconds=0) == 1
+    reader.load_index(REPO, "commits")
+    assert reader.index.ntotal == 20
+
+
+def test_apply_changes_keeps_ivf_labels_consistent(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(400, 8)).astype(np.float32)
+    chunk_ids = [f"meta_{i}_chunk_0" for i in range(len(vectors))]
+    ids = chunk_faiss_ids(chunk_ids)
+    index = _with_stable_ids(faiss.index_factory(8, "IVF4,Flat"))
+    assert not isinstance(index, faiss.IndexIDMap)  # IVF lists hold the ids themselves
+    index.train(vectors)
+    index.add_with_ids(vectors, ids)
+    mapping = IndexMapping.from_records(
+        chunk_ids, [{"collection_src": "commits", "metadata_version": 0, "repo": REPO}] * len(ids), ids=ids)
+    info = {"index_factory": "IVF4,Flat", "dim": 8, "metric": "l2", "collections": ["commits"],
+            "search_params": {"nprobe": 4}, "id_mapped": True, "last_change_id": None}
+
+    # 100 chunks deleted, 20 others re-embedded
+    new_vectors = rng.normal(size=(20, 8)).astype(np.float32)
+    chunks = [{"_id": chunk_ids[i], "metadata_id": f"meta_{i}", "chunk_index": 0, "chunk_src": "",
+               "embedding": new_vectors[i - 100].tolist()} for i in range(100, 120)]
+    changes = [{"_id": ObjectId(), "repo": REPO, "collection_src": "commits",
+                "removed": chunk_ids[:100], "added": []},
+               {"_id": ObjectId(), "repo": REPO, "collection_src": "commits",
+                "removed": chunk_ids[100:120], "added": chunk_ids[100:120]}]
+    fim = FaissIndexManager(_changes_db(chunks, changes), object(), tmp_path)
+    fim._save(REPO, "commits", index, mapping, info)
+    assert fim.apply_changes(REPO, "commits") == 2
+
+    fim.load_index(REPO, "commits")
+    assert fim.index.ntotal == 300
+    _, I = fim.search_vectors(vectors[200:250], top_k=1)
+    assert fim.mapping.chunk_ids(I[:, 0]) == chunk_ids[200:250]
+    _, I = fim.search_vectors(new_vectors, top_k=1)
+    assert fim.mapping.chunk_ids(I[:, 0]) == chunk_ids[100:120]
+
+
+def test_apply_changes_rejects_id_mapped_ivf(tmp_path):
+    vectors = np.random.default_rng(0).normal(size=(200, 8)).astype(np.float32)
+    chunk_ids = [f"meta_{i}_chunk_0" for i in range(len(vectors))]
+    ids = chunk_faiss_ids(chunk_ids)
+    index = faiss.IndexIDMap(faiss.index_factory(8, "IVF4,Flat"))
+    index.train(vectors)
+    index.add_with_ids(vectors, ids)
+    mapping = IndexMapping.from_records(chunk_ids, [{"collection_src": "commits"}] * len(ids), ids=ids)
+    fim = FaissIndexManager(_changes_db([], []), object(), tmp_path)
+    fim._save(REPO, "commits", index, mapping, {"index_factory": "IVF4,Flat", "dim": 8, "id_mapped": True,
+                                                "search_params": {"nprobe": 4}})
+    with pytest.raises(ValueError, match="rebuild"):
+        fim.apply_changes(REPO, "commits")
@@ -0,0 +1,92 @@
+"""
+Unit tests for the attribute bitmaps used to filter Faiss searches (no MongoDB needed).
+"""
+import faiss
+import numpy as np
+import pytest
+
+from core.faiss_index_manager import FaissIndexManager, _with_stable_ids
+from core.index_filters import AttributeBitmaps
+from core.index_mapping import IndexMapping, chunk_faiss_ids
+
+COLLECTIONS = ("commits", "issues", "pull_requests")
+
+
+def _records(n):
+    chunk_ids = [f"meta_{i}_chunk_0" for i in range(n)]
+    metas = [{"collection_src": COLLECTIONS[i % 3], "metadata_version": i % 2, "repo": "org/repo"}
+             for i in range(n)]
+    return chunk_ids, metas
+
+
+def test_bitmap_or_within_attribute_and_across_attributes():
+    chunk_ids, metas = _records(30)
+    ids = chunk_faiss_ids(chunk_ids)
+    bitmaps = AttributeBitmaps(IndexMapping.from_records(chunk_ids, metas, ids=ids), ids)
+
+    def positions(filters):
+        bits = np.unpackbits(bitmaps.bitmap(filters), bitorder="little")[:len(ids)]
+        return set(np.nonzero(bits)[0])
+
+    assert positions({"collection_src": "issues"}) == set(range(1, 30, 3))
+    assert positions({"collection_src": ["commits", "issues"], "metadata_version": 1}) == \
+        {i for i in range(30) if i % 3 != 2 and i % 2 == 1}
+    assert positions({"repo": "org/repo"}) == set(range(30))
+    assert positions({"collection_src": "unknown"}) == set()
+    with pytest.raises(ValueError):
+        bitmaps.bitmap({"file_id": "x"})
+
+
+def test_filtered_search_only_returns_matching_chunks():
+    chunk_ids, metas = _records(300)
+    ids = chunk_faiss_ids(chunk_ids)
+    vectors = np.random.rand(len(ids), 8).astype(np.float32)
+    index = faiss.IndexIDMap(faiss.IndexHNSWFlat(8, 16))
+    index.add_with_ids(vectors, ids)
+
+    fim = FaissIndexManager(None, object())
+    fim._install(("org/repo", "global"), None, index, IndexMapping.from_records(chunk_ids, metas, ids=ids),
+                 {"repo": "org/repo", "search_params": {"efSearch": 64}})
+    loaded = fim._loaded
+
+    D, I = fim._filtered_search(loaded, vectors[:4], 10, fim._search_parameters(loaded),
+                                {"collection_src": "commits"})
+    assert (I >= 0).all()
+    assert {meta["collection_src"] for row in I for meta in fim.mapping.metas(row)} == {"commits"}
+
+    D, I = fim._filtered_search(loaded, vectors[:4], 10, None, {"repo": "other/repo"})
+    assert (I == -1).all()
+
+
+def test_filtered_search_on_ivf_after_removals():
+    chunk_ids, metas = _records(300)
+    ids = chunk_faiss_ids(chunk_ids)
+    vectors = np.random.default_rng(0).normal(size=(len(ids), 8)).astype(np.float32)
+    index = _with_stable_ids(faiss.index_factory(8, "IVF4,Flat"))
+    index.train(vectors)
+    index.add_with_ids(vectors, ids)
+    # Incremental update: the first 90 chunks are removed from the lists and the mapping
+    index.remove_ids(faiss.IDSelectorBatch(ids[:90]))
+    mapping = IndexMapping.from_records(chunk_ids, metas, ids=ids).with_changes(
+        ids[:90], np.zeros(0, dtype=np.int64), [], [])
+
+    fim = FaissIndexManager(None, object())
+    fim._install(("org/repo", "global"), None, index, mapping,
+                 {"repo": "org/repo", "id_mapped": True, "search_params": {"nprobe": 4}})
+    loaded = fim._loaded
+
+    queries = [i for i in range(90, 300) if COLLECTIONS[i % 3] == "issues"][:20]
+    _, I = fim._filtered_search(loaded, vectors[queries], 5, fim._search_parameters(loaded),
+                                {"collection_src": "issues"})
+    assert fim.mapping.chunk_ids(I[:, 0]) == [chunk_ids[i] for i in queries]
+    assert {meta["collection_src"] for row in I for meta in fim.mapping.metas(row[row >= 0])} == {"issues"}
+
+    _, I = fim._filtered_search(loaded, vectors[:5], 5, None, {"collection_src": "commits", "metadata_version": 1})
+    assert {chunk_ids.index(cid) % 6 for row in I for cid in fim.mapping.chunk_ids(row[row >= 0])} == {3}
+
+    # The id selector of a filter is built once per loaded version
+    filters = {"collection_src": ["issues", "commits"]}
+    selector = loaded.bitmaps.id_selector(filters, loaded.bitmaps.bitmap(filters))
+    assert loaded.bitmaps.id_selector({"collection_src": ["commits", "issues"]}, None) is selector
+    _, I = fim._filtered_search(loaded, vectors[queries], 5, None, {"collection_src": "issues"})
+    assert fim.mapping.chunk_ids(I[:, 0]) == [chunk_ids[i] for i in queries]
@@ -0,0 +1,88 @@
+"""
+Unit tests for the binary id/meta mapping stored next to each Faiss index.
+"""
+import json
+
+import numpy as np
+
+from core.index_mapping import IndexMapping, chunk_faiss_id, chunk_faiss_ids
+
+
+def _sample_records():
+    chunk_ids = [f"meta_org/repo_commits_{i}_chunk_0" for i in range(5)] + ["méta_ünïcode_chunk_1"]
+    metas = [
+        {"collection_src": "commits" if i % 2 else "issues", "metadata_version": i % 3 or None,
+         "repo": "org/repo"}
+        for i in range(6)
+    ]
+    return chunk_ids, metas
+
+
+def test_binary_mapping_roundtrip(tmp_path):
+    chunk_ids, metas = _sample_records()
+    path = tmp_path / "commits_mapping.bin"
+    IndexMapping.from_records(chunk_ids, metas).save(path)
+
+    mapping = IndexMapping.load(path)
+
+    assert len(mapping) == len(chunk_ids)
+    assert isinstance(mapping.codes, np.memmap)
+    assert [mapping.chunk_id(i) for i in range(len(mapping))] == chunk_ids
+    assert [mapping.meta(i) for i in range(len(mapping))] == metas
+    # Faiss returns -1 when fewer than top_k results exist
+    assert mapping.chunk_ids([2, -1, 0]) == [chunk_ids[2], chunk_ids[0]]
+    assert mapping.metas([-1, 1]) == [{}, metas[1]]
+
+
+def test_empty_mapping_roundtrip(tmp_path):
+    path = tmp_path / "empty_mapping.bin"
+    IndexMapping.from_records([], []).save(path)
+    assert len(IndexMapping.load(path)) == 0
+
+
+def test_legacy_json_mapping(tmp_path):
+    chunk_ids, metas = _sample_records()
+    path = tmp_path / "commits_mapping.json"
+    legacy_metas = [{k: v for k, v in meta.items() if k != "repo"} for meta in metas]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"id_map": dict(enumerate(chunk_ids)), "meta_map": dict(enumerate(legacy_metas))}, f)
+
+    mapping = IndexMapping.from_json(path)
+
+    assert mapping.chunk_ids(range(len(chunk_ids))) == chunk_ids
+    assert mapping.metas(range(len(chunk_ids))) == legacy_metas
+
+
+def test_chunk_faiss_ids_are_stable_int64():
+    ids = chunk_faiss_ids(["a_chunk_0", "a_chunk_1", "a_chunk_0"])
+    assert ids.dtype == np.int64
+    assert ids[0] == ids[2] == chunk_faiss_id("a_chunk_0")
+    assert ids[0] != ids[1]
+    assert (ids >= 0).all()
+
+
+def test_with_changes_replaces_and_removes_rows(tmp_path):
+    chunk_ids, metas = _sample_records()
+    ids = chunk_faiss_ids(chunk_ids)
+    path = tmp_path / "commits_mapping.bin"
+    IndexMapping.from_records(chunk_ids, metas, ids=ids).save(path)
+    mapping = IndexMapping.load(path)
+
+    new_chunks = [chunk_ids[1], "meta_new_chunk_0"]
+    new_metas = [{"collection_src": "commits", "metadata_version": 7, "repo": "org/repo"},
+                 {"collection_src": "pull_requests", "metadata_version": 0, "repo": "org/repo"}]
+    updated = mapping.with_changes(
+        removed_ids=chunk_faiss_ids([chunk_ids[0]]),
+        added_ids=chunk_faiss_ids(new_chunks),
+        added_chunk_ids=new_chunks,
+        added_metas=new_metas,
+    )
+    updated.save(path)
+    reloaded = IndexMapping.load(path)
+
+    assert len(reloaded) == len(chunk_ids) + 1 - 1
+    assert list(reloaded.ids) == sorted(reloaded.ids)
+    assert reloaded.chunk_ids(chunk_faiss_ids([chunk_ids[0]])) == []
+    assert reloaded.metas(chunk_faiss_ids(new_chunks)) == new_metas
+    assert reloaded.chunk_ids(chunk_faiss_ids(chunk_ids[2:])) == chunk_ids[2:]
+    assert reloaded.metas(chunk_faiss_ids(chunk_ids[2:])) == metas[2:]
@@ -0,0 +1,117 @@
+"""
+Unit tests for the LRU registry of loaded Faiss indexes (no MongoDB needed).
+"""
+import threading
+
+import faiss
+import numpy as np
+
+from core.chunk_store import ChunkStore, encode_chunk
+from core.faiss_index_manager import FaissIndexManager
+from core.index_mapping import IndexMapping, chunk_faiss_ids
+from core.index_registry import IndexRegistry
+
+REPO = "archethic-foundation/archethic-node"
+
+
+class _DummyEmbeddingModel:
+    def encode(self, text):
+        return [0.0] * 8
+
+
+def _save_index(index_root, index_name, n_vectors=64, dim=8, with_chunks=False):
+    """Write a small id-mapped Flat index the way build_index does."""
+    chunk_ids = [f"meta_{index_name}_chunk_{i}" for i in range(n_vectors)]
+    ids = chunk_faiss_ids(chunk_ids)
+    index = faiss.IndexIDMap(faiss.IndexFlatL2(dim))
+    index.add_with_ids(np.random.rand(n_vectors, dim).astype(np.float32), ids)
+
+    fim = FaissIndexManager(None, _DummyEmbeddingModel(), index_root)
+    mapping = IndexMapping.from_records(
+        chunk_ids, [{"collection_src": index_name, "metadata_version": 0}] * n_vectors, ids=ids)
+    info = {"index_factory": "Flat", "dim": dim, "search_params": {}, "id_mapped": True}
+    chunks = None
+    if with_chunks:
+        chunks = ChunkStore.from_records(ids, [encode_chunk({"metadata_id": cid, "chunk_src": "x" * 200})
+                                               for cid in chunk_ids])
+    return fim._save(REPO, index_name, index, mapping, info, chunks)[0]
+
+
+def test_registry_hits_misses_and_lru_eviction(tmp_path):
+    for name in ("commits", "issues", "pull_requests"):
+        _save_index(tmp_path, name)
+
+    registry = IndexRegistry(None, _DummyEmbeddingModel(), tmp_path, memory_budget_bytes=1 << 30)
+    commits = registry.get(REPO, "commits")
+    assert registry.get(REPO, "commits") is commits
+    one_index_bytes = commits.loaded_bytes
+    assert registry.stats()["hits"] == 1 and registry.stats()["misses"] == 1
+
+    # Room for two indexes only: loading a third evicts the least recently used one.
+    registry.memory_budget_bytes = 2 * one_index_bytes + one_index_bytes // 2
+    registry.get(REPO, "issues")
+    registry.get(REPO, "commits")
+    registry.get(REPO, "pull_requests")
+
+    stats = registry.stats()
+    assert stats["evictions"] == 1
+    assert stats["resident_indexes"] == 2
+    assert stats["resident_bytes"] <= registry.memory_budget_bytes
+    assert registry.get(REPO, "commits") is commits  # still resident
+    misses = registry.stats()["misses"]
+    registry.get(REPO, "issues")  # evicted -> reloaded lazily
+    assert registry.stats()["misses"] == misses + 1
+
+
+def test_registry_mmap_loading_matches_in_memory(tmp_path):
+    _save_index(tmp_path, "commits")
+    queries = np.random.rand(4, 8).astype(np.float32)
+
+    in_ram = IndexRegistry(None, _DummyEmbeddingModel(), tmp_path).get(REPO, "commits")
+    mapped = IndexRegistry(None, _DummyEmbeddingModel(), tmp_path, mmap=True).get(REPO, "commits")
+
+    assert mapped.mmapped and not in_ram.mmapped
+    assert (mapped.index.search(queries, 5)[1] == in_ram.index.search(queries, 5)[1]).all()
+
+
+def test_loaded_bytes_include_the_chunk_store(tmp_path):
+    version = _save_index(tmp_path, "commits", with_chunks=True)
+    index_mgr = IndexRegistry(None, _DummyEmbeddingModel(), tmp_path).get(REPO, "commits")
+    files = FaissIndexManager(None, None, tmp_path)._version_dir(REPO, "commits", version).iterdir()
+    assert index_mgr.loaded_bytes == sum(path.stat().st_size for path in files if path.suffix != ".json")
+
+
+def test_loads_do_not_block_resident_indexes(tmp_path, monkeypatch):
+    for name in ("commits", "issues"):
+        _save_index(tmp_path, name)
+    registry = IndexRegistry(None, _DummyEmbeddingModel(), tmp_path)
+    commits = registry.get(REPO, "commits")
+
+    started, release = threading.Event(), threading.Event()
+    load_index = FaissIndexManager.load_index
+    loads = []
+
+    def slow_load_index(self, repo, index_name, mmap=False):
+        loads.append(index_name)
+        started.set()
+        release.wait(5)
+        load_index(self, repo, index_name, mmap)
+
+    monkeypatch.setattr(FaissIndexManager, "load_index", slow_load_index)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get(REPO, "issues"))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    assert started.wait(5)
+
+    # "issues" is being read from disk: the resident index is still served meanwhile
+    resident = []
+    reader = threading.Thread(target=lambda: resident.append(registry.get(REPO, "commits")))
+    reader.start()
+    reader.join(2)
+    assert resident == [commits]
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert loads == ["issues"] and len({id(r) for r in results}) == 1
+    assert registry.stats()["misses"] == 2 and registry.stats()["resident_indexes"] == 2
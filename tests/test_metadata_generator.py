@@ -0,0 +1,128 @@
+"""
+Unit tests for the MetadataGenerator helpers that do not need MongoDB or the models.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("transformers")
+pytest.importorskip("yake")
+
+from metadata.metadata_generator import MetadataGenerator, _comment_parent_key, iter_pages, source_signature
+
+
+class _Cursor(list):
+    def sort(self, keys):
+        return _Cursor(sorted(self, key=lambda doc: tuple(doc.get(k) for k, _ in keys)))
+
+
+class _CommentsCollection:
+    """Answers {"repo": ..., field: {"$in": [...]} | value} queries and counts them."""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = 0
+
+    def find(self, query, projection=None):
+        self.queries += 1
+        field = next(k for k in query if k != "repo")
+        values = query[field]["$in"] if isinstance(query[field], dict) else [query[field]]
+        return _Cursor(d for d in self.docs if d["repo"] == query["repo"] and d[field] in values)
+
+
+def test_iter_pages_and_comment_parent_key():
+    assert [len(page) for page in iter_pages(({"i": i} for i in range(5)), 2)] == [2, 2, 1]
+    assert _comment_parent_key({"_id": "o/r_12", "repo": "o/r", "number": 12}) == ("o/r", "12")
+    assert _comment_parent_key({"_id": "o/r_12", "repo": "o/r"}) == ("o/r", "12")
+
+
+def test_source_signature():
+    assert source_signature({"_id": "o/r_main_a.py", "commit_id": "b10b"}, "main_files") == "b10b"
+    assert source_signature({"_id": "5e1f"}, "commits") == "5e1f"
+    assert source_signature({"_id": "o/r_3", "updated_at": "2024-05-01T10:00:00Z"}, "issues") == "2024-05-01T10:00:00Z"
+    assert source_signature({"_id": "o/r_3"}, "issues") is None
+    assert source_signature({"_id": "x"}, "unknown") is None
+
+
+def test_issue_comments_are_prefetched_per_page():
+    comments = _CommentsCollection([
+        {"_id": "o/r_1_b", "repo": "o/r", "issue_id": "1", "comment_body": "second", "created_at": "2024-02"},
+        {"_id": "o/r_1_a", "repo": "o/r", "issue_id": "1", "comment_body": "first", "created_at": "2024-01"},
+        {"_id": "x/y_1_a", "repo": "x/y", "issue_id": "1", "comment_body": "other repo", "created_at": "2024-01"},
+    ])
+    generator = MetadataGenerator.__new__(MetadataGenerator)
+    generator.db_manager = type("Db", (), {"db": {"issues_comments": comments}})()
+    generator._comments = {}
+    issues = [{"_id": f"o/r_{i}", "repo": "o/r", "number": i, "title": f"Issue {i}", "body": ""} for i in (1, 2)]
+
+    generator.prefetch_comments(issues, "issues")
+    texts = [generator.extract_text_from_document(issue, "issues") for issue in issues]
+    assert comments.queries == 1
+    assert texts[0].endswith("Comments:\nfirst\nsecond") and texts[1].endswith("Comments:")
+
+    # Without prefetch, the document falls back to its own query
+    generator.extract_text_from_document(issues[0], "issues")
+    assert comments.queries == 2
+
+
+class _Writer:
+    def __init__(self):
+        self.operations = []
+
+    def add(self, collection, operation):
+        self.operations.append((collection, operation))
+
+
+def test_binary_and_empty_documents_only_record_their_signature():
+    metadata = {"meta_o/r_main_files_o/r_main_a.md": {"chunk_ids": ["meta_o/r_main_files_o/r_main_a.md_chunk_0"]}}
+    generator = MetadataGenerator.__new__(MetadataGenerator)
+    find_one = lambda query, projection=None: metadata.get(query["_id"])
+    generator.db_manager = SimpleNamespace(db=SimpleNamespace(metadata=SimpleNamespace(find_one=find_one)))
+    png = {"_id": "o/r_main_logo.png", "repo": "o/r", "filename": "logo.png", "commit_id": "b10b"}
+    md = {"_id": "o/r_main_a.md", "repo": "o/r", "filename": "a.md", "commit_id": "c0de"}
+    assert generator._skip_reason(png, "main_files") == "binary"
+    assert generator._skip_reason(md, "main_files") is None
+    assert generator._skip_reason({"_id": "o/r_1", "repo": "o/r"}, "issues") is None
+
+    writer = _Writer()
+    generator._write_skipped(png, "main_files", "binary", writer=writer)
+    (collection, upsert), = writer.operations
+    assert collection == "metadata" and upsert._upsert
+    assert upsert._doc["$set"]["source_signature"] == "b10b" and upsert._doc["$set"]["skipped"] == "binary"
+    assert upsert._doc["$set"]["chunk_ids"] == [] and "file_hash" in upsert._doc["$unset"]
+
+    # A document that had chunks (its text is now empty) loses them
+    writer = _Writer()
+    generator._write_skipped(md, "main_files", "empty", writer=writer)
+    assert [collection for collection, _ in writer.operations] == ["chunks", "chunk_changes", "metadata"]
+    assert writer.operations[1][1]._doc["removed"] == ["meta_o/r_main_files_o/r_main_a.md_chunk_0"]
+
+
+def test_failed_run_is_not_flushed_again(monkeypatch):
+    flushes, failures = [], []
+    run = SimpleNamespace(pages=lambda collection, size: iter([["o/r_1"]]), heartbeat=lambda: None,
+                          checkpoint=lambda *args, **kwargs: None, complete=lambda: None,
+                          fail=lambda error: failures.append(error))
+    monkeypatch.setattr("metadata.metadata_generator.MetadataRun.start", lambda *args, **kwargs: run)
+
+    def flush():
+        flushes.append(1)
+        raise RuntimeError("bulk write failed")
+
+    generator = MetadataGenerator.__new__(MetadataGenerator)
+    generator.db_manager = SimpleNamespace(db=None)
+    generator.writer = SimpleNamespace(flush=flush)
+    generator.prefetch_comments = lambda page, collection_src: None
+
+    generator.find_changed_items = lambda *args, **kwargs: []
+    with pytest.raises(RuntimeError, match="bulk write"):
+        generator.update_metadata_for_collection("o/r", None, "issues")
+    assert len(flushes) == 1 and len(failures) == 1
+
+    # An interruption is not replaced by the error of a flush
+    def interrupted(*args, **kwargs):
+        raise KeyboardInterrupt
+    generator.find_changed_items = interrupted
+    with pytest.raises(KeyboardInterrupt):
+        generator.update_metadata_for_collection("o/r", None, "issues")
+    assert len(flushes) == 1 and isinstance(failures[-1], KeyboardInterrupt)
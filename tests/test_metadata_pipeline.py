@@ -0,0 +1,123 @@
+"""
+Unit tests for MetadataPipeline (metadata/metadata_pipeline.py), with an in-memory generator.
+"""
+import threading
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("transformers")
+pytest.importorskip("yake")
+
+from metadata.metadata_pipeline import MetadataPipeline
+
+
+class _KeywordExtractor:
+    def extract(self, text, num_keywords=10):
+        return text.split()[:num_keywords]
+
+
+class _EmbeddingModel:
+    def __init__(self):
+        self.calls = []
+
+    def encode_batch(self, texts, batch_size=32):
+        self.calls.append(len(texts))
+        time.sleep(0.01)  # Slower than the other stages: documents queue up in front of it
+        return np.array([[len(t), 1.0] for t in texts], dtype=np.float32).reshape(len(texts), 2)
+
+
+class _Generator:
+    """The MetadataGenerator methods and attributes used by the pipeline."""
+
+    def __init__(self):
+        self.db_manager = type("Db", (), {"db": None})()
+        self.writer = type("Writer", (), {"flush_size": 10, "flush_interval": 60.0, "flush_order": (),
+                                          "failures": 0, "flush": lambda self: None})()
+        self.keyword_extractor = _KeywordExtractor()
+        self.embedding_model = _EmbeddingModel()
+        self.written = {}
+        self.skipped = {}
+        self._lock = threading.Lock()
+
+    def prefetch_comments(self, items, collection_src):
+        pass
+
+    def _skip_reason(self, item, collection_src):
+        return "binary" if item.get("binary") else None
+
+    def extract_text_from_document(self, item, collection_src):
+        assert not item.get("binary"), "binary content fetched"
+        return item["text"]
+
+    def _plan_metadata(self, item, collection_src, content):
+        if item.get("unchanged"):
+            return None
+        if item.get("broken"):
+            raise RuntimeError("broken document")
+        return {"metadata_id": item["_id"], "file_type": "doc",
+                "settings": {"extension": "txt", "language": "en", "min_chunk_size": 10,
+                             "chunk_size": 40, "overlap": 0}}
+
+    def _write_metadata(self, plan, content, chunks, tags, vectors, writer=None):
+        assert len(vectors) == len(chunks)
+        writer.add("metadata", plan["metadata_id"])
+        with self._lock:
+            self.written[plan["metadata_id"]] = (chunks, tags)
+
+    def _write_skipped(self, item, collection_src, reason, writer=None):
+        writer.add("metadata", item["_id"])
+        with self._lock:
+            self.skipped[item["_id"]] = reason
+
+
+class _Writer:
+    """BulkWriter whose flush triggered by `fail_on` fails, like a bulk_write error would."""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.failures = 0
+
+    def add(self, collection, operation):
+        if operation == self.fail_on:
+            self.failures += 1
+            raise RuntimeError("bulk_write failed")
+
+    def flush(self):
+        pass
+
+    def stats(self):
+        return {"operations": 0, "batches": 0, "seconds": 0.0}
+
+
+def test_pipeline_processes_every_changed_document(monkeypatch):
+    monkeypatch.setattr("metadata.metadata_pipeline.BulkWriter", lambda *args: _Writer())
+    generator = _Generator()
+    items = [{"_id": f"doc{i}", "text": f"document {i} " * 20} for i in range(40)]
+    items += [{"_id": "same", "text": "x", "unchanged": True}, {"_id": "bad", "text": "x", "broken": True},
+              {"_id": "logo.png", "binary": True}, {"_id": "blank", "text": ""}]
+
+    pipeline = MetadataPipeline(generator, extract_workers=4, split_workers=0, write_workers=2,
+                                embed_batch_size=16, queue_size=4, report_interval=0)
+    stats = pipeline.run_items(items, "issues")
+
+    assert sorted(generator.written) == sorted(f"doc{i}" for i in range(40))
+    # Binary files are not fetched; they and empty documents only get their signature recorded
+    assert generator.skipped == {"logo.png": "binary", "blank": "empty"}
+    chunks, tags = generator.written["doc3"]
+    assert chunks and tags[:2] == ["document", "3"]
+    assert stats["stages"]["extract"]["items"] == 44 and stats["stages"]["extract"]["errors"] == 1
+    assert stats["stages"]["write"]["items"] == 42
+    # Chunks of several documents are embedded together
+    assert len(generator.embedding_model.calls) < 40
+
+
+def test_failed_flush_fails_the_segment(monkeypatch):
+    monkeypatch.setattr("metadata.metadata_pipeline.BulkWriter", lambda *args: _Writer(fail_on="doc3"))
+    items = [{"_id": f"doc{i}", "text": f"document {i} " * 20} for i in range(10)]
+    pipeline = MetadataPipeline(_Generator(), extract_workers=2, split_workers=0, write_workers=1,
+                                queue_size=4, report_interval=0)
+    # The flush held the writes of other documents too: not just one dropped document
+    with pytest.raises(RuntimeError, match="bulk write"):
+        pipeline.run_items(items, "issues")
@@ -0,0 +1,129 @@
+"""
+Unit tests for checkpointed metadata runs (metadata/metadata_runs.py), on an in-memory runs collection.
+"""
+import datetime
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+
+from metadata.metadata_runs import MetadataRun, id_after
+
+
+def _matches(doc, query):
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(_matches(doc, clause) for clause in condition):
+                return False
+            continue
+        value = doc.get(key)
+        if not isinstance(condition, dict):
+            if value != condition:
+                return False
+        elif (("$in" in condition and value not in condition["$in"])
+              or ("$lt" in condition and not value < condition["$lt"])
+              or ("$gte" in condition and not value >= condition["$gte"])):
+            return False
+    return True
+
+
+class _RunsCollection:
+    """Minimal `metadata_runs` collection: documents by _id, the queries used by MetadataRun."""
+
+    def __init__(self):
+        self.docs = {}
+
+    def find_one(self, query, sort=None):
+        found = [doc for doc in self.docs.values() if _matches(doc, query)]
+        found.sort(key=lambda doc: doc["started_at"], reverse=True)
+        return dict(found[0]) if found else None
+
+    def insert_one(self, doc):
+        self.docs[doc["_id"]] = dict(doc)
+
+    def update_one(self, query, update):
+        doc = self.find_one(query)
+        if doc is not None:
+            self._apply(self.docs[doc["_id"]], update)
+        return SimpleNamespace(matched_count=int(doc is not None))
+
+    def find_one_and_update(self, query, update, return_document=None):
+        doc = self.find_one(query)
+        if doc is None:
+            return None
+        self._apply(self.docs[doc["_id"]], update)
+        return dict(self.docs[doc["_id"]])
+
+    def update_many(self, query, update):
+        for doc in self.docs.values():
+            if _matches(doc, query):
+                self._apply(doc, update)
+
+    @staticmethod
+    def _apply(doc, update):
+        doc.update(update.get("$set", {}))
+        for key, value in update.get("$inc", {}).items():
+            target, name = (doc["counters"], key.split(".", 1)[1]) if key.startswith("counters.") else (doc, key)
+            target[name] = target.get(name, 0) + value
+
+
+def _age(db, run, seconds):
+    """Pretend the run was last updated `seconds` ago."""
+    db["metadata_runs"].docs[run.run_id]["updated_at"] -= datetime.timedelta(seconds=seconds)
+
+
+def test_id_after_follows_bson_type_order():
+    assert id_after(None) == {}
+    assert id_after("o/r_12") == {"$or": [{"_id": {"$gt": "o/r_12"}}] + [
+        {"_id": {"$type": t}} for t in ("object", "binData", "objectId", "bool", "date", "timestamp", "regex")]}
+    oid = ObjectId()
+    assert id_after(oid)["$or"][0] == {"_id": {"$gt": oid}}
+    assert {"_id": {"$type": "date"}} in id_after(oid)["$or"]
+    assert id_after(datetime.datetime(2024, 1, 1))["$or"][-1] == {"_id": {"$type": "regex"}}
+
+
+def test_unfinished_run_is_resumed_from_its_checkpoint():
+    db = {"metadata_runs": _RunsCollection()}
+    run = MetadataRun.start(db, "o/r", "files")
+    run.checkpoint("o/r_main_b.py", pages=1, scanned=500, changed=3)
+    run.fail(RuntimeError("cursor timeout"))
+
+    resumed = MetadataRun.start(db, "o/r", "files")
+    assert resumed.run_id == run.run_id and resumed.last_id == "o/r_main_b.py"
+    resumed.checkpoint("o/r_main_z.py", pages=1, scanned=200, changed=0)
+    resumed.complete()
+    doc = db["metadata_runs"].docs[run.run_id]
+    assert doc["status"] == "completed" and doc["resumes"] == 1
+    assert doc["counters"] == {"pages": 2, "scanned": 700, "changed": 3}
+
+    # A completed run is not resumed; resume=False abandons unfinished runs
+    fresh = MetadataRun.start(db, "o/r", "files")
+    assert fresh.run_id != run.run_id and fresh.last_id is None
+    fresh.fail(RuntimeError("killed"))
+    restarted = MetadataRun.start(db, "o/r", "files", resume=False)
+    assert db["metadata_runs"].docs[fresh.run_id]["status"] == "abandoned" and restarted.last_id is None
+
+
+def test_running_run_is_only_taken_over_once_its_lease_expired():
+    db = {"metadata_runs": _RunsCollection()}
+    first = MetadataRun.start(db, "o/r", "issues", lease_seconds=60)
+    first.checkpoint("o/r_10", pages=1)
+
+    # Its owner is alive: neither resumed nor restarted by a second process
+    with pytest.raises(RuntimeError, match="lease"):
+        MetadataRun.start(db, "o/r", "issues", lease_seconds=60)
+    with pytest.raises(RuntimeError, match="lease"):
+        MetadataRun.start(db, "o/r", "issues", resume=False, lease_seconds=60)
+
+    # Its owner stopped updating it: the run is taken over, the old owner can no longer write
+    _age(db, first, 120)
+    second = MetadataRun.start(db, "o/r", "issues", lease_seconds=60)
+    second.owner = "other-host:1"
+    db["metadata_runs"].docs[second.run_id]["owner"] = second.owner
+    assert second.run_id == first.run_id and second.last_id == "o/r_10"
+    with pytest.raises(RuntimeError, match="no longer owned"):
+        first.checkpoint("o/r_20", pages=1)
+    first.fail(RuntimeError("late failure"))  # Does not mark the run taken over as failed
+    assert db["metadata_runs"].docs[first.run_id]["status"] == "running"
+    second.checkpoint("o/r_20", pages=1)
+    assert db["metadata_runs"].docs[first.run_id]["last_id"] == "o/r_20"
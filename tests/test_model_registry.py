@@ -0,0 +1,49 @@
+"""
+Unit tests for the process-wide model registry.
+"""
+import pytest
+
+from embeddings import model_registry
+from embeddings.embeddings import AbstractEmbeddingModel
+
+
+class _FakeModel(AbstractEmbeddingModel):
+    def __init__(self, *key):
+        self.key = key
+
+    def encode(self, text):
+        return [1.0]
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    calls = []
+
+    def load(*key):
+        calls.append(key)
+        return _FakeModel(*key)
+
+    monkeypatch.setattr(model_registry, "_embedding_models", {})
+    monkeypatch.setattr(model_registry, "_query_models", {})
+    monkeypatch.setattr(model_registry, "_load_embedding_model", load)
+    monkeypatch.delenv("EMBEDDING_BACKEND", raising=False)
+    return calls
+
+
+def test_each_model_key_is_loaded_once(loads):
+    model = model_registry.get_embedding_model(device="cpu")
+    assert model_registry.get_embedding_model(device="cpu") is model
+    query_model = model_registry.get_query_embedding_model(device="cpu")
+    assert query_model.model is model
+    assert model_registry.get_query_embedding_model(device="cpu") is query_model
+    assert loads == [("all-MiniLM-L6-v2", "cpu", "torch")]
+
+    model_registry.get_embedding_model(backend="onnx-int8")
+    model_registry.get_embedding_model(backend="onnx-int8", device="cuda")  # ONNX always runs on CPU
+    assert loads[1:] == [("all-MiniLM-L6-v2", "cpu", "onnx-int8")]
+
+
+def test_unknown_backend_is_rejected(loads):
+    with pytest.raises(ValueError):
+        model_registry.get_embedding_model(backend="tensorrt")
+    assert loads == []
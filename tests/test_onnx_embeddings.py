@@ -0,0 +1,37 @@
+"""
+Compatibility of the ONNX Runtime backend with the Sentence-Transformers
+embeddings already stored in the Faiss indexes.
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+
+from embeddings.embeddings import SentenceTransformerEmbeddingModel
+from embeddings.onnx_embeddings import OnnxEmbeddingModel
+
+TEXTS = [
+    "Hello Archethic",
+    "How to deploy a multisig smart contract on the testnet ?",
+    "defmodule Archethic.TransactionChain do\n  @moduledoc false\nend",
+    "Correction du calcul des frais de transaction " * 40,  # Tronqué à max_seq_length
+]
+
+
+@pytest.fixture(scope="module")
+def reference():
+    return SentenceTransformerEmbeddingModel().encode_batch(TEXTS)
+
+
+@pytest.mark.parametrize("quantize, min_cosine", [(False, 0.9999), (True, 0.98)])
+def test_onnx_embeddings_match_sentence_transformers(tmp_path_factory, reference, quantize, min_cosine):
+    model = OnnxEmbeddingModel(export_dir=tmp_path_factory.mktemp("onnx"), quantize=quantize,
+                               intra_op_threads=2)
+    vectors = model.encode_batch(TEXTS, batch_size=3)
+
+    assert vectors.shape == reference.shape and vectors.dtype == np.float32
+    cosines = (vectors * reference).sum(axis=1) / (
+        np.linalg.norm(vectors, axis=1) * np.linalg.norm(reference, axis=1))
+    assert cosines.min() >= min_cosine
+    if not quantize:
+        assert np.abs(vectors - reference).max() < 1e-4
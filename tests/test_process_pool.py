@@ -0,0 +1,24 @@
+"""
+Tests for the multi-process embedding pool.
+"""
+import numpy as np
+
+from embeddings.model_registry import get_embedding_model
+from embeddings.process_pool import ProcessPoolEmbeddingModel, _shard
+
+
+def test_shards_are_contiguous_and_balanced():
+    texts = [str(i) for i in range(100)]
+    shards = _shard(texts, workers=4, min_shard_size=16)
+    assert [len(s) for s in shards] == [25, 25, 25, 25]
+    assert sum(shards, []) == texts
+    assert _shard(texts[:20], workers=4, min_shard_size=16) == [texts[:10], texts[10:20]]
+
+
+def test_pool_returns_vectors_in_input_order():
+    texts = [f"Archethic transaction number {i}" for i in range(40)]
+    with ProcessPoolEmbeddingModel(workers=2, threads_per_worker=1, min_shard_size=8) as pool:
+        vectors = pool.encode_batch(texts, batch_size=8)
+    expected = get_embedding_model(device="cpu").encode_batch(texts)
+    assert vectors.shape == expected.shape and vectors.dtype == np.float32
+    assert np.allclose(vectors, expected, atol=1e-5)
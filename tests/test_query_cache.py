@@ -0,0 +1,40 @@
+"""
+Unit tests for the in-process LRU cache of query embeddings.
+"""
+import numpy as np
+
+from embeddings.embeddings import AbstractEmbeddingModel
+from embeddings.query_cache import QueryEmbeddingCache
+
+
+class _CountingModel(AbstractEmbeddingModel):
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, text):
+        self.encoded.append(text)
+        return [float(len(text)), 1.0]
+
+
+def test_query_cache_hits_normalized_questions_and_returns_copies():
+    model = _CountingModel()
+    cache = QueryEmbeddingCache(model, maxsize=8)
+
+    first = cache.encode_batch(["how to deploy multisig ?"])
+    first[:] = 0  # e.g. normalize_L2 in place by the index manager
+    again = cache.encode_batch(["  how to   deploy multisig ?\n", "what is a chain ?"])
+
+    assert model.encoded == ["how to deploy multisig ?", "what is a chain ?"]
+    assert again[0].tolist() == [24.0, 1.0]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_query_cache_evicts_least_recently_used():
+    model = _CountingModel()
+    cache = QueryEmbeddingCache(model, maxsize=2)
+    for question in ["a", "b", "a", "c", "a", "b"]:
+        cache.encode(question)
+
+    assert model.encoded == ["a", "b", "c", "b"]
+    assert cache.stats()["entries"] == 2
+    assert np.array_equal(cache.encode_batch([]), np.empty((0, 0), dtype=np.float32))
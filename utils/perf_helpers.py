@@ -0,0 +1,83 @@
+"""
+perf_helpers.py
+~~~~~~~~~~~~~~~
+Small helpers to report timings and memory usage from long-running
+commands (index builds, metadata runs, benchmarks).
+"""
+
+import sys
+from typing import Optional
+
+try:
+    import resource  # Not available on Windows
+except ImportError:  # pragma: no cover - platform dependent
+    resource = None
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """
+    Returns the peak resident set size of the current process.
+
+    Returns:
+        Optional[int]: Peak RSS in bytes, or None if the platform does not expose it.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def current_rss_bytes() -> Optional[int]:
+    """
+    Returns the current resident set size of the current process.
+    Pages shared through the OS page cache (e.g. memory-mapped indexes) are
+    counted once they have been touched, see private_rss_bytes().
+
+    Returns:
+        Optional[int]: Current RSS in bytes, or None if the platform does not expose it.
+    """
+    return _proc_status_bytes("VmRSS")
+
+
+def private_rss_bytes() -> Optional[int]:
+    """
+    Returns the resident memory private to the current process (anonymous pages),
+    i.e. the part of the RSS that is not shared with other processes through files.
+
+    Returns:
+        Optional[int]: Private RSS in bytes, or None if the platform does not expose it.
+    """
+    return _proc_status_bytes("RssAnon")
+
+
+def _proc_status_bytes(field: str) -> Optional[int]:
+    """Reads a memory field (reported in kB) of /proc/self/status, Linux only."""
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:  # Not Linux
+        pass
+    return None
+
+
+def format_bytes(num_bytes: Optional[float]) -> str:
+    """
+    Formats a byte count in a human readable way (e.g. '12.3 MB').
+
+    Args:
+        num_bytes (Optional[float]): Number of bytes, None if unknown.
+
+    Returns:
+        str: Human readable size.
+    """
+    if num_bytes is None:
+        return "n/a"
+    size = float(num_bytes)
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"